@@ -0,0 +1,202 @@
+"""Заглушка HTTP-сервиса для нагрузочных замеров сборщика без настоящих целей.
+
+Отвечает на любые запросы JSON-телом заданной формы и размера с настраиваемой задержкой и долей ошибок:
+
+- `GET|POST /items/<id>` — объект с `id` (от него отталкиваются дочерние запросы);
+- `GET /items/<id>/status` — `{"id", "state"}`, но с вероятностью `--not-ready` без `state` (для `wait_for`);
+- `POST /upload` — читает тело и отвечает `{"id", "received"}`;
+- `GET /_stats` — счётчики заглушки (запросы, байты, ответы по кодам) для бенчмарков.
+
+    python benchmarks/http_stub.py --port 8099 --latency-ms 20 --jitter-ms 10 --status-mix 200:95,500:4,503:1
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+SHAPES = ("flat", "nested", "list")
+
+
+def parse_status_mix(raw: str) -> List[Tuple[int, float]]:
+    """`200:95,500:5` -> [(200, 95.0), (500, 5.0)]."""
+    mix: List[Tuple[int, float]] = []
+    for part in raw.split(","):
+        if not part.strip():
+            continue
+        code, _, weight = part.partition(":")
+        mix.append((int(code), float(weight or 1)))
+    if not mix:
+        raise ValueError("status mix is empty")
+    return mix
+
+
+def build_body(shape: str, size: int, item_id: str) -> Dict[str, Any]:
+    """JSON-ответ формы `shape`, дополненный до примерно `size` байт."""
+    if shape == "nested":
+        body: Dict[str, Any] = {"id": item_id, "data": {"order": {"meta": {"code": 200, "type": "ok"}}}}
+    elif shape == "list":
+        body = {"id": item_id, "items": [{"id": f"{item_id}-{index}", "value": index} for index in range(20)]}
+    else:
+        body = {"id": item_id, "status": "UP", "code": 200}
+    filler = max(size - len(json.dumps(body)), 0)
+    if filler:
+        body["padding"] = "x" * filler
+    return body
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        port: int,
+        latency_ms: float,
+        jitter_ms: float,
+        body_bytes: int,
+        shape: str,
+        status_mix: List[Tuple[int, float]],
+        not_ready: float,
+    ) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.shape = shape
+        self.not_ready = not_ready
+        self.codes = [code for code, _ in status_mix]
+        self.weights = [weight for _, weight in status_mix]
+        # Тела готовим заранее: форматирование JSON не должно попадать в задержку ответа.
+        self.bodies = {
+            "item": json.dumps(build_body(shape, body_bytes, "{id}")),
+            "ready": json.dumps({"id": "{id}", "state": "done"}),
+            "pending": json.dumps({"id": "{id}"}),
+        }
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.statuses: Dict[int, int] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "statuses": {str(code): count for code, count in sorted(self.statuses.items())},
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubServer
+    # HTTP/1.1 с Content-Length: сборщик держит keep-alive соединения, как с настоящими сервисами.
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело уходят отдельными записями; с Nagle ответ по keep-alive ждал бы отложенного ACK клиента.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def do_GET(self) -> None:
+        self._respond()
+
+    def do_POST(self) -> None:
+        self._respond()
+
+    def do_PUT(self) -> None:
+        self._respond()
+
+    def do_DELETE(self) -> None:
+        self._respond()
+
+    def _respond(self) -> None:
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        path = self.path.split("?", 1)[0]
+        if path == "/_stats":
+            self._send(200, json.dumps(server.stats()).encode(), count=False)
+            return
+        delay = server.latency_ms + random.uniform(-server.jitter_ms, server.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        parts = [part for part in path.split("/") if part]
+        item_id = parts[1] if len(parts) > 1 else str(random.randrange(1 << 30))
+        code = random.choices(server.codes, server.weights)[0]
+        if code >= 400:
+            body = json.dumps({"error": "stub failure", "code": code})
+        elif parts[-1:] == ["status"]:
+            kind = "pending" if random.random() < server.not_ready else "ready"
+            body = server.bodies[kind].replace("{id}", item_id)
+        elif parts[:1] == ["upload"]:
+            body = json.dumps({"id": item_id, "received": length})
+        else:
+            body = server.bodies["item"].replace("{id}", item_id)
+        self._send(code, body.encode(), received=length)
+
+    def _send(self, code: int, data: bytes, received: int = 0, count: bool = True) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            return  # клиент не дождался ответа (тайм-аут или остановка сборщика)
+        if count:
+            server = self.server
+            with server.lock:
+                server.requests += 1
+                server.bytes_in += received
+                server.bytes_out += len(data)
+                server.statuses[code] = server.statuses.get(code, 0) + 1
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mean response delay (default: 20)")
+    parser.add_argument("--jitter-ms", type=float, default=5.0, help="Uniform delay jitter, +/- ms (default: 5)")
+    parser.add_argument("--body-bytes", type=int, default=512, help="Approximate response size (default: 512)")
+    parser.add_argument("--shape", choices=SHAPES, default="nested", help="Response JSON shape (default: nested)")
+    parser.add_argument("--status-mix", default="200:100", help="Weighted status codes, e.g. 200:95,500:5")
+    parser.add_argument(
+        "--not-ready", type=float, default=0.3, help="Share of /status responses without `state` (default: 0.3)"
+    )
+
+
+def stub_from_args(port: int, args: argparse.Namespace) -> StubServer:
+    return StubServer(
+        port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        body_bytes=args.body_bytes,
+        shape=args.shape,
+        status_mix=parse_status_mix(args.status_mix),
+        not_ready=args.not_ready,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = stub_from_args(args.port, args)
+    print(f"HTTP stub listening on 127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
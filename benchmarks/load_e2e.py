@@ -0,0 +1,292 @@
+"""Сквозной нагрузочный замер: сколько маршрутов выдерживает один процесс сборщика при заданном интервале.
+
+Поднимает заглушку `http_stub.py` (задержка, размер и форма ответа, доля ошибок), генерирует синтетическую
+конфигурацию (часть маршрутов — цепочки с дочерними запросами, `wait_for` и загрузкой ZIP), запускает
+настоящий `main.py --self-metrics` на `--duration` секунд и печатает отчёт:
+
+- достигнутую частоту завершённых прогонов и HTTP-запросов против расчётной (`маршруты / интервал`);
+- перцентили задержки старта прогонов (`schedule_lag`) и времени записи результатов;
+- CPU процесса (с дочерними процессами `--workers`) в процентах одного ядра, пиковый RSS и число потоков.
+
+    python benchmarks/load_e2e.py --routes 500 --interval 10 --duration 60
+    python benchmarks/load_e2e.py --routes 2000 --interval 5 --latency-ms 50 --status-mix 200:95,503:5 -- --workers 4
+
+Аргументы после `--` передаются `main.py` как есть. CPU, RSS и потоки читаются из `/proc`, поэтому доступны
+только в Linux. Прогоны считаются с момента старта, так что `--duration` стоит брать в несколько интервалов.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCHMARKS_DIR.parent
+MAIN = PROJECT_ROOT / "main.py"
+if str(BENCHMARKS_DIR) not in sys.path:
+    sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from http_stub import add_stub_arguments, stub_from_args  # noqa: E402
+
+SELF_METRICS_FILE = "_self_metrics.json"
+UPLOAD_FILES = 5
+UPLOAD_FILE_BYTES = 4096
+
+
+@dataclass
+class ProcessSample:
+    cpu_seconds: float
+    rss_bytes: int
+    threads: int
+
+
+@dataclass
+class ProcessStats:
+    """Показатели процесса сборщика и его дочерних процессов по выборкам `/proc`."""
+
+    samples: List[ProcessSample] = field(default_factory=list)
+    started: float = 0.0
+    finished: float = 0.0
+
+    def report(self) -> Dict[str, Any]:
+        if len(self.samples) < 2:
+            return {"cpu_percent": None, "rss_peak_mb": None, "threads_peak": None}
+        first, last = self.samples[0], self.samples[-1]
+        elapsed = max(self.finished - self.started, 1e-9)
+        return {
+            "cpu_percent": round((last.cpu_seconds - first.cpu_seconds) / elapsed * 100, 1),
+            "rss_peak_mb": round(max(sample.rss_bytes for sample in self.samples) / 2**20, 1),
+            "rss_last_mb": round(last.rss_bytes / 2**20, 1),
+            "threads_peak": max(sample.threads for sample in self.samples),
+        }
+
+
+def _process_tree(root: int) -> List[int]:
+    parents: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii") as handle:
+                fields = handle.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        parents.setdefault(int(fields[1]), []).append(int(entry))
+    tree, queue = [], [root]
+    while queue:
+        pid = queue.pop()
+        tree.append(pid)
+        queue.extend(parents.get(pid, []))
+    return tree
+
+
+def sample_process(root: int) -> Optional[ProcessSample]:
+    if not os.path.isdir("/proc"):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    cpu = 0.0
+    rss = threads = 0
+    for pid in _process_tree(root):
+        try:
+            with open(f"/proc/{pid}/stat", encoding="ascii") as handle:
+                fields = handle.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # После имени процесса: utime и stime — 12-е и 13-е поля, num_threads — 18-е, rss (страницы) — 22-е.
+        cpu += (int(fields[11]) + int(fields[12])) / ticks
+        threads += int(fields[17])
+        rss += int(fields[21]) * page
+    return ProcessSample(cpu, rss, threads)
+
+
+def build_routes(args: argparse.Namespace, base_url: str, upload_dir: Path) -> List[Dict[str, Any]]:
+    rng = random.Random(args.seed)
+    routes: List[Dict[str, Any]] = []
+    for index in range(args.routes):
+        route: Dict[str, Any] = {
+            "name": f"load-{index:05d}",
+            "url": f"{base_url}/items/{index}",
+            "interval": args.interval,
+            "timeout": args.timeout,
+            "tags": ["load", f"group-{index % 10}"],
+        }
+        if rng.random() < args.upload_ratio:
+            route.update(
+                {
+                    "url": f"{base_url}/upload/{index}",
+                    "method": "POST",
+                    "file": {"path": str(upload_dir), "field_name": "file", "zip_enabled": True},
+                    "json": {"route": index, "kind": "upload"},
+                    "json_field": "meta",
+                }
+            )
+        elif rng.random() < args.chain_ratio:
+            status = {
+                "name": f"load-{index:05d}-status",
+                "url": f"{base_url}/items/{{{{$.id}}}}/status",
+            }
+            if rng.random() < args.wait_for_ratio:
+                status["wait_for"] = {"path": "$.state", "attempts": 3, "delay": 0.2}
+            route["children"] = [
+                status,
+                {
+                    "name": f"load-{index:05d}-confirm",
+                    "url": f"{base_url}/items/{{{{$.id}}}}",
+                    "method": "POST",
+                    "json": {"id": "$.id", "confirmed": True},
+                },
+            ]
+        routes.append(route)
+    return routes
+
+
+def _fetch_stats(base_url: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(f"{base_url}/_stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"routes:            {report['routes']} at {report['interval']:g}s interval, {report['duration']:g}s run")
+    print(
+        f"probe rate:        {report['runs_per_s']} runs/s of {report['expected_runs_per_s']} planned "
+        f"({report['runs_ratio']}), {report['requests_per_s']} HTTP req/s"
+    )
+    for name in ("schedule_lag", "write"):
+        timing = report["timings"].get(name)
+        if timing is None:
+            print(f"{name + ':':<18} not measured (monitors run in --workers processes)")
+            continue
+        print(
+            f"{name + ':':<18} p50 {timing.get('p50_ms')} ms, p95 {timing.get('p95_ms')} ms, "
+            f"p99 {timing.get('p99_ms')} ms, max {timing.get('max_ms')} ms"
+        )
+    process = report["process"]
+    print(
+        f"process:           cpu {process['cpu_percent']}% of one core, rss peak {process['rss_peak_mb']} MB, "
+        f"threads peak {process['threads_peak']}"
+    )
+    print(f"run errors:        {report['run_errors']}, stub statuses {report['statuses']}")
+
+
+def main() -> int:
+    if "--" in sys.argv:
+        split = sys.argv.index("--")
+        own_argv, service_argv = sys.argv[1:split], sys.argv[split + 1 :]
+    else:
+        own_argv, service_argv = sys.argv[1:], []
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=int, default=200, help="Number of synthetic routes (default: 200)")
+    parser.add_argument("--interval", type=float, default=10.0, help="Route interval in seconds (default: 10)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Service run time in seconds (default: 60)")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Route timeout in seconds (default: 5)")
+    parser.add_argument("--chain-ratio", type=float, default=0.3, help="Share of routes with children")
+    parser.add_argument("--wait-for-ratio", type=float, default=0.5, help="Share of chains with wait_for")
+    parser.add_argument("--upload-ratio", type=float, default=0.05, help="Share of routes uploading a ZIP")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Process sampling period in seconds")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic config")
+    parser.add_argument("--json", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory with config and results")
+    add_stub_arguments(parser)
+    args = parser.parse_args(own_argv)
+
+    stub = stub_from_args(0, args)
+    threading.Thread(target=stub.serve_forever, name="http-stub", daemon=True).start()
+    base_url = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    workdir = Path(tempfile.mkdtemp(prefix="sber-load-"))
+    upload_dir = workdir / "upload"
+    upload_dir.mkdir()
+    for index in range(UPLOAD_FILES):
+        (upload_dir / f"part-{index}.txt").write_text("x" * UPLOAD_FILE_BYTES, encoding="utf-8")
+    config = workdir / "routes.json"
+    config.write_text(json.dumps({"routes": build_routes(args, base_url, upload_dir)}), encoding="utf-8")
+    results = workdir / "results"
+    command = [
+        sys.executable,
+        str(MAIN),
+        "--config",
+        str(config),
+        "--results-path",
+        f"{results}{os.sep}",
+        "--self-metrics",
+        "--log-level",
+        "WARNING",
+        "--log-file",
+        str(workdir / "service.log"),
+        *service_argv,
+    ]
+
+    stats_before = _fetch_stats(base_url)
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT)
+    usage = ProcessStats(started=time.monotonic())
+    deadline = usage.started + args.duration
+    try:
+        while time.monotonic() < deadline and process.poll() is None:
+            sample = sample_process(process.pid)
+            if sample is not None:
+                usage.samples.append(sample)
+            time.sleep(min(args.sample_interval, max(deadline - time.monotonic(), 0)))
+        sample = sample_process(process.pid)
+        if sample is not None:
+            usage.samples.append(sample)
+        usage.finished = time.monotonic()
+        stats_after = _fetch_stats(base_url)
+    finally:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+        exit_code = process.wait(timeout=args.timeout * 4 + 30)
+        stub.shutdown()
+
+    metrics_path = results / SELF_METRICS_FILE
+    if exit_code != 0 or not metrics_path.exists():
+        print(f"Service exited with {exit_code}; see {workdir / 'service.log'}", file=sys.stderr)
+        return 1
+    self_metrics = json.loads(metrics_path.read_text(encoding="utf-8"))["self_metrics"]
+    elapsed = max(usage.finished - usage.started, 1e-9)
+    # Записанные результаты = завершённые прогоны; счётчик `runs` в режиме --workers не публикуется.
+    runs = (self_metrics["timings"].get("write") or {}).get("count", 0)
+    expected = args.routes / args.interval
+    statuses = {
+        code: count - stats_before["statuses"].get(code, 0) for code, count in stats_after["statuses"].items()
+    }
+    report = {
+        "routes": args.routes,
+        "interval": args.interval,
+        "duration": round(elapsed, 1),
+        "runs": runs,
+        "runs_per_s": round(runs / elapsed, 1),
+        "expected_runs_per_s": round(expected, 1),
+        "runs_ratio": round(runs / elapsed / expected, 3) if expected else None,
+        "requests_per_s": round((stats_after["requests"] - stats_before["requests"]) / elapsed, 1),
+        "run_errors": self_metrics["counters"].get("run_errors", 0),
+        "statuses": statuses,
+        "timings": self_metrics["timings"],
+        "process": usage.report(),
+        "service_args": service_argv,
+    }
+    _print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if args.keep:
+        print(f"Working directory: {workdir}")
+    else:
+        import shutil
+
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,367 @@
+"""Микробенчмарки горячих путей с сохранённым эталоном и проверкой на регрессии.
+
+Каждый бенчмарк прогоняется сериями: число повторений в серии подбирается так, чтобы серия шла не меньше
+`--min-time` секунд, а в зачёт идёт лучшая из `--repeat` серий (как в `timeit`: шум только замедляет).
+Результат — время одной операции в микросекундах; с эталоном сравнивается так же, как в
+`startup_importtime.py`: регрессия — медленнее эталона больше чем на `--tolerance` и на `--slack-us`.
+
+    python benchmarks/microbench.py                   # проверка, код выхода 1 при регрессии
+    python benchmarks/microbench.py --only write      # только бенчмарки, в имени которых есть подстрока
+    python benchmarks/microbench.py --update          # пересчитать эталон на этой машине
+    python benchmarks/microbench.py --output new.json # сохранить замеры, например до и после правки
+    python benchmarks/microbench.py --compare new.json --baseline old.json  # сравнить без прогона
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Event
+from typing import Any, Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from monitoring.config import load_config  # noqa: E402
+from monitoring.persistence import ResultWriter  # noqa: E402
+from monitoring.types import HttpRouteConfig  # noqa: E402
+from threads.http_route import HttpRouteMonitor  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "microbench_baseline.json"
+DEFAULT_REPEAT = 5
+DEFAULT_MIN_TIME = 0.1
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_SLACK_US = 2.0
+
+WRITER_ROUTES = (10, 100, 1000)
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    # Подготовка вызывается один раз и возвращает измеряемую операцию без аргументов.
+    setup: Callable[[Path], Callable[[], Any]]
+
+
+def _route(name: str, **extra: Any) -> HttpRouteConfig:
+    return HttpRouteConfig(name=name, url="http://127.0.0.1:9/", **extra)
+
+
+def _monitor(workdir: Path) -> HttpRouteMonitor:
+    writer = ResultWriter(str(workdir / "monitor-results.json"))
+    return HttpRouteMonitor(_route("bench"), writer, Event())
+
+
+def _deep_payload(depth: int) -> Tuple[Dict[str, Any], str]:
+    payload: Dict[str, Any] = {"value": 42}
+    keys: List[str] = []
+    for level in reversed(range(depth)):
+        key = f"level{level}"
+        payload = {key: [{"skip": True}, payload], "noise": {"a": 1, "b": [1, 2, 3]}}
+        keys.append(f"{key}[1]")
+    return payload, "$." + ".".join(reversed(keys)) + ".value"
+
+
+def _items(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": f"id-{index}",
+            "name": f"item-{index}",
+            "meta": {"code": 200 if index % 2 else 404, "type": "ok"},
+            "fields": [{"name": "python", "value": f"v{index}"}, {"name": "go", "value": "x"}],
+        }
+        for index in range(count)
+    ]
+
+
+def bench_json_path_deep(workdir: Path) -> Callable[[], Any]:
+    payload, path = _deep_payload(30)
+    assert HttpRouteMonitor._extract_json_path(payload, path) == 42
+    return lambda: HttpRouteMonitor._extract_json_path(payload, path)
+
+
+def bench_json_path_filter(workdir: Path) -> Callable[[], Any]:
+    # Совпадает последний элемент: фильтр проходит весь список.
+    payload = {"items": _items(2000)}
+    path = '$.items[meta.code=200&fields[name="python"].value="v1999"].id'
+    assert HttpRouteMonitor._extract_json_path(payload, path) == "id-1999"
+    return lambda: HttpRouteMonitor._extract_json_path(payload, path)
+
+
+def bench_resolve_value(workdir: Path) -> Callable[[], Any]:
+    monitor = _monitor(workdir)
+    context = {"token": "abc", "session": {"id": 7, "user": "bench"}, "items": _items(50)}
+    template = {
+        "header": {"auth": "Bearer {{$.token}}", "session": "$.session.id"},
+        "records": [
+            {
+                "index": index,
+                "ref": f"ref-{index}-{{{{$.items[{index % 50}].id}}}}",
+                "owner": "{{$.session.user}}",
+                "static": "plain text without templates " * 4,
+                "tags": ["a", "b", "{{$.items[name=\"item-3\"].meta.type}}"],
+            }
+            for index in range(200)
+        ],
+    }
+    resolved = monitor._resolve_value(template, context)
+    assert resolved["header"]["session"] == 7 and resolved["records"][1]["ref"] == "ref-1-id-1"
+    return lambda: monitor._resolve_value(template, context)
+
+
+def bench_resolve_text(workdir: Path) -> Callable[[], Any]:
+    monitor = _monitor(workdir)
+    context = {"items": _items(50), "token": "abc"}
+    text = " ".join(f"{{{{$.items[{index}].name}}}}:{{{{$.token}}}}" for index in range(50)) + " tail" * 200
+    assert monitor._resolve_text(text, context).startswith("item-0:abc")
+    return lambda: monitor._resolve_text(text, context)
+
+
+def _writer_benchmark(routes: int) -> Callable[[Path], Callable[[], Any]]:
+    def setup(workdir: Path) -> Callable[[], Any]:
+        writer = ResultWriter(str(workdir / f"results-{routes}.json"))
+        configs = [_route(f"route-{index:04d}", tags=["bench"]) for index in range(routes)]
+        payload = {
+            "ok": True,
+            "status_code": 200,
+            "reason": "OK",
+            "response_time_ms": 12.5,
+            "timestamp": "2026-01-01T00:00:00+00:00",
+            "error": None,
+            "body_excerpt": '{"status": "UP"}',
+            "body_truncated": False,
+            "url": "http://127.0.0.1:9/",
+            "method": "GET",
+            "tags": ["bench"],
+        }
+        for config in configs:
+            writer.write_result(config, payload)
+        cursor = itertools.count()
+
+        def write() -> None:
+            writer.write_result(configs[next(cursor) % routes], payload)
+
+        return write
+
+    return setup
+
+
+def _route_dict(index: int) -> Dict[str, Any]:
+    return {
+        "name": f"route-{index}",
+        "url": "${BASE_URL}/api/v1/orders/" + str(index),
+        "method": "post",
+        "interval": 30,
+        "timeout": 5,
+        "tags": ["bench", f"group-{index % 10}"],
+        "headers": {"Authorization": "Bearer ${TOKEN}", "X-Request": f"bench-{index}"},
+        "params": {"page": 1, "size": 20},
+        "json": {"order": {"id": index, "items": [{"sku": f"sku-{n}", "qty": n} for n in range(5)]}},
+        "wait_for": {"path": "$.status", "attempts": 3, "delay": 1},
+        "children": [
+            {
+                "name": f"route-{index}-status",
+                "url": "${BASE_URL}/api/v1/orders/{{$.id}}/status",
+                "json": {"id": "$.id", "token": "${TOKEN}"},
+                "wait_for": "$.state",
+            },
+            {"name": f"route-{index}-cancel", "url": "${BASE_URL}/api/v1/orders/{{$.id}}", "method": "delete"},
+        ],
+    }
+
+
+ENV = {"BASE_URL": "http://127.0.0.1:9", "TOKEN": "secret"}
+
+
+def bench_from_dict(workdir: Path) -> Callable[[], Any]:
+    raw = [_route_dict(index) for index in range(100)]
+
+    def parse() -> None:
+        for entry in raw:
+            HttpRouteConfig.from_dict(entry, source_path="bench.json", base_dir=workdir, env_map=ENV)
+
+    return parse
+
+
+def _config_tree(root: Path, files: int, routes_per_file: int, suffix: str) -> None:
+    for file_index in range(files):
+        target = root / f"team-{file_index % 5}" / f"routes-{file_index}{suffix}"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        routes = [_route_dict(file_index * routes_per_file + index) for index in range(routes_per_file)]
+        document = {"env": ENV, "routes": routes}
+        if suffix == ".json":
+            target.write_text(json.dumps(document), encoding="utf-8")
+        else:
+            import yaml
+
+            target.write_text(yaml.safe_dump(document), encoding="utf-8")
+
+
+def _load_config_benchmark(suffix: str) -> Callable[[Path], Callable[[], Any]]:
+    def setup(workdir: Path) -> Callable[[], Any]:
+        root = workdir / f"config{suffix}"
+        _config_tree(root, files=20, routes_per_file=25, suffix=suffix)
+        assert len(load_config(str(root)).routes) == 500
+        return lambda: load_config(str(root))
+
+    return setup
+
+
+def _zip_benchmark(target_encoding: Any) -> Callable[[Path], Callable[[], Any]]:
+    def setup(workdir: Path) -> Callable[[], Any]:
+        source = workdir / "upload"
+        for index in range(200):
+            entry = source / f"dir-{index % 10}" / f"file-{index}.txt"
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            entry.write_text(f"строка {index} с данными для архива\n" * 100, encoding="utf-8")
+        target = workdir / f"upload-{target_encoding}.zip"
+        return lambda: HttpRouteMonitor._build_zip(source, target, target_encoding)
+
+    return setup
+
+
+BENCHMARKS: List[Benchmark] = [
+    Benchmark("json_path_deep", bench_json_path_deep),
+    Benchmark("json_path_filter_2000", bench_json_path_filter),
+    Benchmark("resolve_value_200_records", bench_resolve_value),
+    Benchmark("resolve_text_100_templates", bench_resolve_text),
+    *(Benchmark(f"write_result_{routes}_routes", _writer_benchmark(routes)) for routes in WRITER_ROUTES),
+    Benchmark("from_dict_100_routes", bench_from_dict),
+    Benchmark("load_config_json_500_routes", _load_config_benchmark(".json")),
+    Benchmark("load_config_yaml_500_routes", _load_config_benchmark(".yaml")),
+    Benchmark("build_zip_200_files", _zip_benchmark(None)),
+    Benchmark("build_zip_200_files_cp1251", _zip_benchmark("cp1251")),
+]
+
+
+def measure(operation: Callable[[], Any], repeat: int, min_time: float) -> float:
+    """Лучшее время одной операции (мкс) из `repeat` серий длиной не меньше `min_time` секунд."""
+    operation()  # прогрев: ленивые импорты, кэши, первая запись файла
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            operation()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            operation()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best * 1e6
+
+
+def compare(
+    measured: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    slack_us: float,
+) -> List[str]:
+    """Печатает таблицу сравнения и возвращает описания регрессий."""
+    failures: List[str] = []
+    for name, values in measured.items():
+        current = values["us_per_op"]
+        line = f"{name:<32} {current:12.2f} us"
+        reference = baseline.get(name, {}).get("us_per_op")
+        if reference is not None:
+            limit = max(reference * (1 + tolerance), reference + slack_us)
+            line += f"  (baseline {reference:.2f} us, x{current / reference:.2f}, limit {limit:.2f} us)"
+            if current > limit:
+                failures.append(f"{name}: {current:.2f} us > {limit:.2f} us")
+                line += "  REGRESSION"
+        print(line)
+    return failures
+
+
+def run(benchmarks: List[Benchmark], repeat: int, min_time: float) -> Dict[str, Dict[str, float]]:
+    measured: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for benchmark in benchmarks:
+            workdir = Path(tmp) / benchmark.name
+            workdir.mkdir()
+            operation = benchmark.setup(workdir)
+            measured[benchmark.name] = {"us_per_op": round(measure(operation, repeat, min_time), 2)}
+    return measured
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Hot-path microbenchmarks with a stored baseline")
+    parser.add_argument("--only", default=None, help="Run only benchmarks whose name contains this substring")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    parser.add_argument(
+        "--repeat", type=int, default=DEFAULT_REPEAT, help=f"Series per benchmark (default: {DEFAULT_REPEAT})"
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=DEFAULT_MIN_TIME,
+        help=f"Minimal duration of one series in seconds (default: {DEFAULT_MIN_TIME:g})",
+    )
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Path to the baseline JSON file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Allowed relative slowdown over the baseline (default: {DEFAULT_TOLERANCE})",
+    )
+    parser.add_argument(
+        "--slack-us",
+        type=float,
+        default=DEFAULT_SLACK_US,
+        help=f"Allowed absolute slowdown in microseconds (default: {DEFAULT_SLACK_US:g})",
+    )
+    parser.add_argument("--update", action="store_true", help="Write current measurements into the baseline")
+    parser.add_argument("--output", default=None, help="Also save current measurements to this JSON file")
+    parser.add_argument(
+        "--compare", default=None, metavar="RESULTS", help="Compare saved measurements with the baseline, no run"
+    )
+    args = parser.parse_args()
+
+    selected = [benchmark for benchmark in BENCHMARKS if not args.only or args.only in benchmark.name]
+    if args.list:
+        for benchmark in selected:
+            print(benchmark.name)
+        return 0
+    if not selected:
+        print(f"No benchmarks match {args.only!r}", file=sys.stderr)
+        return 2
+
+    # Замеры не должны зависеть от уровня логирования в окружении.
+    logging.disable(logging.CRITICAL)
+    baseline_path = Path(args.baseline)
+    baseline: Dict[str, Dict[str, float]] = {}
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+
+    if args.compare:
+        measured = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        measured = {name: values for name, values in measured.items() if not args.only or args.only in name}
+    else:
+        measured = run(selected, max(args.repeat, 1), args.min_time)
+    failures = compare(measured, {} if args.update else baseline, args.tolerance, args.slack_us)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(measured, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    if args.update:
+        # С --only обновляются только прогнанные бенчмарки, остальные эталоны сохраняются.
+        baseline.update(measured)
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline written to {baseline_path}")
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,165 @@
+"""Регрессионный бенчмарк времени запуска main.py по данным `python -X importtime`.
+
+Для каждого сценария запускает main.py несколько раз, суммирует собственное время импорта модулей
+(без того, что импортирует сам интерпретатор при старте) и сравнивает медиану с сохранённым бюджетом.
+Кроме времени проверяет, что в сценарии не импортируются запрещённые тяжёлые модули.
+
+    python benchmarks/startup_importtime.py            # проверка, код выхода 1 при регрессии
+    python benchmarks/startup_importtime.py --update   # пересчитать бюджет на этой машине
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Set, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MAIN = PROJECT_ROOT / "main.py"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "startup_baseline.json"
+DEFAULT_RUNS = 7
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_SLACK_MS = 5.0
+
+HTTP_STACK = frozenset({"requests", "urllib3"})
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    argv: Tuple[str, ...]
+    forbidden: FrozenSet[str]
+
+
+@dataclass
+class Measurement:
+    import_ms: float
+    modules: Set[str]
+
+
+def build_scenarios(workdir: Path) -> List[Scenario]:
+    route = {"name": "bench", "url": "http://127.0.0.1:9/", "timeout": 1}
+    json_config = workdir / "routes.json"
+    json_config.write_text(json.dumps({"routes": [route]}), encoding="utf-8")
+    yaml_config = workdir / "routes.yaml"
+    yaml_config.write_text("routes:\n  - name: bench\n    url: http://127.0.0.1:9/\n    timeout: 1\n", encoding="utf-8")
+    results = str(workdir / "results.json")
+    return [
+        Scenario("help", ("--help",), HTTP_STACK | {"yaml", "multiprocessing"}),
+        Scenario(
+            "check-config-json",
+            ("--check-config", "--config", str(json_config)),
+            HTTP_STACK | {"yaml", "multiprocessing"},
+        ),
+        Scenario(
+            "check-config-yaml",
+            ("--check-config", "--config", str(yaml_config)),
+            HTTP_STACK | {"multiprocessing"},
+        ),
+        Scenario(
+            "one-shot-json",
+            ("--one-shot", "--config", str(json_config), "--results-path", results, "--log-level", "ERROR"),
+            frozenset({"yaml", "multiprocessing"}),
+        ),
+    ]
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Собственное время импорта (мкс) по модулям из вывода `-X importtime`."""
+    timings: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, _, name = parts
+        try:
+            timings[name.strip()] = int(self_us)
+        except ValueError:
+            continue  # строка заголовка
+    return timings
+
+
+def run_importtime(args: List[str]) -> Dict[str, int]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=PROJECT_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False,
+    )
+    return parse_importtime(completed.stderr)
+
+
+def measure(scenario: Scenario, runs: int, interpreter_modules: Set[str]) -> Measurement:
+    samples: List[float] = []
+    modules: Set[str] = set()
+    for _ in range(runs):
+        timings = run_importtime([str(MAIN), *scenario.argv])
+        own = {name: value for name, value in timings.items() if name not in interpreter_modules}
+        modules = set(own)
+        samples.append(sum(own.values()) / 1000)
+    return Measurement(import_ms=statistics.median(samples), modules=modules)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Startup import-time regression benchmark for main.py")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help=f"Runs per scenario (default: {DEFAULT_RUNS})")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Path to the baseline JSON file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Allowed relative slowdown over the baseline (default: {DEFAULT_TOLERANCE})",
+    )
+    parser.add_argument(
+        "--slack-ms",
+        type=float,
+        default=DEFAULT_SLACK_MS,
+        help=f"Allowed absolute slowdown in ms, absorbs noise on small budgets (default: {DEFAULT_SLACK_MS:g})",
+    )
+    parser.add_argument("--update", action="store_true", help="Write current measurements as the new baseline")
+    args = parser.parse_args()
+
+    baseline_path = Path(args.baseline)
+    baseline: Dict[str, Dict[str, float]] = {}
+    if baseline_path.exists() and not args.update:
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+
+    # Модули, которые интерпретатор импортирует ещё до main.py (site, .pth-файлы), в бюджет не входят.
+    interpreter_modules = set(run_importtime(["-c", "pass"]))
+    failures: List[str] = []
+    measured: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for scenario in build_scenarios(Path(tmp)):
+            result = measure(scenario, max(args.runs, 1), interpreter_modules)
+            measured[scenario.name] = {"import_ms": round(result.import_ms, 2)}
+            line = f"{scenario.name:<20} {result.import_ms:8.2f} ms"
+            budget = baseline.get(scenario.name, {}).get("import_ms")
+            if budget is not None:
+                limit = max(budget * (1 + args.tolerance), budget + args.slack_ms)
+                line += f"  (baseline {budget:.2f} ms, limit {limit:.2f} ms)"
+                if result.import_ms > limit:
+                    failures.append(f"{scenario.name}: {result.import_ms:.2f} ms > {limit:.2f} ms")
+            leaked = sorted(scenario.forbidden & result.modules)
+            if leaked:
+                failures.append(f"{scenario.name}: imports {', '.join(leaked)}")
+            print(line)
+
+    if args.update:
+        baseline_path.write_text(json.dumps(measured, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline written to {baseline_path}")
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
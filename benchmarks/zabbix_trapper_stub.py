@@ -0,0 +1,100 @@
+"""Заглушка сервера Zabbix для проверки `--zabbix-server` без настоящего Zabbix.
+
+Принимает пакеты траппера, отвечает `success` и раз в `--report` секунд печатает число соединений и значений.
+`--down-for` секунд после старта соединения сбрасываются (проверка спула и повторов), `--reject-keys` помечает
+значения с этими подстроками в ключе как отвергнутые, `--dump` пишет принятые значения в JSONL-файл.
+
+    python benchmarks/zabbix_trapper_stub.py --port 10051 --down-for 10 --dump /tmp/trapper.jsonl
+    python main.py --config config/routes --zabbix-server 127.0.0.1:10051 --zabbix-spool /tmp/zbx-spool
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, TextIO
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from monitoring.zabbix_sender import encode_packet, read_packet  # noqa: E402
+
+
+class TrapperStub(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port: int, down_for: float, reject_keys: List[str], dump: Optional[TextIO]) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.up_at = time.monotonic() + down_for
+        self.reject_keys = reject_keys
+        self.dump = dump
+        self.connections = 0
+        self.values = 0
+        self.refused = 0
+        self.lock = threading.Lock()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: TrapperStub
+
+    def handle(self) -> None:
+        server = self.server
+        if time.monotonic() < server.up_at:
+            with server.lock:
+                server.refused += 1
+            return
+        started = time.perf_counter()
+        request = read_packet(self.request)
+        data = request.get("data", [])
+        failed = sum(1 for item in data if any(key in item.get("key", "") for key in server.reject_keys))
+        with server.lock:
+            server.connections += 1
+            server.values += len(data)
+            if server.dump is not None:
+                for item in data:
+                    server.dump.write(json.dumps(item, ensure_ascii=False) + "\n")
+                server.dump.flush()
+        info = (
+            f"processed: {len(data) - failed}; failed: {failed}; total: {len(data)}; "
+            f"seconds spent: {time.perf_counter() - started:.6f}"
+        )
+        self.request.sendall(encode_packet({"response": "success", "info": info}))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=10051)
+    parser.add_argument("--down-for", type=float, default=0.0, help="Reset connections for N seconds after start")
+    parser.add_argument("--reject-keys", default="", help="Comma-separated key substrings reported as failed")
+    parser.add_argument("--dump", default=None, help="Append received values to this JSONL file")
+    parser.add_argument("--report", type=float, default=5.0, help="Print counters every N seconds")
+    args = parser.parse_args()
+
+    dump = open(args.dump, "a", encoding="utf-8") if args.dump else None
+    reject = [key for key in args.reject_keys.split(",") if key]
+    server = TrapperStub(args.port, args.down_for, reject, dump)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Trapper stub listening on 127.0.0.1:{args.port}", flush=True)
+    try:
+        while True:
+            time.sleep(args.report)
+            print(
+                f"connections={server.connections} values={server.values} refused={server.refused}", flush=True
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        if dump is not None:
+            dump.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
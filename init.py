@@ -1,11 +1,77 @@
 """Утилиты логирования для сервиса мониторинга."""
 from __future__ import annotations
 
+import atexit
+import copy
 import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Iterable, Optional, Union
+from typing import Any, Iterable, List, Optional, Union
+
+DEFAULT_LOG_QUEUE_SIZE = 10000
+DEFAULT_LOG_BACKUP_COUNT = 5
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(threadName)s] %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 _LOGGER_INITIALIZED = False
+_LISTENER: Optional[QueueListener] = None
+_QUEUE_HANDLER: Optional["BoundedQueueHandler"] = None
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Кладёт записи в ограниченную очередь без ожидания и считает пропущенные при переполнении.
+
+    Поток монитора не блокируется на вводе-выводе: форматирование и запись выполняет слушатель.
+    С `serialize=True` traceback превращается в текст, чтобы запись можно было передать в другой процесс.
+    """
+
+    def __init__(self, log_queue: Any, serialize: bool = False) -> None:
+        super().__init__(log_queue)
+        self.serialize = serialize
+        self.dropped = 0
+        self._unreported = 0
+        self._drops_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Подставляем аргументы сразу: изменяемые объекты могут поменяться до обработки слушателем.
+        prepared = copy.copy(record)
+        prepared.msg = record.getMessage()
+        prepared.args = None
+        if self.serialize and record.exc_info:
+            prepared.exc_text = logging.Formatter().formatException(record.exc_info)
+            prepared.exc_info = None
+        return prepared
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drops_lock:
+                self.dropped += 1
+                self._unreported += 1
+            return
+        if self._unreported:
+            self.report_drops()
+
+    def report_drops(self, timeout: Optional[float] = None) -> None:
+        """Ставит в очередь предупреждение о пропущенных записях, если они были."""
+        with self._drops_lock:
+            count, self._unreported = self._unreported, 0
+        if not count:
+            return
+        notice = logging.LogRecord(
+            "logging", logging.WARNING, __file__, 0, f"Очередь логов переполнена, пропущено записей: {count}", None, None
+        )
+        try:
+            if timeout is None:
+                self.queue.put_nowait(notice)
+            else:
+                self.queue.put(notice, timeout=timeout)
+        except queue.Full:
+            with self._drops_lock:
+                self._unreported += count
 
 
 def _to_numeric_level(level: Union[str, int]) -> int:
@@ -17,22 +83,77 @@ def _to_numeric_level(level: Union[str, int]) -> int:
     raise ValueError(f"Unsupported log level: {level}")
 
 
-def init_logging(level: Union[str, int] = "INFO", log_files: Optional[Iterable[str]] = None) -> None:
-    """Единоразово настраивает глобальное логирование."""
-    global _LOGGER_INITIALIZED
-    if _LOGGER_INITIALIZED:
-        return
-
-    handlers = [logging.StreamHandler()]
+def _build_handlers(
+    log_files: Optional[Iterable[str]], max_bytes: int, backup_count: int
+) -> List[logging.Handler]:
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
     for file_path in log_files or []:
         path = Path(file_path).expanduser()
         path.parent.mkdir(parents=True, exist_ok=True)
-        handlers.append(logging.FileHandler(path, encoding="utf-8"))
-
-    logging.basicConfig(
-        level=_to_numeric_level(level),
-        format="%(asctime)s %(levelname)s [%(threadName)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=handlers,
-    )
+        if max_bytes > 0:
+            handlers.append(
+                RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+            )
+        else:
+            handlers.append(logging.FileHandler(path, encoding="utf-8"))
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def init_logging(
+    level: Union[str, int] = "INFO",
+    log_files: Optional[Iterable[str]] = None,
+    queue_size: int = 0,
+    max_bytes: int = 0,
+    backup_count: int = DEFAULT_LOG_BACKUP_COUNT,
+    log_queue: Any = None,
+) -> None:
+    """Единоразово настраивает глобальное логирование.
+
+    `queue_size > 0` включает асинхронный режим: записи попадают в очередь такого размера, а в файлы и
+    консоль их пишет отдельный поток. `max_bytes > 0` включает ротацию файлов по размеру. Если передана
+    `log_queue` (очередь multiprocessing), записи только отправляются в неё — так логирует воркер.
+    """
+    global _LOGGER_INITIALIZED, _LISTENER, _QUEUE_HANDLER
+    if _LOGGER_INITIALIZED:
+        return
+
+    root = logging.getLogger()
+    root.setLevel(_to_numeric_level(level))
+    if log_queue is not None:
+        root.addHandler(BoundedQueueHandler(log_queue, serialize=True))
+    elif queue_size > 0:
+        handlers = _build_handlers(log_files, max_bytes, backup_count)
+        records: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+        _QUEUE_HANDLER = BoundedQueueHandler(records)
+        root.addHandler(_QUEUE_HANDLER)
+        _LISTENER = QueueListener(records, *handlers, respect_handler_level=True)
+        _LISTENER.start()
+        atexit.register(shutdown_logging)
+    else:
+        for handler in _build_handlers(log_files, max_bytes, backup_count):
+            root.addHandler(handler)
     _LOGGER_INITIALIZED = True
+
+
+def dropped_log_records() -> int:
+    """Сколько записей асинхронный режим пропустил из-за переполнения очереди."""
+    return _QUEUE_HANDLER.dropped if _QUEUE_HANDLER is not None else 0
+
+
+def shutdown_logging() -> None:
+    """Дописывает накопленные записи и останавливает поток асинхронного логирования."""
+    global _LISTENER
+    listener, _LISTENER = _LISTENER, None
+    if listener is None:
+        return
+    root = logging.getLogger()
+    if _QUEUE_HANDLER is not None:
+        _QUEUE_HANDLER.report_drops(timeout=1.0)
+        root.removeHandler(_QUEUE_HANDLER)
+    listener.stop()
+    # Записи, пришедшие после остановки (например, от зависших потоков-демонов), пишем синхронно.
+    for handler in listener.handlers:
+        root.addHandler(handler)
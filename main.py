@@ -2,25 +2,44 @@
 from __future__ import annotations
 
 import argparse
+import json
 import logging
 import os
+import signal
 import sys
 import time
+from collections import ChainMap
 from pathlib import Path
 from threading import Event
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, List, Optional, Union
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 import init
-from monitoring.config import MonitoringConfig, load_config
+from monitoring.config import ConfigLoader
 from monitoring.env import apply_env
-from monitoring.persistence import ResultWriter
-from threads.factory import build_monitors
+from monitoring.persistence import DEFAULT_COMPARE_FIELDS, DEFAULT_HEARTBEAT, ResultWriter
+from monitoring.cluster import ClusterMembership
+from monitoring.sharding import SHARD_KEYS, route_key
+from monitoring.rollups import RollupAggregator
+from monitoring.selfstats import SELF_STATS
+from monitoring.stats import DEFAULT_PERCENTILES, WindowStats, parse_duration
+from monitoring.types import HttpRouteConfig
+from threads.base import DEFAULT_WARMUP_LEAD
+from threads.oneshot import DEFAULT_CONCURRENCY, run_one_shot
+
+if TYPE_CHECKING:
+    from monitoring.cassette import CassetteRecorder
+    from threads.supervisor import MonitorSupervisor
+    from threads.workers import WorkerPool
 
 DEFAULT_TZ = "Europe/Moscow"
+DEFAULT_SHUTDOWN_GRACE = 5.0
+
+# Мониторы (requests, urllib3) и multiprocessing импортируются только в режимах, где они нужны.
+Runner = Union["MonitorSupervisor", "WorkerPool"]
 
 
 def parse_args() -> argparse.Namespace:
@@ -30,6 +49,11 @@ def parse_args() -> argparse.Namespace:
         default="config/routes",
         help="Path to a YAML/JSON file or directory with route definitions (default: config/routes)",
     )
+    parser.add_argument(
+        "--config-cache",
+        default=None,
+        help="Path to a compiled config cache; unchanged config files are loaded from it without parsing",
+    )
     parser.add_argument(
         "--results-path",
         "--results-file",
@@ -37,6 +61,166 @@ def parse_args() -> argparse.Namespace:
         default="monitoring_results.json",
         help="Path to a JSON file or directory where probe results will be stored",
     )
+    parser.add_argument(
+        "--changes-only",
+        action="store_true",
+        help="Skip writing a result that matches the last written one; see --compare-fields and --heartbeat",
+    )
+    parser.add_argument(
+        "--compare-fields",
+        default=",".join(DEFAULT_COMPARE_FIELDS),
+        help="Comma-separated result fields that make a result 'changed' in --changes-only mode "
+        f"(default: {','.join(DEFAULT_COMPARE_FIELDS)})",
+    )
+    parser.add_argument(
+        "--latency-threshold-ms",
+        type=float,
+        default=None,
+        help="In --changes-only mode also write when response_time_ms moved by at least this much",
+    )
+    parser.add_argument(
+        "--heartbeat",
+        type=float,
+        default=DEFAULT_HEARTBEAT,
+        help="In --changes-only mode write every route at least this often, in seconds "
+        f"(default: {DEFAULT_HEARTBEAT:g})",
+    )
+    parser.add_argument(
+        "--history-db",
+        default=None,
+        help="Also append every result to this SQLite database; query it with `main.py history --db PATH`",
+    )
+    parser.add_argument(
+        "--history-retention-days",
+        type=float,
+        default=7.0,
+        help="Delete history rows older than N days; 0 keeps everything (default: 7)",
+    )
+    parser.add_argument(
+        "--stats-window",
+        default=None,
+        help="Comma-separated rolling windows, e.g. 5m,1h; adds success ratio and latency percentiles "
+        "over each window to every result",
+    )
+    parser.add_argument(
+        "--stats-percentiles",
+        default="50,95,99",
+        help="Latency percentiles reported for --stats-window (default: 50,95,99)",
+    )
+    parser.add_argument(
+        "--rollups",
+        action="store_true",
+        help="Publish per-tag and per-source-file aggregates in the results output",
+    )
+    parser.add_argument(
+        "--query-socket",
+        default=None,
+        help="Serve latest results, rollups and Zabbix LLD over a local Unix socket at this path "
+        "(ignored with --one-shot)",
+    )
+    parser.add_argument(
+        "--status-table",
+        default=None,
+        help="Also keep fixed-size per-route status records in this memory-mapped file; "
+        "the name-to-slot index is written next to it as <PATH>.index.json",
+    )
+    parser.add_argument(
+        "--zabbix-server",
+        default=None,
+        help="Push results to this Zabbix server or proxy (HOST[:PORT]) using the trapper protocol",
+    )
+    parser.add_argument(
+        "--zabbix-host",
+        default=None,
+        help="Host name the trapper items belong to in Zabbix (default: this machine's hostname)",
+    )
+    parser.add_argument(
+        "--zabbix-key-prefix",
+        default="sber.route",
+        help="Trapper item key prefix: <prefix>[<route>,<field>] and <prefix>.discovery (default: sber.route)",
+    )
+    parser.add_argument(
+        "--zabbix-fields",
+        default="ok,status_code,response_time_ms,error",
+        help="Result fields sent as trapper values (default: ok,status_code,response_time_ms,error)",
+    )
+    parser.add_argument(
+        "--zabbix-batch-size",
+        type=int,
+        default=250,
+        help="Maximum number of values per trapper connection (default: 250)",
+    )
+    parser.add_argument(
+        "--zabbix-flush-interval",
+        type=float,
+        default=1.0,
+        help="Send a partial batch after this many seconds (default: 1.0)",
+    )
+    parser.add_argument(
+        "--zabbix-spool",
+        default=None,
+        help="Directory for batches that could not be sent; without it they are kept in memory",
+    )
+    parser.add_argument(
+        "--zabbix-spool-max-mb",
+        type=float,
+        default=64.0,
+        help="Maximum size of --zabbix-spool; the oldest batches are dropped beyond it (default: 64)",
+    )
+    parser.add_argument(
+        "--metrics-listen",
+        default=None,
+        help="Serve Prometheus metrics at http://HOST:PORT/metrics, e.g. 127.0.0.1:9108 or :9108",
+    )
+    parser.add_argument(
+        "--self-metrics",
+        action="store_true",
+        help="Measure scheduling lag, writer lock wait/hold, write, prepare and request times and publish them "
+        "in the results output, the query socket and /metrics",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=None,
+        help="Enable on-demand profiling: SIGUSR1 toggles a sampling CPU profile, SIGUSR2 toggles tracemalloc; "
+        "results are written to this directory",
+    )
+    parser.add_argument(
+        "--profile-duration",
+        type=float,
+        default=60.0,
+        help="Stop a profiling session automatically after N seconds (default: 60)",
+    )
+    parser.add_argument(
+        "--profile-interval",
+        type=float,
+        default=0.01,
+        help="Sampling interval of the CPU profiler in seconds (default: 0.01)",
+    )
+    parser.add_argument(
+        "--query-socket-profiling",
+        action="store_true",
+        help="Also accept profile/cpu and profile/memory commands on --query-socket (requires --profile-dir)",
+    )
+    parser.add_argument(
+        "--record-cassette",
+        default=None,
+        help="Record every HTTP exchange of the monitors into this cassette (.jsonl, or .jsonl.gz compressed)",
+    )
+    parser.add_argument(
+        "--cassette-redact-params",
+        default="",
+        help="Comma-separated query parameters to redact in recorded URLs, in addition to token, api_key and the like",
+    )
+    parser.add_argument(
+        "--replay-cassette",
+        default=None,
+        help="Answer monitor requests from this cassette instead of the network",
+    )
+    parser.add_argument(
+        "--replay-timing",
+        action="store_true",
+        help="With --replay-cassette, delay every response by its recorded time",
+    )
     parser.add_argument(
         "--env-file",
         action="append",
@@ -53,12 +237,110 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Optional log file path",
     )
+    parser.add_argument(
+        "--log-async",
+        action="store_true",
+        help="Write logs from a background thread; monitor threads only enqueue records",
+    )
+    parser.add_argument(
+        "--log-queue-size",
+        type=int,
+        default=init.DEFAULT_LOG_QUEUE_SIZE,
+        help="Maximum number of queued log records in --log-async mode; extra records are dropped and counted "
+        f"(default: {init.DEFAULT_LOG_QUEUE_SIZE})",
+    )
+    parser.add_argument(
+        "--log-max-bytes",
+        type=int,
+        default=0,
+        help="Rotate --log-file when it reaches this size in bytes (default: 0, no rotation)",
+    )
+    parser.add_argument(
+        "--log-backup-count",
+        type=int,
+        default=init.DEFAULT_LOG_BACKUP_COUNT,
+        help=f"Number of rotated log files to keep (default: {init.DEFAULT_LOG_BACKUP_COUNT})",
+    )
     parser.add_argument(
         "--one-shot",
         action="store_true",
         help="Run every monitor once and exit (useful for ad-hoc checks)",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--check-config",
+        action="store_true",
+        help="Load and validate the config, print the number of routes and exit without probing",
+    )
+    parser.add_argument(
+        "--warmup",
+        action="store_true",
+        help="Open connections to every route host before the first probe and re-open them before "
+        "each probe after a long idle interval",
+    )
+    parser.add_argument(
+        "--warmup-lead",
+        type=float,
+        default=DEFAULT_WARMUP_LEAD,
+        help=f"Seconds before a scheduled probe to re-warm idle connections (default: {DEFAULT_WARMUP_LEAD:g})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Run monitors in N worker processes; results are written by the parent process (default: 0, in-process)",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=sorted(SHARD_KEYS),
+        default="name",
+        help="How routes are distributed between worker processes: consistent hash of route name or source file",
+    )
+    parser.add_argument(
+        "--node-id",
+        default=None,
+        help="Cluster node id; enables cluster mode where this node probes only its consistent-hash share of routes",
+    )
+    parser.add_argument(
+        "--cluster-members",
+        default=None,
+        help="Comma-separated cluster node ids or path to a members file (re-read when it changes)",
+    )
+    parser.add_argument(
+        "--replicas",
+        type=int,
+        default=1,
+        help="How many cluster nodes probe each route (default: 1)",
+    )
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=0.0,
+        help="Poll the config directory every N seconds and apply changed files without restart "
+        "(default: 0, only on SIGHUP)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Maximum number of routes probed in parallel in --one-shot mode (default: {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Overall time limit in seconds for --one-shot; unfinished routes are abandoned",
+    )
+    parser.add_argument(
+        "--shutdown-grace",
+        type=float,
+        default=DEFAULT_SHUTDOWN_GRACE,
+        help="Total time in seconds allowed for stopping all monitors on SIGTERM/SIGINT "
+        f"(default: {DEFAULT_SHUTDOWN_GRACE:g})",
+    )
+    args = parser.parse_args()
+    if args.node_id and not args.cluster_members:
+        parser.error("--node-id requires --cluster-members")
+    return args
 
 
 def _load_env_files(paths: list[str]) -> None:
@@ -81,7 +363,7 @@ def _parse_env_file(path: Path, base_env: dict[str, str]) -> dict[str, str]:
         if not item:
             continue
         key, raw_value = item
-        resolved_value = apply_env(raw_value, {**base_env, **parsed})
+        resolved_value = apply_env(raw_value, ChainMap(parsed, base_env))
         parsed[key] = str(resolved_value)
     return parsed
 
@@ -141,24 +423,295 @@ def configure_timezone(default_tz: str = DEFAULT_TZ) -> str:
     return tz_value
 
 
-def _wait_for(monitors, stop_event: Event, one_shot: bool) -> None:
+def install_stop_handlers(stop_requested: Event) -> None:
+    """SIGTERM и SIGINT запрашивают остановку; повторный сигнал завершает процесс сразу."""
+
+    def handle(signum: int, frame: object) -> None:
+        if stop_requested.is_set():
+            raise SystemExit(128 + signum)
+        stop_requested.set()
+
+    for name in ("SIGTERM", "SIGINT"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), handle)
+
+
+def _wait_for(
+    runner: Runner,
+    one_shot: bool,
+    stop_requested: Event,
+    grace: float = DEFAULT_SHUTDOWN_GRACE,
+    on_tick: Optional[Callable[[], None]] = None,
+) -> None:
     try:
-        while True:
-            alive = any(m.is_alive() for m in monitors)
-            if not alive:
-                break
-            time.sleep(1)
-            if one_shot and not alive:
+        while not stop_requested.wait(1):
+            if one_shot and not runner.is_alive():
                 break
-    except KeyboardInterrupt:
-        logging.info("Received interrupt, stopping monitors...")
-        stop_event.set()
+            runner.supervise()
+            if on_tick is not None:
+                on_tick()
+        if stop_requested.is_set():
+            logging.info("Received stop signal, stopping monitors (grace %.1fs)...", grace)
     finally:
-        for monitor in monitors:
-            monitor.join(timeout=5)
+        started = time.monotonic()
+        runner.stop_all(timeout=grace)
+        logging.debug("Monitors stopped in %.2fs", time.monotonic() - started)
+
+
+def _log_metrics() -> List[tuple]:
+    dropped = init.dropped_log_records()
+    return [("sber_monitor_log_dropped_total", "counter", "Log records dropped by --log-async", [({}, dropped)])]
+
+
+def _publish_routes(writer: ResultWriter, routes: List[HttpRouteConfig]) -> None:
+    """Сообщает выходам с привязкой к набору маршрутов (таблица статусов, LLD в Zabbix, сводки) новый набор."""
+    if writer.status_table is not None:
+        writer.status_table.assign(routes)
+    if writer.sender is not None:
+        writer.sender.discover(routes)
+    if writer.metrics is not None:
+        writer.metrics.retain(routes)
+    if writer.stats is not None:
+        writer.stats.retain(routes)
+    if writer.rollups is not None:
+        writer.rollups.retain(routes)
+    writer.retain(routes)
+    if writer.self_metrics:
+        SELF_STATS.forget_routes([route_key(route) for route in routes])
+
+
+def _close_writer(writer: ResultWriter) -> None:
+    writer.flush()
+    if writer.skipped:
+        logging.info("Unchanged results not written immediately: %s", writer.skipped)
+    if writer.history is not None:
+        writer.history.close()
+    if writer.status_table is not None:
+        writer.status_table.close()
+    if writer.metrics is not None:
+        writer.metrics.stop()
+    if writer.sender is not None:
+        writer.sender.close()
+        logging.info(
+            "Zabbix sender: sent=%s rejected=%s dropped=%s",
+            writer.sender.sent,
+            writer.sender.failed,
+            writer.sender.dropped + writer.sender.spool_dropped,
+        )
+
+
+class RouteManager:
+    """Применяет к запущенным мониторам изменения конфигурации и состава кластера."""
+
+    def __init__(
+        self,
+        runner: Runner,
+        loader: ConfigLoader,
+        routes: List[HttpRouteConfig],
+        membership: Optional[ClusterMembership] = None,
+        reload_interval: float = 0.0,
+        on_routes: Optional[Callable[[List[HttpRouteConfig]], None]] = None,
+    ) -> None:
+        self.runner = runner
+        self.loader = loader
+        self.routes = routes
+        self.membership = membership
+        self.reload_interval = reload_interval
+        # Вызывается с новым набором маршрутов узла после каждого применения изменений.
+        self.on_routes = on_routes
+        self.reload_requested = Event()
+        self._next_poll = time.monotonic() + reload_interval
+
+    def owned_routes(self) -> List[HttpRouteConfig]:
+        if self.membership is None:
+            return self.routes
+        return self.membership.assign(self.routes)
+
+    def tick(self) -> None:
+        membership_changed = self._refresh_membership()
+        config_changed = self._reload_config()
+        if membership_changed or config_changed:
+            self._apply()
+
+    def _refresh_membership(self) -> bool:
+        if self.membership is None:
+            return False
+        try:
+            changed = self.membership.refresh()
+        except Exception as exc:  # noqa: BLE001
+            logging.error("Failed to read cluster members %s: %s", self.membership.path, exc)
+            return False
+        if changed:
+            logging.info("Cluster membership changed: %s", ", ".join(self.membership.members))
+        return changed
+
+    def _reload_config(self) -> bool:
+        now = time.monotonic()
+        polled = self.reload_interval > 0 and now >= self._next_poll
+        if not polled and not self.reload_requested.is_set():
+            return False
+        self.reload_requested.clear()
+        self._next_poll = now + self.reload_interval
+        try:
+            config = self.loader.load()
+        except Exception as exc:  # noqa: BLE001
+            logging.error("Failed to reload config %s, keeping current routes: %s", self.loader.path, exc)
+            return False
+        if not self.loader.changed:
+            return False
+        logging.info(
+            "Config reloaded: changed files=%s removed files=%s",
+            ", ".join(self.loader.reparsed) or "-",
+            ", ".join(self.loader.removed) or "-",
+        )
+        self.routes = config.enabled_routes
+        return True
+
+    def _apply(self) -> None:
+        routes = self.owned_routes()
+        try:
+            started, stopped, replaced = self.runner.sync(routes)
+        except Exception as exc:  # noqa: BLE001
+            logging.error("Failed to apply route changes: %s", exc)
+            return
+        logging.info(
+            "Now monitoring %s routes: started=%s stopped=%s replaced=%s", len(routes), started, stopped, replaced
+        )
+        if self.on_routes is not None:
+            self.on_routes(routes)
+
+
+def _install_cassette(
+    record: Optional[str], replay: Optional[str], timing: bool, redact_params: str = ""
+) -> Optional["CassetteRecorder"]:
+    if record and replay:
+        raise ValueError("--record-cassette and --replay-cassette are mutually exclusive")
+    from monitoring.cassette import install_recording, install_replay
+
+    if replay:
+        cassette = install_replay(replay, timing=timing)
+        logging.info("Replaying %s recorded exchanges from %s", len(cassette), replay)
+        return None
+    assert record is not None
+    recorder = install_recording(
+        record, redact_params=[name.strip() for name in redact_params.split(",") if name.strip()]
+    )
+    logging.info("Recording HTTP exchanges to %s", record)
+    return recorder
+
+
+def _close_cassette(recorder: Optional["CassetteRecorder"]) -> None:
+    if recorder is None:
+        return
+    recorder.close()
+    logging.info(
+        "Cassette %s: recorded=%s skipped=%s (per-request limit)", recorder.path, recorder.recorded, recorder.skipped
+    )
+
+
+def loadtest_main(argv: List[str]) -> int:
+    """Точка входа `main.py loadtest`: нагрузка маршрутами из конфигурации без записи результатов."""
+    parser = argparse.ArgumentParser(
+        prog="main.py loadtest", description="Drive configured routes at a target rate or concurrency"
+    )
+    parser.add_argument("--config", default="config/routes", help="Path to YAML/JSON config or directory")
+    parser.add_argument("--route", action="append", default=[], help="Only this route (can be repeated)")
+    parser.add_argument("--tag", default=None, help="Only routes with this tag")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Target runs per second across all routes (open model); without it routes run back-to-back",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Worker threads: the pool size with --rate (default: 100), otherwise concurrent runs (default: 10)",
+    )
+    parser.add_argument(
+        "--arrivals", choices=["uniform", "poisson"], default="uniform", help="Arrival spacing with --rate"
+    )
+    parser.add_argument("--duration", default="60", help="Measured period, e.g. 90, 5m (default: 60 seconds)")
+    parser.add_argument("--warmup", default="0", help="Unmeasured period before it, e.g. 10 (default: 0)")
+    parser.add_argument("--percentiles", default="50,95,99", help="Latency percentiles (default: 50,95,99)")
+    parser.add_argument("--grace", type=float, default=10.0, help="Time for scheduled runs to finish after the period")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for Poisson arrivals")
+    parser.add_argument("--format", choices=["table", "json"], default="table", help="Output format (default: table)")
+    parser.add_argument("--replay-cassette", default=None, help="Answer requests from this cassette, no network")
+    parser.add_argument("--replay-timing", action="store_true", help="Delay replayed responses by recorded time")
+    parser.add_argument("--env-file", action="append", default=[], help="Path to .env file (can be repeated)")
+    parser.add_argument("--log-level", default="WARNING", help="Logging level (default: WARNING)")
+    args = parser.parse_args(argv)
+    try:
+        duration = parse_duration(args.duration)
+        warmup = parse_duration(args.warmup)
+        percentiles = [float(item) for item in args.percentiles.split(",") if item.strip()]
+    except ValueError as exc:
+        parser.error(str(exc))
+    try:
+        _load_env_files(args.env_file)
+    except Exception as exc:  # noqa: BLE001
+        print(f"Failed to load .env files: {exc}", file=sys.stderr)
+        return 1
+    init.init_logging(args.log_level)
+    try:
+        config = ConfigLoader(args.config).load()
+    except Exception as exc:  # noqa: BLE001
+        logging.error("Failed to load config %s: %s", args.config, exc)
+        return 1
+    routes = [
+        route
+        for route in config.enabled_routes
+        if (not args.route or route.name in args.route) and (args.tag is None or args.tag in route.tags)
+    ]
+    if not routes:
+        logging.error("No enabled routes match the selection")
+        return 1
+
+    if args.replay_cassette:
+        try:
+            _install_cassette(None, args.replay_cassette, args.replay_timing)
+        except (OSError, ValueError) as exc:
+            logging.error("Failed to open cassette: %s", exc)
+            return 1
+
+    from threads.loadtest import run_load_test
+
+    stop_requested = Event()
+    install_stop_handlers(stop_requested)
+    mode = f"{args.rate:g} runs/s" if args.rate else "back-to-back"
+    logging.warning("Load test: %s routes, %s, %.0fs (+%.0fs warm-up)", len(routes), mode, duration, warmup)
+    try:
+        report = run_load_test(
+            routes,
+            duration,
+            rate=args.rate,
+            concurrency=args.concurrency,
+            arrivals=args.arrivals,
+            warmup=warmup,
+            percentiles=percentiles,
+            stop_event=stop_requested,
+            shutdown_grace=args.grace,
+            seed=args.seed,
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.format == "json":
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print(report.format())
+    return 0
 
 
 def main() -> int:
+    if sys.argv[1:2] == ["history"]:
+        # Подкоманда только читает базу истории: конфигурация и мониторы ей не нужны.
+        from monitoring.history import history_main
+
+        return history_main(sys.argv[2:])
+    if sys.argv[1:2] == ["loadtest"]:
+        return loadtest_main(sys.argv[2:])
     args = parse_args()
     try:
         _load_env_files(args.env_file)
@@ -167,39 +720,233 @@ def main() -> int:
         return 1
     configure_timezone()
     log_files = [args.log_file] if args.log_file else None
-    init.init_logging(args.log_level, log_files=log_files)
+    init.init_logging(
+        args.log_level,
+        log_files=log_files,
+        queue_size=max(args.log_queue_size, 1) if args.log_async else 0,
+        max_bytes=args.log_max_bytes,
+        backup_count=args.log_backup_count,
+    )
 
+    loader = ConfigLoader(args.config, cache_path=args.config_cache)
     try:
-        config = load_config(args.config)
+        config = loader.load()
     except Exception as exc:  # noqa: BLE001
         logging.error("Failed to load config %s: %s", args.config, exc)
         return 1
 
     enabled_routes = config.enabled_routes
+    if args.check_config:
+        print(f"Config OK: {len(config.routes)} routes, {len(enabled_routes)} enabled")
+        return 0
     if not enabled_routes:
         logging.warning("No enabled routes configured. Nothing to monitor.")
         return 0
 
-    writer = ResultWriter(args.results_path)
-    stop_event = Event()
+    membership: Optional[ClusterMembership] = None
+    if args.node_id:
+        try:
+            membership = ClusterMembership(args.node_id, args.cluster_members, replicas=args.replicas)
+        except Exception as exc:  # noqa: BLE001
+            logging.error("Failed to load cluster members %s: %s", args.cluster_members, exc)
+            return 1
+        logging.info(
+            "Cluster node %s owns %s of %s routes (%s members, replicas=%s)",
+            args.node_id,
+            len(membership.assign(enabled_routes)),
+            len(enabled_routes),
+            len(membership.members),
+            membership.replicas,
+        )
+
+    recorder = None
+    if args.record_cassette or args.replay_cassette:
+        if args.workers > 0:
+            logging.error("--record-cassette and --replay-cassette are not supported with --workers")
+            return 1
+        try:
+            recorder = _install_cassette(
+                args.record_cassette, args.replay_cassette, args.replay_timing, args.cassette_redact_params
+            )
+        except (OSError, ValueError) as exc:
+            logging.error("Failed to open cassette: %s", exc)
+            return 1
+
+    writer = ResultWriter(
+        args.results_path,
+        changes_only=args.changes_only,
+        compare_fields=[field.strip() for field in args.compare_fields.split(",") if field.strip()],
+        latency_threshold_ms=args.latency_threshold_ms,
+        heartbeat=args.heartbeat,
+    )
+    if args.stats_window:
+        try:
+            writer.stats = WindowStats(
+                [parse_duration(item) for item in args.stats_window.split(",") if item.strip()],
+                percentiles=[float(item) for item in args.stats_percentiles.split(",") if item.strip()],
+            )
+        except ValueError as exc:
+            logging.error("Invalid --stats-window/--stats-percentiles: %s", exc)
+            return 1
+    if args.rollups:
+        writer.rollups = RollupAggregator(
+            window_lengths=writer.stats.lengths if writer.stats is not None else (),
+            percentiles=writer.stats.percentiles if writer.stats is not None else DEFAULT_PERCENTILES,
+        )
+    if args.history_db:
+        from monitoring.history import HistoryStore
+
+        try:
+            writer.history = HistoryStore(args.history_db, retention_days=args.history_retention_days or None)
+        except Exception as exc:  # noqa: BLE001
+            logging.error("Failed to open history database %s: %s", args.history_db, exc)
+            return 1
+    if args.status_table:
+        from monitoring.status_table import StatusTable
+
+        try:
+            writer.status_table = StatusTable(args.status_table)
+        except (OSError, ValueError) as exc:
+            logging.error("Failed to open status table %s: %s", args.status_table, exc)
+            return 1
+    if args.zabbix_server:
+        from monitoring.zabbix_sender import DEFAULT_PORT, ZabbixSender
+
+        server, _, port = args.zabbix_server.partition(":")
+        try:
+            writer.sender = ZabbixSender(
+                server,
+                port=int(port) if port else DEFAULT_PORT,
+                host=args.zabbix_host,
+                key_prefix=args.zabbix_key_prefix,
+                fields=[field.strip() for field in args.zabbix_fields.split(",") if field.strip()],
+                batch_size=args.zabbix_batch_size,
+                flush_interval=args.zabbix_flush_interval,
+                spool_dir=args.zabbix_spool,
+                spool_max_bytes=int(args.zabbix_spool_max_mb * 1024 * 1024),
+            )
+        except (OSError, ValueError) as exc:
+            logging.error("Invalid Zabbix sender settings %s: %s", args.zabbix_server, exc)
+            return 1
+    if args.self_metrics:
+        SELF_STATS.enabled = True
+        writer.self_metrics = True
+    if args.metrics_listen:
+        from monitoring.prometheus import PrometheusExporter, self_stats_collector, writer_collector
+
+        exporter = PrometheusExporter()
+        exporter.collectors.extend([exporter.self_metrics, writer_collector(writer), _log_metrics])
+        if args.self_metrics:
+            exporter.collectors.append(self_stats_collector(SELF_STATS))
+        host, _, port = args.metrics_listen.rpartition(":")
+        try:
+            exporter.serve(host or "0.0.0.0", int(port))
+        except (OSError, ValueError) as exc:
+            logging.error("Failed to serve metrics on %s: %s", args.metrics_listen, exc)
+            return 1
+        writer.metrics = exporter
+        logging.info("Serving Prometheus metrics on %s", args.metrics_listen)
+    stop_requested = Event()
+    install_stop_handlers(stop_requested)
+    monitor_options = {"one_shot": args.one_shot, "warmup": args.warmup, "warmup_lead": args.warmup_lead}
+    if args.one_shot and args.workers <= 0:
+        routes = membership.assign(enabled_routes) if membership is not None else enabled_routes
+        _publish_routes(writer, routes)
+        try:
+            summary = run_one_shot(
+                routes,
+                writer,
+                concurrency=args.concurrency,
+                deadline=args.deadline,
+                stop_event=stop_requested,
+                shutdown_grace=args.shutdown_grace,
+                warmup=args.warmup,
+                warmup_lead=args.warmup_lead,
+            )
+        except Exception as exc:  # noqa: BLE001
+            logging.error("Failed to initialize monitors: %s", exc)
+            return 1
+        finally:
+            _close_cassette(recorder)
+        _close_writer(writer)
+        print(summary.format())
+        return 0
+
+    runner: Runner
+    if args.workers > 0:
+        from threads.workers import WorkerPool
+
+        runner = WorkerPool(
+            writer,
+            args.workers,
+            shard_by=args.shard_by,
+            log_level=args.log_level,
+            **monitor_options,
+        )
+    else:
+        from threads.supervisor import MonitorSupervisor
+
+        runner = MonitorSupervisor(writer, **monitor_options)
 
+    manager = RouteManager(
+        runner,
+        loader,
+        enabled_routes,
+        membership,
+        reload_interval=args.reload_interval,
+        on_routes=lambda routes: _publish_routes(writer, routes),
+    )
+    routes = manager.owned_routes()
+    _publish_routes(writer, routes)
     try:
-        monitors = build_monitors(enabled_routes, writer, stop_event, one_shot=args.one_shot)
+        runner.sync(routes)
     except Exception as exc:  # noqa: BLE001
         logging.error("Failed to initialize monitors: %s", exc)
+        runner.stop_all()
         return 1
-
-    for monitor in monitors:
-        monitor.start()
+    if args.workers > 0 and isinstance(runner, WorkerPool):
         logging.info(
-            "Started monitor %s %s %s interval=%ss",
-            monitor.config.name,
-            monitor.config.method,
-            monitor.config.url,
-            monitor.config.interval,
+            "Started %s worker processes for %s routes (shard by %s)",
+            sum(1 for shard in runner.shards if shard),
+            len(routes),
+            args.shard_by,
         )
 
-    _wait_for(monitors, stop_event, args.one_shot)
+    profiler = None
+    if args.profile_dir and not args.one_shot:
+        from monitoring.profiling import Profiler, install_signal_handlers
+
+        profiler = Profiler(args.profile_dir, duration=args.profile_duration, interval=args.profile_interval)
+        if install_signal_handlers(profiler):
+            logging.info("Profiling on demand: SIGUSR1 - CPU, SIGUSR2 - memory, output in %s", args.profile_dir)
+
+    query_server = None
+    if args.query_socket and not args.one_shot:
+        from monitoring.query_socket import QueryServer, QueryService
+
+        service = QueryService(writer, manager.owned_routes)
+        # Сокет доступен агенту Zabbix на чтение; команды, меняющие состояние, — только по явному флагу.
+        service.profiler = profiler if args.query_socket_profiling else None
+        try:
+            query_server = QueryServer(args.query_socket, service)
+        except OSError as exc:
+            logging.error("Failed to open query socket %s: %s", args.query_socket, exc)
+            runner.stop_all()
+            return 1
+        query_server.start()
+        logging.info("Serving queries on %s", args.query_socket)
+
+    if not args.one_shot and hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: manager.reload_requested.set())
+    try:
+        _wait_for(runner, args.one_shot, stop_requested, grace=args.shutdown_grace, on_tick=manager.tick)
+    finally:
+        if query_server is not None:
+            query_server.stop()
+        if profiler is not None:
+            profiler.stop()
+        _close_cassette(recorder)
+    _close_writer(writer)
     logging.info("Monitoring stopped")
     return 0
 
@@ -0,0 +1,329 @@
+"""Запись HTTP-обмена мониторов в кассеты и воспроизведение без сети.
+
+С `--record-cassette` сессии мониторов получают адаптер, который пишет каждый обмен `_execute_request_once`:
+итоговый URL с параметрами, заголовки и размер тела запроса, код, заголовки и тело ответа, время и ошибку
+соединения, если ответа не было. С `--replay-cassette` адаптер отвечает из кассеты, не открывая соединений.
+Ответы на один и тот же метод и URL отдаются в порядке записи по кругу, так что цепочки с подстановками и
+`wait_for` проходят так же, как при записи.
+
+Кассета — JSON Lines (с суффиксом `.gz` — сжатая gzip): первая строка — заголовок, дальше по строке на обмен.
+Одинаковые тела ответов хранятся один раз: первая запись несёт `body` (или `body_b64` для двоичных данных),
+остальные ссылаются на неё через `body_id`. Значения заголовков с учётными данными, пароль в URL и
+параметры запроса с секретами (`token`, `api_key` и т. п. плюс заданные при записи) не записываются; список
+параметров хранится в заголовке кассеты, и при воспроизведении URL запроса скрывается так же перед поиском.
+
+Записи сбрасываются на диск не реже раза в секунду, а кассета, оборванная аварийной остановкой (без конца
+gzip-потока или с недописанной строкой), читается до последней целой записи.
+"""
+from __future__ import annotations
+
+import atexit
+import base64
+import gzip
+import hashlib
+import io
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .transport import PooledHTTPAdapter, set_adapter_factory
+
+CASSETTE_VERSION = 1
+DEFAULT_MAX_PER_REQUEST = 50
+REDACTED_HEADERS = frozenset({"authorization", "proxy-authorization", "cookie", "set-cookie", "x-api-key"})
+REDACTED_PARAMS = frozenset(
+    {
+        "access_token",
+        "api_key",
+        "apikey",
+        "auth",
+        "client_secret",
+        "key",
+        "password",
+        "secret",
+        "sig",
+        "signature",
+        "token",
+    }
+)
+REDACTED = "<redacted>"
+FLUSH_INTERVAL = 1.0
+
+RequestKey = Tuple[str, str]
+
+
+def _open(path: Path, mode: str) -> IO[str]:
+    if path.suffix == ".gz":
+        return io.TextIOWrapper(gzip.open(path, mode + "b"), encoding="utf-8")
+    return path.open(mode, encoding="utf-8")
+
+
+def _headers(headers: Any) -> Dict[str, str]:
+    return {
+        str(name): REDACTED if str(name).lower() in REDACTED_HEADERS else str(value)
+        for name, value in (headers or {}).items()
+    }
+
+
+def redact_url(url: str, params: Iterable[str] = REDACTED_PARAMS) -> str:
+    """URL без пароля и значений параметров `params` (без учёта регистра); прочее не меняется."""
+    names = {name.lower() for name in params}
+    parts = urlsplit(url)
+    netloc = parts.netloc
+    if parts.password is not None:
+        netloc = f"{parts.username or ''}:{REDACTED}@{netloc.rpartition('@')[2]}"
+    query = parts.query
+    if query and names:
+        pairs = parse_qsl(query, keep_blank_values=True)
+        if any(name.lower() in names for name, _ in pairs):
+            query = urlencode([(name, REDACTED if name.lower() in names else value) for name, value in pairs])
+    if netloc == parts.netloc and query == parts.query:
+        return url
+    return urlunsplit((parts.scheme, netloc, parts.path, query, parts.fragment))
+
+
+def _body_size(body: Any) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return -1  # поток или генератор: размер неизвестен
+
+
+class CassetteRecorder:
+    """Пишет обмены в кассету; не больше `max_per_request` записей на один метод и URL."""
+
+    def __init__(
+        self,
+        path: str,
+        max_per_request: int = DEFAULT_MAX_PER_REQUEST,
+        redact_params: Iterable[str] = (),
+    ) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_per_request = max(max_per_request, 1)
+        self.redact_params = sorted(REDACTED_PARAMS | {name.lower() for name in redact_params})
+        self.recorded = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._bodies: Set[str] = set()
+        self._counts: Dict[RequestKey, int] = {}
+        self._handle: Optional[IO[str]] = _open(self.path, "w")
+        self._flushed_at = time.monotonic()
+        self._write(
+            {
+                "cassette": CASSETTE_VERSION,
+                "created": datetime.now(timezone.utc).isoformat(),
+                "redacted_params": self.redact_params,
+            }
+        )
+
+    def record(
+        self,
+        request: requests.PreparedRequest,
+        response: Optional[requests.Response],
+        elapsed_ms: float,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        key = (str(request.method), redact_url(str(request.url), self.redact_params))
+        entry: Dict[str, Any] = {
+            "method": key[0],
+            "url": key[1],
+            "request_headers": _headers(request.headers),
+            "request_bytes": _body_size(request.body),
+            "elapsed_ms": round(elapsed_ms, 2),
+        }
+        body = b""
+        if response is not None:
+            body = response.content or b""
+            entry.update(
+                {
+                    "status": response.status_code,
+                    "reason": response.reason,
+                    "headers": _headers(response.headers),
+                    "body_id": hashlib.sha1(body).hexdigest(),
+                }
+            )
+        else:
+            entry.update({"error": str(error), "error_type": type(error).__name__})
+        with self._lock:
+            if self._handle is None:
+                return
+            count = self._counts.get(key, 0)
+            if count >= self.max_per_request:
+                self.skipped += 1
+                return
+            self._counts[key] = count + 1
+            body_id = entry.get("body_id")
+            if body_id is not None and body_id not in self._bodies:
+                self._bodies.add(body_id)
+                try:
+                    entry["body"] = body.decode("utf-8")
+                except UnicodeDecodeError:
+                    entry["body_b64"] = base64.b64encode(body).decode("ascii")
+            self._write(entry)
+            self.recorded += 1
+            if time.monotonic() - self._flushed_at >= FLUSH_INTERVAL:
+                # Для gzip это Z_SYNC_FLUSH: всё записанное до этого места читается и без конца потока.
+                self._handle.flush()
+                self._flushed_at = time.monotonic()
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        assert self._handle is not None
+        self._handle.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+
+class Cassette:
+    """Загруженная кассета: записи по методу и URL и курсоры воспроизведения."""
+
+    def __init__(
+        self, entries: Dict[RequestKey, List[Dict[str, Any]]], redact_params: Iterable[str] = ()
+    ) -> None:
+        self.entries = entries
+        self.redact_params = list(redact_params)
+        self.missed = 0
+        self._cursors: Dict[RequestKey, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        file_path = Path(path).expanduser()
+        bodies: Dict[str, bytes] = {}
+        entries: Dict[RequestKey, List[Dict[str, Any]]] = {}
+        with _open(file_path, "r") as handle:
+            header = json.loads(handle.readline() or "{}")
+            if header.get("cassette") != CASSETTE_VERSION:
+                raise ValueError(f"{file_path} is not a cassette (version {CASSETTE_VERSION})")
+            try:
+                for line in handle:
+                    if not line.endswith("\n"):
+                        break  # недописанная последняя строка
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    body_id = entry.get("body_id")
+                    if "body" in entry:
+                        bodies[body_id] = entry.pop("body").encode("utf-8")
+                    elif "body_b64" in entry:
+                        bodies[body_id] = base64.b64decode(entry.pop("body_b64"))
+                    if body_id is not None:
+                        entry["content"] = bodies.get(body_id, b"")
+                    entries.setdefault((entry["method"], entry["url"]), []).append(entry)
+            except EOFError:
+                pass  # gzip без конца потока: запись оборвалась, всё сброшенное до этого уже прочитано
+        return cls(entries, redact_params=header.get("redacted_params") or ())
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self.entries.values())
+
+    def next(self, method: str, url: str) -> Optional[Dict[str, Any]]:
+        key = (method, redact_url(url, self.redact_params))
+        items = self.entries.get(key)
+        with self._lock:
+            if not items:
+                self.missed += 1
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+        return items[cursor % len(items)]
+
+
+class RecordingAdapter(PooledHTTPAdapter):
+    """Обычный адаптер мониторов, который дополнительно пишет каждый обмен в кассету."""
+
+    def __init__(self, recorder: CassetteRecorder) -> None:
+        super().__init__()
+        self.recorder = recorder
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:  # type: ignore[override]
+        started = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+            response.content  # дочитываем тело здесь, чтобы записать его вместе со временем ответа
+        except (requests.RequestException, OSError) as exc:
+            self.recorder.record(request, None, (time.perf_counter() - started) * 1000, exc)
+            raise
+        self.recorder.record(request, response, (time.perf_counter() - started) * 1000)
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Отвечает из кассеты без сети; с `timing` выдерживает записанное время ответа."""
+
+    def __init__(self, cassette: Cassette, timing: bool = False) -> None:
+        super().__init__()
+        self.cassette = cassette
+        self.timing = timing
+
+    def send(  # type: ignore[override]
+        self, request: requests.PreparedRequest, stream: bool = False, timeout: Any = None, **kwargs: Any
+    ) -> requests.Response:
+        entry = self.cassette.next(str(request.method), str(request.url))
+        if entry is None:
+            raise requests.ConnectionError(
+                f"No recorded response for {request.method} {request.url}", request=request
+            )
+        if self.timing and entry.get("elapsed_ms"):
+            time.sleep(entry["elapsed_ms"] / 1000)
+        if "error" in entry:
+            error_type = getattr(requests.exceptions, entry.get("error_type", ""), None)
+            if not (isinstance(error_type, type) and issubclass(error_type, requests.RequestException)):
+                error_type = requests.ConnectionError
+            raise error_type(entry["error"], request=request)
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason")
+        response.headers = CaseInsensitiveDict(entry.get("headers") or {})
+        response._content = entry.get("content", b"")
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = str(request.url)
+        response.request = request
+        response.elapsed = timedelta(milliseconds=entry.get("elapsed_ms") or 0)
+        response.connection = self
+        return response
+
+
+def install_recording(
+    path: str, max_per_request: int = DEFAULT_MAX_PER_REQUEST, redact_params: Iterable[str] = ()
+) -> CassetteRecorder:
+    """Новые сессии мониторов пишут обмен в кассету `path`; вызывать до создания мониторов."""
+    recorder = CassetteRecorder(path, max_per_request=max_per_request, redact_params=redact_params)
+    # Запасной путь на случай выхода мимо штатного закрытия: без этого .gz остался бы без конца потока.
+    atexit.register(recorder.close)
+    set_adapter_factory(lambda: RecordingAdapter(recorder))
+    return recorder
+
+
+def install_replay(path: str, timing: bool = False) -> Cassette:
+    """Новые сессии мониторов отвечают из кассеты `path` без сети; вызывать до создания мониторов."""
+    cassette = Cassette.load(path)
+    set_adapter_factory(lambda: ReplayAdapter(cassette, timing=timing))
+    return cassette
+
+
+__all__ = [
+    "Cassette",
+    "CassetteRecorder",
+    "RecordingAdapter",
+    "ReplayAdapter",
+    "install_recording",
+    "install_replay",
+    "redact_url",
+]
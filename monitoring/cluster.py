@@ -0,0 +1,110 @@
+"""Распределение маршрутов между узлами кластера сборщиков."""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+from .sharding import HashRing
+from .types import HttpRouteConfig
+
+
+def parse_members(raw: Any) -> List[str]:
+    """Нормализует список участников: строки без пустых и повторов, в исходном порядке."""
+    if isinstance(raw, dict):
+        raw = raw.get("members") or raw.get("nodes") or []
+    if isinstance(raw, str):
+        raw = raw.replace(",", "\n").splitlines()
+    if not isinstance(raw, list):
+        raise ValueError("Список участников кластера должен быть списком строк")
+    members: List[str] = []
+    for item in raw:
+        member = str(item).split("#", 1)[0].strip()
+        if member and member not in members:
+            members.append(member)
+    return members
+
+
+def read_members_file(path: Path) -> List[str]:
+    """Читает участников из файла: JSON/YAML (список или {members: [...]}) либо по одному в строке."""
+    content = path.read_text(encoding="utf-8")
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        return parse_members(json.loads(content or "[]"))
+    if suffix in {".yaml", ".yml"}:
+        import yaml
+
+        return parse_members(yaml.safe_load(content) or [])
+    return parse_members(content)
+
+
+MEMBERS_FILE_SUFFIXES = (".txt", ".json", ".yaml", ".yml")
+
+
+def _looks_like_path(value: str) -> bool:
+    """Похоже ли значение `--cluster-members` на путь к файлу, а не на список узлов."""
+    if "," in value:
+        return False
+    return "/" in value or "\\" in value or value.lower().endswith(MEMBERS_FILE_SUFFIXES)
+
+
+class ClusterMembership:
+    """Состав кластера из статического списка или файла, который перечитывается при изменении."""
+
+    def __init__(self, node_id: str, members: str, replicas: int = 1) -> None:
+        self.node_id = node_id
+        self.replicas = max(int(replicas), 1)
+        path = Path(members).expanduser()
+        self.path: Optional[Path] = path if path.is_file() or _looks_like_path(members) else None
+        self._mtime: Optional[float] = None
+        self.members: List[str] = []
+        if self.path is None:
+            self.members = parse_members(members)
+        elif not self.path.is_file():
+            # Иначе путь разобрался бы как список из одного «участника», и узел молча остался бы без маршрутов.
+            raise FileNotFoundError(f"Файл участников кластера не найден: {self.path}")
+        else:
+            self.refresh()
+        if not self.members:
+            raise ValueError("Список участников кластера пуст")
+
+    def refresh(self) -> bool:
+        """Перечитывает файл участников; возвращает True, если состав изменился."""
+        if self.path is None:
+            return False
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        members = read_members_file(self.path)
+        if not members:
+            # Файл мог быть пойман посреди записи: mtime не запоминаем, чтобы перечитать его на следующей проверке.
+            return False
+        self._mtime = mtime
+        if members == self.members:
+            return False
+        self.members = members
+        return True
+
+    def assign(self, routes: Sequence[HttpRouteConfig]) -> List[HttpRouteConfig]:
+        """Маршруты, которые должен проверять этот узел."""
+        return assign_routes(routes, self.members, self.node_id, replicas=self.replicas)
+
+
+def assign_routes(
+    routes: Sequence[HttpRouteConfig], members: Sequence[str], node_id: str, replicas: int = 1
+) -> List[HttpRouteConfig]:
+    """Выбирает маршруты узла по консистентному хешу `source_path:name` с учётом числа реплик."""
+    if node_id not in members:
+        return []
+    ring = HashRing(members)
+    return [
+        route
+        for route in routes
+        if node_id in ring.get_nodes(f"{route.source_path or ''}:{route.name}", count=replicas)
+    ]
+
+
+__all__ = ["ClusterMembership", "assign_routes", "parse_members", "read_members_file"]
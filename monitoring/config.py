@@ -1,23 +1,32 @@
 """Загрузчик конфигурации маршрутов мониторинга."""
 from __future__ import annotations
 
+import dataclasses
 import json
-from dataclasses import dataclass
+import logging
+import os
+import stat
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Iterable, List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-try:
-    import yaml
-except ModuleNotFoundError as exc:  # pragma: no cover - защитный блок
-    raise RuntimeError(
-        "Библиотека PyYAML не установлена. Выполните `pip install -r requirements.txt` или "
-        "`pip install PyYAML` и повторите запуск."
-    ) from exc
-
-from .env import build_env_map
-from .types import HttpRouteConfig
+from .env import build_env_map, referenced_names
+from .types import (
+    BasicAuthConfig,
+    FileStamp,
+    FileUploadConfig,
+    HttpRouteConfig,
+    MultipartJsonField,
+    WaitForConfig,
+    file_stamp,
+    track_payload_reads,
+)
 
 SUPPORTED_EXTENSIONS = {".yaml", ".yml", ".json"}
+CACHE_VERSION = 2
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -30,36 +39,222 @@ class MonitoringConfig:
 
 
 def _read_file(path: Path) -> Any:
-    content = path.read_text(encoding="utf-8")
+    return _parse_content(path, path.read_text(encoding="utf-8"))
+
+
+@lru_cache(maxsize=None)
+def _yaml_api() -> Tuple[Any, Any]:
+    # PyYAML импортируем при первом YAML-файле: JSON-конфиги и загрузка из кэша обходятся без него.
+    try:
+        import yaml
+    except ModuleNotFoundError as exc:  # pragma: no cover - защитный блок
+        raise RuntimeError(
+            "Библиотека PyYAML не установлена. Выполните `pip install -r requirements.txt` или "
+            "`pip install PyYAML` и повторите запуск."
+        ) from exc
+    # Быстрый загрузчик на libyaml, если PyYAML собран с ним.
+    return yaml, getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _parse_content(path: Path, content: str) -> Any:
     suffix = path.suffix.lower()
     if suffix in {".yaml", ".yml"}:
-        return yaml.safe_load(content) or {}
+        yaml, loader = _yaml_api()
+        return yaml.load(content, Loader=loader) or {}
     if suffix == ".json":
         return json.loads(content or "{}")
     raise ValueError(f"Unsupported config format: {suffix}")
 
 
-def load_config(config_path: str) -> MonitoringConfig:
-    path = Path(config_path).expanduser()
-    if not path.exists():
-        raise FileNotFoundError(f"Config file or directory not found: {path}")
+def load_config(config_path: str, cache_path: Optional[str] = None) -> MonitoringConfig:
+    return ConfigLoader(config_path, cache_path=cache_path).load()
+
+
+@dataclass
+class _FileEntry:
+    """Скомпилированный файл конфигурации и всё, от чего зависит результат его разбора."""
+
+    stamp: FileStamp
+    routes: List[HttpRouteConfig]
+    env: Dict[str, Optional[str]] = field(default_factory=dict)
+    payloads: Dict[str, FileStamp] = field(default_factory=dict)
+
+    def is_fresh(self, stamp: FileStamp) -> bool:
+        if stamp != self.stamp:
+            return False
+        if any(os.environ.get(name) != value for name, value in self.env.items()):
+            return False
+        for payload_path, payload_stamp in self.payloads.items():
+            try:
+                if file_stamp(Path(payload_path)) != payload_stamp:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+def _schema_fingerprint() -> Tuple[str, ...]:
+    # Меняется при изменении набора полей dataclass — старый кэш тогда не используется.
+    return tuple(item.name for item in dataclasses.fields(HttpRouteConfig))
+
+
+class ConfigLoader:
+    """Загружает конфигурацию и при повторной загрузке разбирает только изменившиеся файлы.
+
+    С `cache_path` скомпилированные маршруты сохраняются на диск и переживают перезапуск процесса.
+    """
+
+    def __init__(self, config_path: str, cache_path: Optional[str] = None) -> None:
+        self.path = Path(config_path).expanduser()
+        self.cache_path = Path(cache_path).expanduser() if cache_path else None
+        self._files: Dict[Path, _FileEntry] = self._read_cache()
+        self.reparsed: List[str] = []
+        self.removed: List[str] = []
+
+    def load(self) -> MonitoringConfig:
+        path = self.path
+        if not path.exists():
+            raise FileNotFoundError(f"Config file or directory not found: {path}")
 
-    routes: List[HttpRouteConfig] = []
+        if path.is_file():
+            sources = [(path, path.name)]
+        else:
+            config_files = sorted(_iter_config_files(path))
+            if not config_files:
+                raise ValueError(f"Directory {path} does not contain config files (*.yaml, *.yml, *.json)")
+            sources = [(file_path, file_path.relative_to(path).as_posix()) for file_path in config_files]
 
-    if path.is_file():
-        routes.extend(_load_routes_from_file(path, source_label=path.name))
-    else:
-        config_files = sorted(_iter_config_files(path))
-        if not config_files:
-            raise ValueError(f"Directory {path} does not contain config files (*.yaml, *.yml, *.json)")
-        for file_path in config_files:
-            relative = file_path.relative_to(path).as_posix()
-            routes.extend(_load_routes_from_file(file_path, source_label=relative))
+        # Новое состояние собираем отдельно, чтобы ошибка в одном файле не испортила кэш.
+        files: Dict[Path, _FileEntry] = {}
+        reparsed: List[str] = []
+        routes: List[HttpRouteConfig] = []
+        for file_path, source_label in sources:
+            stamp = file_stamp(file_path)
+            entry = self._files.get(file_path)
+            if entry is None or not entry.is_fresh(stamp):
+                entry = _compile_file(file_path, source_label, stamp)
+                reparsed.append(source_label)
+            files[file_path] = entry
+            routes.extend(entry.routes)
 
-    if not routes:
-        raise ValueError("Config does not contain any routes")
+        if not routes:
+            raise ValueError("Config does not contain any routes")
 
-    return MonitoringConfig(routes=routes)
+        self.removed = sorted(_source_label(path, old) for old in self._files if old not in files)
+        self.reparsed = reparsed
+        self._files = files
+        if self.changed:
+            self._write_cache()
+        return MonitoringConfig(routes=routes)
+
+    def _read_cache(self) -> Dict[Path, _FileEntry]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            _check_cache_owner(self.cache_path)
+            with self.cache_path.open("r", encoding="utf-8") as handle:
+                data = json.load(handle)
+            if (
+                not isinstance(data, dict)
+                or data.get("version") != CACHE_VERSION
+                or data.get("schema") != list(_schema_fingerprint())
+                or data.get("root") != str(self.path.resolve())
+                or data.get("cwd") != os.getcwd()
+            ):
+                return {}
+            return {Path(name): _entry_from_cache(item) for name, item in (data.get("files") or {}).items()}
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Config cache %s is unusable, rebuilding: %s", self.cache_path, exc)
+            return {}
+
+    def _write_cache(self) -> None:
+        if self.cache_path is None:
+            return
+        files = {str(path): _entry_to_cache(entry) for path, entry in self._files.items()}
+        try:
+            content = json.dumps(
+                {
+                    "version": CACHE_VERSION,
+                    "schema": list(_schema_fingerprint()),
+                    "root": str(self.path.resolve()),
+                    # Относительные пути в поле `json` ищутся и от текущего каталога.
+                    "cwd": os.getcwd(),
+                    "files": files,
+                },
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+            if json.loads(content)["files"] != files:
+                # Значения, которые JSON не передаёт без потерь (ключи-числа и т. п.): кэш не пишем.
+                raise ValueError("config values do not round-trip through JSON")
+        except (TypeError, ValueError) as exc:
+            logger.warning("Config cache %s is not written: %s", self.cache_path, exc)
+            return
+        tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.tmp")
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, "w", encoding="utf-8") as handle:
+                handle.write(content)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as exc:
+            logger.warning("Failed to write config cache %s: %s", self.cache_path, exc)
+
+    @property
+    def changed(self) -> bool:
+        """Были ли изменения файлов при последней загрузке."""
+        return bool(self.reparsed or self.removed)
+
+
+def _check_cache_owner(path: Path) -> None:
+    """Кэш определяет, какие запросы уйдут и куда: чужой или доступный на запись другим файл не читаем."""
+    info = path.stat()
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"owned by uid {info.st_uid}, not by the current user")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError("writable by group or others")
+
+
+def _entry_to_cache(entry: _FileEntry) -> Dict[str, Any]:
+    return {
+        "stamp": list(entry.stamp),
+        "routes": [dataclasses.asdict(route) for route in entry.routes],
+        "env": entry.env,
+        "payloads": {path: list(stamp) for path, stamp in entry.payloads.items()},
+    }
+
+
+def _entry_from_cache(data: Dict[str, Any]) -> _FileEntry:
+    return _FileEntry(
+        stamp=_stamp(data["stamp"]),
+        routes=[_route_from_cache(item) for item in data["routes"]],
+        env=dict(data.get("env") or {}),
+        payloads={path: _stamp(stamp) for path, stamp in (data.get("payloads") or {}).items()},
+    )
+
+
+def _stamp(value: Any) -> FileStamp:
+    mtime_ns, size = value
+    return int(mtime_ns), int(size)
+
+
+def _route_from_cache(data: Dict[str, Any]) -> HttpRouteConfig:
+    values = dict(data)
+    if values.get("file_upload") is not None:
+        values["file_upload"] = FileUploadConfig(**values["file_upload"])
+    if values.get("basic_auth") is not None:
+        values["basic_auth"] = BasicAuthConfig(**values["basic_auth"])
+    if values.get("wait_for") is not None:
+        values["wait_for"] = WaitForConfig(**values["wait_for"])
+    values["multipart_json_fields"] = [MultipartJsonField(**item) for item in values.get("multipart_json_fields", [])]
+    values["children"] = [_route_from_cache(item) for item in values.get("children", [])]
+    return HttpRouteConfig(**values)
+
+
+def _source_label(root: Path, file_path: Path) -> str:
+    if root.is_dir():
+        return file_path.relative_to(root).as_posix()
+    return file_path.name
 
 
 def _iter_config_files(root: Path) -> Iterable[Path]:
@@ -68,8 +263,23 @@ def _iter_config_files(root: Path) -> Iterable[Path]:
             yield candidate
 
 
-def _load_routes_from_file(path: Path, source_label: str) -> List[HttpRouteConfig]:
-    raw_config = _read_file(path)
+def _compile_file(path: Path, source_label: str, stamp: FileStamp) -> _FileEntry:
+    content = path.read_text(encoding="utf-8")
+    with track_payload_reads() as payload_reads:
+        routes = _load_routes_from_file(path, source_label=source_label, content=content)
+    env_names = referenced_names(content)
+    for payload in payload_reads.values():
+        env_names.update(payload.env_names)
+    return _FileEntry(
+        stamp=stamp,
+        routes=routes,
+        env={name: os.environ.get(name) for name in sorted(env_names)},
+        payloads={payload_path: payload.stamp for payload_path, payload in payload_reads.items()},
+    )
+
+
+def _load_routes_from_file(path: Path, source_label: str, content: Optional[str] = None) -> List[HttpRouteConfig]:
+    raw_config = _read_file(path) if content is None else _parse_content(path, content)
     if "routes" not in raw_config:
         raise ValueError(f"Config file {path} must contain a 'routes' section")
     env_map = build_env_map(raw_config.get("env"))
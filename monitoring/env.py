@@ -3,15 +3,22 @@ from __future__ import annotations
 
 import os
 import re
-from typing import Any, Dict, Mapping, Optional
+from collections import ChainMap
+from functools import lru_cache
+from typing import Any, Mapping, MutableMapping, Optional, Set, Tuple, Union
 
 _ENV_PATTERN = re.compile(r"\$\{([A-Za-z_][A-Za-z0-9_]*)\}")
 
+# Части шаблона: литерал (str) или ссылка на переменную (кортеж из одного имени).
+TemplatePart = Union[str, Tuple[str]]
+
 
 def apply_env(value: Any, env_map: Mapping[str, Any]) -> Any:
     """Рекурсивно подставляет ${VAR} из env_map в строках."""
     if isinstance(value, str):
-        return _ENV_PATTERN.sub(lambda match: _format_env_value(match, env_map), value)
+        if "${" not in value:
+            return value
+        return _render(_compile_template(value), value, env_map)
     if isinstance(value, list):
         return [apply_env(item, env_map) for item in value]
     if isinstance(value, dict):
@@ -19,22 +26,62 @@ def apply_env(value: Any, env_map: Mapping[str, Any]) -> Any:
     return value
 
 
-def build_env_map(raw_env: Any, base_env: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
-    """Собирает env-map из os.environ и блока env в конфиге."""
-    merged: Dict[str, Any] = dict(base_env or os.environ)
+def referenced_names(text: str) -> Set[str]:
+    """Имена переменных, на которые ссылается текст через ${VAR}."""
+    return set(_ENV_PATTERN.findall(text))
+
+
+def build_env_map(raw_env: Any, base_env: Optional[Mapping[str, Any]] = None) -> Mapping[str, Any]:
+    """Собирает слой env поверх base_env (по умолчанию os.environ) без копирования родительских значений.
+
+    Результат — ChainMap: локальный блок env перекрывает родительские слои, а сами слои общие
+    для всех дочерних маршрутов.
+    """
+    base: Mapping[str, Any] = os.environ if base_env is None else base_env
     if raw_env is None:
-        return merged
+        return base
     if not isinstance(raw_env, Mapping):
         raise ValueError("Поле env должно быть объектом")
-    resolved: Dict[str, Any] = {}
+    resolved: MutableMapping[str, Any] = {}
+    scope = _chain(resolved, base)
+    # Значения блока могут ссылаться на уже объявленные выше ключи того же блока.
     for key, value in raw_env.items():
-        resolved[key] = apply_env(value, {**merged, **resolved})
-    merged.update(resolved)
-    return merged
+        resolved[key] = apply_env(value, scope)
+    return scope
+
+
+def _chain(layer: MutableMapping[str, Any], base: Mapping[str, Any]) -> ChainMap:
+    if isinstance(base, ChainMap):
+        # Держим цепочку плоской, чтобы поиск не проходил через вложенные ChainMap.
+        return ChainMap(layer, *base.maps)
+    return ChainMap(layer, base)
+
+
+@lru_cache(maxsize=4096)
+def _compile_template(value: str) -> Tuple[TemplatePart, ...]:
+    parts: list[TemplatePart] = []
+    cursor = 0
+    for match in _ENV_PATTERN.finditer(value):
+        if match.start() > cursor:
+            parts.append(value[cursor : match.start()])
+        parts.append((match.group(1),))
+        cursor = match.end()
+    if cursor < len(value):
+        parts.append(value[cursor:])
+    return tuple(parts)
 
 
-def _format_env_value(match: re.Match[str], env_map: Mapping[str, Any]) -> str:
-    name = match.group(1)
-    if name in env_map:
-        return str(env_map[name])
-    return match.group(0)
+def _render(parts: Tuple[TemplatePart, ...], original: str, env_map: Mapping[str, Any]) -> str:
+    if len(parts) == 1 and isinstance(parts[0], str):
+        return original
+    buffer = []
+    for part in parts:
+        if isinstance(part, str):
+            buffer.append(part)
+            continue
+        name = part[0]
+        if name in env_map:
+            buffer.append(str(env_map[name]))
+        else:
+            buffer.append(f"${{{name}}}")
+    return "".join(buffer)
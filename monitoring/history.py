@@ -0,0 +1,363 @@
+"""История результатов проверок в SQLite и запросы агрегатов по ней."""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .persistence import result_timestamp
+from .stats import parse_duration
+from .types import HttpRouteConfig
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_RETENTION_DAYS = 7.0
+DEFAULT_QUEUE_SIZE = 100000
+PRUNE_INTERVAL = 3600.0
+PRUNE_CHUNK = 10000
+GROUP_COLUMNS = {"route": "r.route", "source": "r.source", "tag": "t.tag"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    route TEXT NOT NULL,
+    source TEXT NOT NULL,
+    ok INTEGER NOT NULL,
+    status_code INTEGER,
+    response_time_ms REAL,
+    error TEXT
+);
+-- Покрывающий индекс: агрегаты по маршруту за период читаются без обращения к таблице.
+CREATE INDEX IF NOT EXISTS idx_results_route_ts ON results (route, ts, ok, response_time_ms);
+CREATE INDEX IF NOT EXISTS idx_results_ts ON results (ts);
+CREATE TABLE IF NOT EXISTS result_tags (
+    tag TEXT NOT NULL,
+    ts REAL NOT NULL,
+    result_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_result_tags_tag_ts ON result_tags (tag, ts, result_id);
+CREATE INDEX IF NOT EXISTS idx_result_tags_ts ON result_tags (ts);
+"""
+
+Row = Tuple[float, str, str, int, Optional[int], Optional[float], Optional[str], Tuple[str, ...]]
+
+logger = logging.getLogger(__name__)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Открывает базу истории в режиме WAL и создаёт схему, если её ещё нет."""
+    db_path = Path(path).expanduser()
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # В WAL режим NORMAL не теряет целостность при сбое, а fsync делает только на контрольных точках.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def open_existing(path: str, readonly: bool = True) -> sqlite3.Connection:
+    """Открывает уже существующую базу истории, не создавая ни файла, ни схемы (для `main.py history`)."""
+    db_path = Path(path).expanduser()
+    if not db_path.is_file():
+        raise FileNotFoundError(f"no such file: {db_path}")
+    uri = f"{db_path.resolve().as_uri()}?mode={'ro' if readonly else 'rw'}"
+    conn = sqlite3.connect(uri, uri=True, timeout=30)
+    try:
+        # Чужой файл или база без таблицы результатов — ошибка сразу, а не пустая история.
+        conn.execute("SELECT 1 FROM results LIMIT 0")
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+class HistoryStore:
+    """Дописывает результаты в SQLite пачками из фонового потока.
+
+    Мониторы только ставят строку в очередь; поток записи объединяет накопленное в одну транзакцию
+    (не больше `batch_size` строк, не реже раза в `flush_interval` секунд) и раз в час удаляет строки
+    старше `retention_days`. При переполнении очереди строки отбрасываются с подсчётом.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        retention_days: Optional[float] = DEFAULT_RETENTION_DAYS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        self.path = path
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.retention = retention_days * 86400 if retention_days else None
+        self.dropped = 0
+        self.written = 0
+        self._rows: "queue.Queue[Row]" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._next_prune = 0.0
+        self._conn = connect(path)
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, route_config: HttpRouteConfig, payload: Dict[str, Any]) -> None:
+        status_code = payload.get("status_code")
+        response_time = payload.get("response_time_ms")
+        row: Row = (
+            result_timestamp(payload),
+            route_config.name,
+            route_config.source_path or "",
+            1 if payload.get("ok") else 0,
+            int(status_code) if status_code is not None else None,
+            float(response_time) if response_time is not None else None,
+            payload.get("error"),
+            tuple(route_config.tags),
+        )
+        try:
+            self._rows.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Дописывает очередь и закрывает базу."""
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.warning("Запись истории не завершилась за %.1f с", timeout)
+            return
+        self._conn.close()
+        if self.dropped:
+            logger.warning("История: пропущено строк из-за переполнения очереди: %s", self.dropped)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch:
+                try:
+                    self._insert(batch)
+                except sqlite3.Error:
+                    logger.exception("Не удалось записать в историю %s строк", len(batch))
+            elif self._stop.is_set():
+                return
+            if self.retention and time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + PRUNE_INTERVAL
+                try:
+                    prune(self._conn, time.time() - self.retention)
+                except sqlite3.Error:
+                    logger.exception("Не удалось удалить старые строки истории")
+
+    def _collect(self) -> List[Row]:
+        batch: List[Row] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            # После остановки дочитываем очередь без ожидания.
+            timeout = 0.0 if self._stop.is_set() else deadline - time.monotonic()
+            try:
+                row = self._rows.get(timeout=timeout) if timeout > 0 else self._rows.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(row)
+        return batch
+
+    def _insert(self, batch: List[Row]) -> None:
+        with self._conn:
+            for row in batch:
+                cursor = self._conn.execute(
+                    "INSERT INTO results (ts, route, source, ok, status_code, response_time_ms, error) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    row[:7],
+                )
+                tags = row[7]
+                if tags:
+                    result_id = cursor.lastrowid
+                    self._conn.executemany(
+                        "INSERT INTO result_tags (tag, ts, result_id) VALUES (?, ?, ?)",
+                        [(tag, row[0], result_id) for tag in tags],
+                    )
+        self.written += len(batch)
+
+
+def prune(conn: sqlite3.Connection, before: float) -> int:
+    """Удаляет строки старше `before` небольшими транзакциями, чтобы не блокировать запись надолго."""
+    removed = 0
+    while True:
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM results WHERE id IN (SELECT id FROM results WHERE ts < ? LIMIT ?)", (before, PRUNE_CHUNK)
+            )
+            tags_cursor = conn.execute(
+                "DELETE FROM result_tags WHERE rowid IN (SELECT rowid FROM result_tags WHERE ts < ? LIMIT ?)",
+                (before, PRUNE_CHUNK),
+            )
+        removed += cursor.rowcount
+        if cursor.rowcount < PRUNE_CHUNK and tags_cursor.rowcount < PRUNE_CHUNK:
+            return removed
+
+
+def summarize(
+    conn: sqlite3.Connection,
+    since: float,
+    until: Optional[float] = None,
+    group_by: str = "route",
+    route: Optional[str] = None,
+    tag: Optional[str] = None,
+    percentiles: Sequence[float] = (),
+) -> List[Dict[str, Any]]:
+    """Агрегаты за период по маршрутам, тегам или файлам конфигурации.
+
+    Число проверок, доля успешных, средняя и максимальная задержка считаются по индексу; перцентили —
+    отдельным запросом с сортировкой, только если их попросили.
+    """
+    if group_by not in GROUP_COLUMNS:
+        raise ValueError(f"Неизвестная группировка: {group_by}")
+    key = GROUP_COLUMNS[group_by]
+    joined = group_by == "tag" or tag is not None
+    source = "result_tags t JOIN results r ON r.id = t.result_id" if joined else "results r"
+    time_column = "t.ts" if joined else "r.ts"
+    where = [f"{time_column} >= ?"]
+    params: List[Any] = [since]
+    if until is not None:
+        where.append(f"{time_column} < ?")
+        params.append(until)
+    if route is not None:
+        where.append("r.route = ?")
+        params.append(route)
+    if tag is not None:
+        where.append("t.tag = ?")
+        params.append(tag)
+    condition = " AND ".join(where)
+    rows = conn.execute(
+        f"SELECT {key}, COUNT(*), SUM(r.ok), AVG(r.response_time_ms), MAX(r.response_time_ms), MAX(r.ts) "
+        f"FROM {source} WHERE {condition} GROUP BY {key} ORDER BY {key}",
+        params,
+    ).fetchall()
+    summary: List[Dict[str, Any]] = []
+    for name, count, ok, avg, worst, last_ts in rows:
+        summary.append(
+            {
+                group_by: name,
+                "count": count,
+                "ok": ok or 0,
+                "failed": count - (ok or 0),
+                "availability": round((ok or 0) / count, 6) if count else None,
+                "avg_ms": round(avg, 2) if avg is not None else None,
+                "max_ms": worst,
+                "last_ts": datetime.fromtimestamp(last_ts, tz=timezone.utc).isoformat() if last_ts else None,
+            }
+        )
+    if percentiles and summary:
+        values = _percentiles(conn, key, source, condition, params, percentiles)
+        for item in summary:
+            item.update(values.get(item[group_by], {}))
+    return summary
+
+
+def _percentiles(
+    conn: sqlite3.Connection,
+    key: str,
+    source: str,
+    condition: str,
+    params: List[Any],
+    percentiles: Sequence[float],
+) -> Dict[str, Dict[str, float]]:
+    # Ранжируем задержки внутри группы оконной функцией и берём ближайший ранг для каждого перцентиля.
+    rows = conn.execute(
+        f"SELECT grp, ms, rn, cnt FROM ("
+        f" SELECT {key} AS grp, r.response_time_ms AS ms,"
+        f" ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY r.response_time_ms) AS rn,"
+        f" COUNT(*) OVER (PARTITION BY {key}) AS cnt"
+        f" FROM {source} WHERE {condition} AND r.response_time_ms IS NOT NULL)",
+        params,
+    )
+    wanted: Dict[str, Dict[str, float]] = {}
+    for group, value, rank, count in rows:
+        for pct in percentiles:
+            if rank == max(int(-(-count * pct // 100)), 1):
+                wanted.setdefault(group, {})[f"p{pct:g}_ms"] = value
+    return wanted
+
+
+def _format_table(rows: List[Dict[str, Any]]) -> str:
+    if not rows:
+        return "No results for the selected period"
+    columns = list(rows[0])
+    for row in rows[1:]:
+        columns.extend(column for column in row if column not in columns)
+    cells = [[_format_cell(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(line[index]) for line in cells)) for index, column in enumerate(columns)]
+    lines = ["  ".join(column.ljust(width) for column, width in zip(columns, widths))]
+    lines.extend("  ".join(cell.ljust(width) for cell, width in zip(line, widths)) for line in cells)
+    return "\n".join(lines)
+
+
+def _format_cell(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4f}" if abs(value) <= 1 else f"{value:.2f}"
+    return str(value)
+
+
+def history_main(argv: Sequence[str]) -> int:
+    """Точка входа `main.py history`: агрегаты из базы истории."""
+    parser = argparse.ArgumentParser(prog="main.py history", description="Query aggregated probe history")
+    parser.add_argument("--db", required=True, help="Path to the history database (--history-db of the service)")
+    parser.add_argument("--since", default="24h", help="Period start relative to now, e.g. 15m, 24h, 7d (default: 24h)")
+    parser.add_argument("--until", default=None, help="Period end relative to now, e.g. 1h (default: now)")
+    parser.add_argument("--group-by", choices=sorted(GROUP_COLUMNS), default="route", help="Grouping (default: route)")
+    parser.add_argument("--route", default=None, help="Only this route name")
+    parser.add_argument("--tag", default=None, help="Only routes with this tag")
+    parser.add_argument(
+        "--percentiles",
+        default="",
+        help="Comma-separated latency percentiles to compute, e.g. 50,95,99 (slower on large periods)",
+    )
+    parser.add_argument("--format", choices=["table", "json"], default="table", help="Output format (default: table)")
+    parser.add_argument("--prune-days", type=float, default=None, help="Delete rows older than N days and exit")
+    args = parser.parse_args(list(argv))
+
+    try:
+        conn = open_existing(args.db, readonly=args.prune_days is None)
+    except (OSError, sqlite3.Error) as exc:
+        print(f"Failed to open history database {args.db}: {exc}")
+        return 1
+    try:
+        if args.prune_days is not None:
+            removed = prune(conn, time.time() - args.prune_days * 86400)
+            print(f"Removed {removed} rows")
+            return 0
+        now = time.time()
+        try:
+            since = now - parse_duration(args.since)
+            until = now - parse_duration(args.until) if args.until else None
+            percentiles = [float(item) for item in args.percentiles.split(",") if item.strip()]
+        except ValueError as exc:
+            parser.error(str(exc))
+        rows = summarize(
+            conn,
+            since,
+            until,
+            group_by=args.group_by,
+            route=args.route,
+            tag=args.tag,
+            percentiles=percentiles,
+        )
+    finally:
+        conn.close()
+    if args.format == "json":
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        print(_format_table(rows))
+    return 0
+
+
+__all__ = ["HistoryStore", "connect", "history_main", "open_existing", "prune", "summarize"]
@@ -4,20 +4,106 @@ from __future__ import annotations
 import json
 import os
 import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
+from .selfstats import SELF_STATS
+from .sharding import route_key
 from .types import HttpRouteConfig
 
 
+DEFAULT_COMPARE_FIELDS: Tuple[str, ...] = (
+    "ok",
+    "status_code",
+    "reason",
+    "error",
+    "body_excerpt",
+    "body_truncated",
+    "url",
+    "method",
+    "tags",
+)
+DEFAULT_HEARTBEAT = 300.0
+ROLLUPS_FILENAME = "_rollups.json"
+SELF_METRICS_FILENAME = "_self_metrics.json"
+# В режиме каталога сводки лежат в отдельных файлах, и переписывать их на каждый результат незачем.
+ROLLUPS_WRITE_INTERVAL = 5.0
+
+
+def result_timestamp(payload: Dict[str, Any]) -> float:
+    """Время проверки из поля `timestamp` результата в секундах Unix; без него — текущее время."""
+    raw = payload.get("timestamp")
+    if isinstance(raw, str):
+        try:
+            parsed = datetime.fromisoformat(raw)
+        except ValueError:
+            return time.time()
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return time.time()
+
+
+@dataclass
+class _WrittenState:
+    """Что последним записано для маршрута: значимые поля, задержка и время записи."""
+
+    signature: Tuple[Any, ...]
+    response_time_ms: float
+    written_at: float
+
+
 class ResultWriter:
-    """Хранит последние результаты проверок для чтения агентом Zabbix."""
+    """Хранит последние результаты проверок для чтения агентом Zabbix.
+
+    В режиме `changes_only` результат, совпадающий с записанным по `compare_fields` и с задержкой в пределах
+    `latency_threshold_ms`, не записывается сразу, а откладывается: он попадёт в файл вместе со следующей
+    записью того же файла, а не позже чем через `heartbeat` секунд после предыдущей записи маршрута.
+    """
 
-    def __init__(self, output_path: str, schema_version: int = 1) -> None:
+    def __init__(
+        self,
+        output_path: str,
+        schema_version: int = 1,
+        changes_only: bool = False,
+        compare_fields: Sequence[str] = DEFAULT_COMPARE_FIELDS,
+        latency_threshold_ms: Optional[float] = None,
+        heartbeat: float = DEFAULT_HEARTBEAT,
+    ) -> None:
         self._raw_path = output_path
         self.base_path = Path(output_path).expanduser()
         self._lock = threading.Lock()
         self.schema_version = schema_version
+        self.changes_only = changes_only
+        self.compare_fields = tuple(compare_fields)
+        self.latency_threshold_ms = latency_threshold_ms
+        self.heartbeat = heartbeat
+        self.skipped = 0
+        # Необязательное хранилище истории (HistoryStore): получает каждый результат, даже неизменившийся.
+        self.history: Optional[Any] = None
+        # Необязательные скользящие окна (WindowStats): добавляют в результат секцию `window`.
+        self.stats: Optional[Any] = None
+        # Необязательные сводки по тегам и файлам (RollupAggregator): секция `rollups` в результатах.
+        self.rollups: Optional[Any] = None
+        # Необязательная таблица статусов в памяти (StatusTable): запись маршрута обновляется на месте.
+        self.status_table: Optional[Any] = None
+        # Необязательная отправка в Zabbix по протоколу траппера (ZabbixSender): получает каждый результат.
+        self.sender: Optional[Any] = None
+        # Необязательные метрики Prometheus (PrometheusExporter): обновляются каждым результатом.
+        self.metrics: Optional[Any] = None
+        self._rollups_written_at = 0.0
+        # Публиковать замеры самонаблюдения (SELF_STATS) в результатах: секция `self_metrics` или файл.
+        self.self_metrics = False
+        self._self_snapshot: Optional[Dict[str, Any]] = None
+        self._self_snapshot_at = 0.0
+        # Ключ — (файл, имя): одно и то же имя маршрута может встречаться в разных файлах конфигурации.
+        self._latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._sources: Dict[str, Set[str]] = {}
+        self._written: Dict[Tuple[Path, str], _WrittenState] = {}
+        self._pending: Dict[Path, Dict[str, Dict[str, Any]]] = {}
         self._directory_mode = self._detect_directory_mode()
 
         if self._directory_mode:
@@ -26,14 +112,151 @@ class ResultWriter:
             self.base_path.parent.mkdir(parents=True, exist_ok=True)
 
     def write_result(self, route_config: HttpRouteConfig, payload: Dict[str, Any]) -> None:
+        started = time.perf_counter()
+        if self.stats is not None:
+            payload = dict(payload)
+            payload["window"] = self.stats.process(route_config, payload)
+        if self.history is not None:
+            self.history.append(route_config, payload)
+        if self.sender is not None:
+            self.sender.append(route_config, payload)
+        if self.metrics is not None:
+            self.metrics.update(route_config, payload)
+        if self.rollups is not None:
+            self.rollups.update(route_config, payload)
+        # Последний результат держим в памяти для точечных запросов (сокет запросов, таблица статусов).
+        key = route_key(route_config)
+        if key not in self._latest:
+            self._sources.setdefault(key[1], set()).add(key[0])
+        self._latest[key] = payload
+        if self.status_table is not None:
+            self.status_table.update(route_config, payload)
         target_file = self._target_file(route_config)
+        waiting = time.perf_counter()
+        with self._lock:
+            acquired = time.perf_counter()
+            self._store(target_file, route_config.name, payload)
+            released = time.perf_counter()
+        if SELF_STATS.enabled:
+            SELF_STATS.observe("writer_lock_wait", (acquired - waiting) * 1000)
+            SELF_STATS.observe("writer_lock_hold", (released - acquired) * 1000)
+            SELF_STATS.observe("write", (released - started) * 1000, route=key)
+
+    def _store(self, target_file: Path, name: str, payload: Dict[str, Any]) -> None:
+        if self.changes_only and not self._is_due(target_file, name, payload):
+            self._pending.setdefault(target_file, {})[name] = payload
+            self.skipped += 1
+            return
+        pending = self._pending.pop(target_file, {})
+        pending[name] = payload
+        self._write_file(target_file, pending)
+        self._write_summary_files()
+
+    def latest(self, name: str, source: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Последний результат маршрута, включая ещё не записанный в файл.
+
+        Без `source` имя должно быть однозначным; если маршрут с таким именем есть в нескольких файлах,
+        выбрасывается LookupError.
+        """
+        if source is None:
+            sources = self.latest_sources(name)
+            if len(sources) > 1:
+                raise LookupError(f"route {name} is defined in several files: {', '.join(sources)}")
+            if not sources:
+                return None
+            source = sources[0]
+        return self._latest.get((source, name))
+
+    def latest_sources(self, name: str) -> List[str]:
+        """Файлы конфигурации, для маршрутов которых с именем `name` есть результат."""
+        return sorted(self._sources.get(name, ()))
+
+    def retain(self, routes: Iterable[HttpRouteConfig]) -> None:
+        """Забывает последние результаты маршрутов, которых больше нет в наборе узла."""
+        keys = {route_key(route) for route in routes}
+        for key in [key for key in list(self._latest) if key not in keys]:
+            self._latest.pop(key, None)
+            sources = self._sources.get(key[1])
+            if sources is not None:
+                sources.discard(key[0])
+                if not sources:
+                    del self._sources[key[1]]
+
+    def flush(self) -> None:
+        """Записывает отложенные результаты; вызывается при остановке сервиса."""
         with self._lock:
-            state = self._safe_read(target_file)
-            state.setdefault("routes", {})
-            state["routes"][route_config.name] = payload
-            state["last_updated"] = payload.get("timestamp")
-            state["schema_version"] = self.schema_version
-            target_file.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+            pending, self._pending = self._pending, {}
+            for target_file, payloads in pending.items():
+                self._write_file(target_file, payloads)
+            self._write_summary_files(force=True)
+
+    def _is_due(self, target_file: Path, name: str, payload: Dict[str, Any]) -> bool:
+        previous = self._written.get((target_file, name))
+        if previous is None:
+            return True
+        if self._signature(payload) != previous.signature:
+            return True
+        if time.monotonic() - previous.written_at >= self.heartbeat:
+            return True
+        if self.latency_threshold_ms is not None:
+            delta = abs(float(payload.get("response_time_ms") or 0.0) - previous.response_time_ms)
+            if delta >= self.latency_threshold_ms:
+                return True
+        return False
+
+    def _signature(self, payload: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(json.dumps(payload.get(field), sort_keys=True, default=str) for field in self.compare_fields)
+
+    def _write_file(self, target_file: Path, payloads: Dict[str, Dict[str, Any]]) -> None:
+        state = self._safe_read(target_file)
+        state.setdefault("routes", {})
+        state["routes"].update(payloads)
+        state["last_updated"] = max(
+            (str(payload.get("timestamp")) for payload in payloads.values() if payload.get("timestamp")),
+            default=state.get("last_updated"),
+        )
+        state["schema_version"] = self.schema_version
+        if self.rollups is not None and not self._directory_mode:
+            state["rollups"] = self.rollups.snapshot()
+        if self.self_metrics and not self._directory_mode:
+            state["self_metrics"] = self._self_metrics_snapshot()
+        self._atomic_write(target_file, json.dumps(state, ensure_ascii=False, indent=2))
+        now = time.monotonic()
+        for name, payload in payloads.items():
+            self._written[(target_file, name)] = _WrittenState(
+                self._signature(payload), float(payload.get("response_time_ms") or 0.0), now
+            )
+
+    def _write_summary_files(self, force: bool = False) -> None:
+        if not self._directory_mode or (self.rollups is None and not self.self_metrics):
+            return
+        now = time.monotonic()
+        if not force and now - self._rollups_written_at < ROLLUPS_WRITE_INTERVAL:
+            return
+        self._rollups_written_at = now
+        if self.rollups is not None:
+            state = {"schema_version": self.schema_version, "rollups": self.rollups.snapshot()}
+            self._atomic_write(self.base_path / ROLLUPS_FILENAME, json.dumps(state, ensure_ascii=False, indent=2))
+        if self.self_metrics:
+            state = {"schema_version": self.schema_version, "self_metrics": self._self_metrics_snapshot(force)}
+            self._atomic_write(
+                self.base_path / SELF_METRICS_FILENAME, json.dumps(state, ensure_ascii=False, indent=2)
+            )
+
+    def _self_metrics_snapshot(self, force: bool = False) -> Dict[str, Any]:
+        # Снимок с замерами по маршрутам стоит O(маршрутов), поэтому обновляем его не чаще сводок.
+        now = time.monotonic()
+        if force or self._self_snapshot is None or now - self._self_snapshot_at >= ROLLUPS_WRITE_INTERVAL:
+            self._self_snapshot = SELF_STATS.snapshot()
+            self._self_snapshot_at = now
+        return self._self_snapshot
+
+    @staticmethod
+    def _atomic_write(target_file: Path, content: str) -> None:
+        # Пишем во временный файл и подменяем: остановка процесса посреди записи не оставит обрезанный JSON.
+        tmp_file = target_file.with_name(f".{target_file.name}.tmp")
+        tmp_file.write_text(content, encoding="utf-8")
+        os.replace(tmp_file, target_file)
 
     def _detect_directory_mode(self) -> bool:
         if self.base_path.exists():
@@ -0,0 +1,234 @@
+"""Профилирование работающего сервиса по сигналу: выборочный профиль CPU и снимки `tracemalloc`.
+
+- SIGUSR1 (или `profile/cpu` через сокет запросов) включает выборочный профилировщик: отдельный поток раз в
+  `interval` секунд снимает стеки всех потоков (`sys._current_frames`). Повторный сигнал или истечение
+  `duration` останавливают его и записывают по файлу на поток в формате collapsed stacks (`a;b;c 42`),
+  который понимают flamegraph.pl, speedscope и py-spy, и `summary.txt` с самыми частыми функциями.
+- SIGUSR2 (или `profile/memory`) включает `tracemalloc`; повторный сигнал или истечение `duration` записывают
+  места, где с момента включения выделено больше всего ещё не освобождённой памяти.
+
+Накладные расходы ограничены: профилировщик удлиняет паузу между выборками так, чтобы время на сами выборки
+не превышало `max_overhead` от времени работы, а оба режима отключаются сами через `duration` секунд.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_DURATION = 60.0
+DEFAULT_INTERVAL = 0.01
+DEFAULT_MAX_OVERHEAD = 0.02
+MAX_STACK_DEPTH = 128
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 50
+TOP_FUNCTIONS = 40
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame: Optional[FrameType]) -> Tuple[str, ...]:
+    stack: List[str] = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _safe_name(name: str) -> str:
+    return "".join(char if char.isalnum() or char in "-_." else "_" for char in name) or "thread"
+
+
+class _CpuSession:
+    """Одна сессия выборочного профилирования: поток выборок и накопленные стеки по потокам."""
+
+    def __init__(self, directory: Path, duration: float, interval: float, max_overhead: float) -> None:
+        self.directory = directory
+        self.duration = duration
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.samples: Dict[str, Counter] = {}
+        self.taken = 0
+        self.sampling_seconds = 0.0
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-cpu", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def wait(self, timeout: float) -> None:
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        deadline = self.started + self.duration
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            began = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                name = names.get(ident, f"thread-{ident}")
+                self.samples.setdefault(name, Counter())[_collapse(frame)] += 1
+            self.taken += 1
+            cost = time.perf_counter() - began
+            self.sampling_seconds += cost
+            # Пауза не меньше interval и такая, чтобы доля времени на выборки не превышала max_overhead.
+            self._stop.wait(max(self.interval, cost / self.max_overhead - cost))
+        self._write()
+
+    def _write(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        own_time: Counter = Counter()
+        for name, stacks in self.samples.items():
+            lines = [f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()]
+            (self.directory / f"{_safe_name(name)}.folded").write_text("\n".join(lines) + "\n", encoding="utf-8")
+            for stack, count in stacks.items():
+                if stack:
+                    own_time[stack[-1]] += count
+        elapsed = time.monotonic() - self.started
+        summary = [
+            f"duration: {elapsed:.1f}s, samples: {self.taken}, threads: {len(self.samples)}, "
+            f"sampling overhead: {self.sampling_seconds / elapsed * 100 if elapsed else 0:.2f}%",
+            "",
+            "top functions by own samples (all threads):",
+        ]
+        total = sum(own_time.values()) or 1
+        for label, count in own_time.most_common(TOP_FUNCTIONS):
+            summary.append(f"{count:8d} {count / total * 100:6.2f}%  {label}")
+        (self.directory / "summary.txt").write_text("\n".join(summary) + "\n", encoding="utf-8")
+        logger.warning("Профиль CPU записан в %s (%s выборок)", self.directory, self.taken)
+
+
+class Profiler:
+    """Включает и выключает профилирование CPU и памяти; результаты пишет в `directory`.
+
+    Методы безопасно вызывать из обработчика сигнала: тяжёлая работа (выборки, запись файлов, снимки памяти)
+    выполняется в отдельных потоках.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        duration: float = DEFAULT_DURATION,
+        interval: float = DEFAULT_INTERVAL,
+        max_overhead: float = DEFAULT_MAX_OVERHEAD,
+    ) -> None:
+        self.directory = Path(directory).expanduser()
+        self.duration = duration
+        self.interval = interval
+        self.max_overhead = max(max_overhead, 0.001)
+        self._cpu: Optional[_CpuSession] = None
+        self._memory_timer: Optional[threading.Timer] = None
+        # RLock: обработчик сигнала может прервать основной поток, уже держащий блокировку в stop().
+        self._lock = threading.RLock()
+
+    def toggle_cpu(self) -> str:
+        with self._lock:
+            if self._cpu is not None and self._cpu.running:
+                self._cpu.stop()
+                self._cpu = None
+                return "cpu profile stopping"
+            self._cpu = _CpuSession(
+                self.directory / f"cpu-{self._stamp()}", self.duration, self.interval, self.max_overhead
+            )
+            self._cpu.start()
+        logger.warning("Профилирование CPU включено на %.0f с", self.duration)
+        return f"cpu profile started for {self.duration:g}s"
+
+    def toggle_memory(self) -> str:
+        import tracemalloc
+
+        with self._lock:
+            if tracemalloc.is_tracing():
+                if self._memory_timer is not None:
+                    self._memory_timer.cancel()
+                threading.Thread(target=self._finish_memory, name="profiler-memory", daemon=True).start()
+                return "memory profile stopping"
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._memory_timer = threading.Timer(self.duration, self._finish_memory)
+            self._memory_timer.name = "profiler-memory"
+            self._memory_timer.daemon = True
+            self._memory_timer.start()
+        logger.warning("tracemalloc включён на %.0f с", self.duration)
+        return f"memory profile started for {self.duration:g}s"
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Останавливает активные сессии при остановке сервиса и дописывает их результаты."""
+        import tracemalloc
+
+        with self._lock:
+            cpu, self._cpu = self._cpu, None
+            if self._memory_timer is not None:
+                self._memory_timer.cancel()
+        if cpu is not None:
+            cpu.stop()
+            cpu.wait(timeout)
+        if tracemalloc.is_tracing():
+            self._finish_memory()
+
+    def _finish_memory(self) -> None:
+        import tracemalloc
+
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        # tracemalloc видит только выделения после включения, так что снимок — это прирост за сессию.
+        # Собственные выделения профилировщиков (стеки выборок) к сервису не относятся.
+        snapshot = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        )
+        lines = [f"traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB", ""]
+        lines.append(f"top {TOP_ALLOCATIONS} allocation sites still alive:")
+        lines.extend(str(stat) for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS])
+        lines.extend(["", "top 5 allocation tracebacks:"])
+        for stat in snapshot.statistics("traceback")[:5]:
+            lines.append(f"{stat.count} blocks, {stat.size / 1024:.1f} KiB")
+            lines.extend(f"    {line}" for line in stat.traceback.format())
+        self.directory.mkdir(parents=True, exist_ok=True)
+        target = self.directory / f"memory-{self._stamp()}.txt"
+        target.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        logger.warning("Снимок tracemalloc записан в %s", target)
+
+    @staticmethod
+    def _stamp() -> str:
+        # Микросекунды: сессия, перезапущенная в ту же секунду, не должна писать в тот же каталог.
+        return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+
+def install_signal_handlers(profiler: Profiler) -> bool:
+    """SIGUSR1 переключает профиль CPU, SIGUSR2 — профиль памяти; False, если сигналов нет (Windows)."""
+    import signal
+
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.toggle_cpu())
+    signal.signal(signal.SIGUSR2, lambda signum, frame: profiler.toggle_memory())
+    return True
+
+
+__all__ = ["Profiler", "install_signal_handlers"]
@@ -0,0 +1,368 @@
+"""HTTP-эндпоинт `/metrics` в текстовом формате Prometheus с метриками маршрутов и самого сервиса.
+
+Метрики маршрута (метки `route`, `source`):
+
+- `sber_route_up` — 1, если последняя проверка успешна;
+- `sber_route_status_code` — HTTP-статус последней проверки (0 — ответа нет);
+- `sber_route_response_time_seconds` — задержка последней проверки;
+- `sber_route_body_bytes` — размер тела последнего ответа;
+- `sber_route_chain_steps` — число выполненных запросов цепочки;
+- `sber_route_last_check_timestamp_seconds` — время последней проверки;
+- `sber_route_checks_total` — число проверок с меткой `result="ok"|"failed"`;
+- `sber_route_latency_seconds` — гистограмма задержек всех проверок.
+
+Текст маршрута форматируется один раз, при поступлении его результата. Маршруты разложены по блокам
+по `BLOCK_SIZE`, у каждого блока закэширован готовый текст каждого семейства в байтах; результат маршрута
+сбрасывает кэш только его блока. Запрос `/metrics` пересобирает лишь сброшенные блоки и отдаёт ответ списком
+готовых кусков без общей склейки.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import math
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .persistence import result_timestamp
+from .rollups import INLINE_SOURCE
+from .sharding import route_key
+from .types import HttpRouteConfig
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BLOCK_SIZE = 256
+
+Labels = Dict[str, str]
+# Значение с метками; у summary перед метками идёт суффикс имени (`_sum`, `_count`, для квантилей — "").
+Sample = Union[Tuple[Labels, float], Tuple[str, Labels, float]]
+# Семейство метрик сервиса: имя, тип, описание и значения с метками.
+Family = Tuple[str, str, str, Sequence[Sample]]
+Collector = Callable[[], Iterable[Family]]
+
+_ROUTE_FAMILIES: Tuple[Tuple[str, str, str], ...] = (
+    ("sber_route_up", "gauge", "1 if the last check of the route succeeded"),
+    ("sber_route_status_code", "gauge", "HTTP status code of the last check, 0 without a response"),
+    ("sber_route_response_time_seconds", "gauge", "Latency of the last check"),
+    ("sber_route_body_bytes", "gauge", "Response body size of the last check"),
+    ("sber_route_chain_steps", "gauge", "Number of requests executed in the last check chain"),
+    ("sber_route_last_check_timestamp_seconds", "gauge", "Unix time of the last check"),
+    ("sber_route_checks_total", "counter", "Number of checks by result"),
+    ("sber_route_latency_seconds", "histogram", "Latency of all checks"),
+)
+
+_FAMILY_HEADERS = [f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n".encode() for name, kind, help_text in _ROUTE_FAMILIES]
+
+logger = logging.getLogger(__name__)
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def render_family(name: str, kind: str, help_text: str, samples: Iterable[Sample]) -> str:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for sample in samples:
+        suffix, labels, value = sample if len(sample) == 3 else ("", *sample)  # type: ignore[misc]
+        lines.append(f"{name}{suffix}{format_labels(labels)} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _RouteSeries:
+    """Счётчики маршрута и готовые строки его метрик по семействам."""
+
+    __slots__ = ("labels", "ok", "failed", "bucket_counts", "latency_sum", "fragments")
+
+    def __init__(self, labels: str, buckets: int) -> None:
+        self.labels = labels
+        self.ok = 0
+        self.failed = 0
+        self.bucket_counts = [0] * (buckets + 1)
+        self.latency_sum = 0.0
+        self.fragments: Dict[str, str] = {}
+
+
+class _Block:
+    """Группа маршрутов с общим кэшем текста по семействам; `cache` сбрасывается при изменении маршрута."""
+
+    __slots__ = ("series", "cache")
+
+    def __init__(self) -> None:
+        self.series: Dict[Tuple[str, str], _RouteSeries] = {}
+        self.cache: Optional[List[bytes]] = None
+
+    def render(self) -> List[bytes]:
+        if self.cache is None:
+            series_list = list(self.series.values())
+            self.cache = [
+                "".join(series.fragments.get(name, "") for series in series_list).encode("utf-8")
+                for name, _, _ in _ROUTE_FAMILIES
+            ]
+        return self.cache
+
+
+class PrometheusExporter:
+    """Метрики маршрутов, обновляемые по результатам ResultWriter, и HTTP-сервер для их выдачи.
+
+    `collectors` — функции, возвращающие семейства метрик сервиса; они вызываются при каждом запросе,
+    поэтому должны быть дешёвыми (счётчики, размеры очередей).
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_labels = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+        self.collectors: List[Collector] = []
+        self.scrapes = 0
+        self.render_seconds = 0.0
+        self._blocks: List[_Block] = []
+        # Ключ — (файл, имя): одно имя может встречаться в нескольких файлах, метка `source` их различает.
+        self._block_of: Dict[Tuple[str, str], _Block] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[_MetricsServer] = None
+
+    def update(self, route_config: HttpRouteConfig, payload: Dict[str, Any]) -> None:
+        ok = bool(payload.get("ok"))
+        latency = payload.get("response_time_ms")
+        latency_s = float(latency) / 1000 if latency is not None else None
+        key = route_key(route_config)
+        with self._lock:
+            block = self._block_of.get(key)
+            if block is None:
+                block = self._blocks[-1] if self._blocks and len(self._blocks[-1].series) < BLOCK_SIZE else None
+                if block is None:
+                    block = _Block()
+                    self._blocks.append(block)
+                labels = format_labels(
+                    {"route": route_config.name, "source": route_config.source_path or INLINE_SOURCE}
+                )
+                block.series[key] = _RouteSeries(labels, len(self.buckets))
+                self._block_of[key] = block
+            series = block.series[key]
+            if ok:
+                series.ok += 1
+            else:
+                series.failed += 1
+            if latency_s is not None:
+                series.bucket_counts[bisect.bisect_left(self.buckets, latency_s)] += 1
+                series.latency_sum += latency_s
+            self._render_series(series, payload, ok, latency_s)
+            block.cache = None
+
+    def retain(self, routes: Iterable[HttpRouteConfig]) -> None:
+        """Убирает метрики маршрутов, которых больше нет в наборе узла."""
+        keys = {route_key(route) for route in routes}
+        with self._lock:
+            for key in [key for key in self._block_of if key not in keys]:
+                block = self._block_of.pop(key)
+                del block.series[key]
+                block.cache = None
+            self._blocks = [block for block in self._blocks if block.series]
+
+    def render_chunks(self) -> List[bytes]:
+        """Ответ `/metrics` кусками: заголовки семейств, закэшированные блоки и метрики сервиса."""
+        started = time.perf_counter()
+        with self._lock:
+            rendered = [block.render() for block in self._blocks]
+        chunks: List[bytes] = []
+        for index, header in enumerate(_FAMILY_HEADERS):
+            chunks.append(header)
+            chunks.extend(cache[index] for cache in rendered)
+        for collector in self.collectors:
+            try:
+                chunks.extend(render_family(*family).encode("utf-8") for family in collector())
+            except Exception:  # noqa: BLE001
+                logger.exception("Ошибка сборщика метрик %r", collector)
+        self.scrapes += 1
+        self.render_seconds = time.perf_counter() - started
+        return chunks
+
+    def render(self) -> bytes:
+        return b"".join(self.render_chunks())
+
+    def serve(self, host: str, port: int) -> None:
+        self._server = _MetricsServer((host, port), _MetricsHandler)
+        self._server.exporter = self
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def self_metrics(self) -> List[Family]:
+        return [
+            ("sber_monitor_metrics_scrapes_total", "counter", "Number of /metrics requests", [({}, self.scrapes)]),
+            (
+                "sber_monitor_metrics_render_seconds",
+                "gauge",
+                "Time spent rendering the previous /metrics response",
+                [({}, self.render_seconds)],
+            ),
+            ("sber_monitor_routes", "gauge", "Routes with published metrics", [({}, len(self._block_of))]),
+        ]
+
+    def _render_series(
+        self, series: _RouteSeries, payload: Dict[str, Any], ok: bool, latency_s: Optional[float]
+    ) -> None:
+        labels = series.labels
+        status_code = payload.get("status_code")
+        body_bytes = payload.get("body_bytes")
+        chain_steps = payload.get("chain_steps")
+        fragments = series.fragments
+        fragments["sber_route_up"] = f"sber_route_up{labels} {1 if ok else 0}\n"
+        fragments["sber_route_status_code"] = f"sber_route_status_code{labels} {int(status_code or 0)}\n"
+        fragments["sber_route_response_time_seconds"] = (
+            f"sber_route_response_time_seconds{labels} {format_value(round(latency_s, 6))}\n"
+            if latency_s is not None
+            else ""
+        )
+        fragments["sber_route_body_bytes"] = (
+            f"sber_route_body_bytes{labels} {int(body_bytes)}\n" if body_bytes is not None else ""
+        )
+        fragments["sber_route_chain_steps"] = (
+            f"sber_route_chain_steps{labels} {int(chain_steps)}\n" if chain_steps is not None else ""
+        )
+        fragments["sber_route_last_check_timestamp_seconds"] = (
+            f"sber_route_last_check_timestamp_seconds{labels} {format_value(round(result_timestamp(payload), 3))}\n"
+        )
+        inner = labels[1:-1]
+        fragments["sber_route_checks_total"] = (
+            f'sber_route_checks_total{{{inner},result="ok"}} {series.ok}\n'
+            f'sber_route_checks_total{{{inner},result="failed"}} {series.failed}\n'
+        )
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._bucket_labels, series.bucket_counts):
+            cumulative += count
+            lines.append(f'sber_route_latency_seconds_bucket{{{inner},le="{bound}"}} {cumulative}\n')
+        lines.append(f"sber_route_latency_seconds_sum{labels} {format_value(round(series.latency_sum, 6))}\n")
+        lines.append(f"sber_route_latency_seconds_count{labels} {cumulative}\n")
+        fragments["sber_route_latency_seconds"] = "".join(lines)
+
+
+class _MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+    exporter: PrometheusExporter
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server: _MetricsServer
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        chunks = self.server.exporter.render_chunks()
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            compressor = zlib.compressobj(1, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            chunks = [compressor.compress(chunk) for chunk in chunks] + [compressor.flush()]
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(sum(len(chunk) for chunk in chunks)))
+        self.end_headers()
+        self.wfile.writelines(chunks)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug("metrics %s - %s", self.address_string(), format % args)
+
+
+def writer_collector(writer: Any) -> Collector:
+    """Метрики выходов ResultWriter: отложенные записи, история, отправка в Zabbix."""
+
+    def collect() -> List[Family]:
+        families: List[Family] = [
+            (
+                "sber_monitor_writes_skipped_total",
+                "counter",
+                "Results not written immediately in --changes-only mode",
+                [({}, writer.skipped)],
+            ),
+            (
+                "sber_monitor_threads",
+                "gauge",
+                "Alive threads in the service process",
+                [({}, threading.active_count())],
+            ),
+        ]
+        if writer.history is not None:
+            families.append(
+                (
+                    "sber_monitor_history_rows_total",
+                    "counter",
+                    "History rows by outcome",
+                    [
+                        ({"outcome": "written"}, writer.history.written),
+                        ({"outcome": "dropped"}, writer.history.dropped),
+                    ],
+                )
+            )
+        if writer.sender is not None:
+            sender = writer.sender
+            families.append(
+                (
+                    "sber_monitor_zabbix_values_total",
+                    "counter",
+                    "Zabbix trapper values by outcome",
+                    [
+                        ({"outcome": "sent"}, sender.sent),
+                        ({"outcome": "rejected"}, sender.failed),
+                        ({"outcome": "dropped"}, sender.dropped + sender.spool_dropped),
+                    ],
+                )
+            )
+        return families
+
+    return collect
+
+
+def self_stats_collector(stats: Any) -> Collector:
+    """Замеры самонаблюдения (SelfStats): summary с квантилями, суммарным временем и числом по виду замера."""
+
+    def collect() -> List[Family]:
+        snapshot = stats.snapshot(routes=False)
+        samples: List[Sample] = []
+        for operation, timing in snapshot["timings"].items():
+            labels = {"operation": operation}
+            for key, value in timing.items():
+                if key.startswith("p") and key.endswith("_ms") and value is not None:
+                    quantile = format_value(float(key[1:-3]) / 100)
+                    samples.append(("", {**labels, "quantile": quantile}, round(value / 1000, 6)))
+            samples.append(("_sum", labels, round(timing["total_ms"] / 1000, 6)))
+            samples.append(("_count", labels, timing["count"]))
+        return [
+            ("sber_monitor_operation_seconds", "summary", "Internal operation timings", samples),
+            (
+                "sber_monitor_monitor_threads",
+                "gauge",
+                "Alive monitor threads in the service process",
+                [({}, snapshot["threads"]["monitors"])],
+            ),
+        ]
+
+    return collect
+
+
+__all__ = ["DEFAULT_BUCKETS", "PrometheusExporter", "render_family", "self_stats_collector", "writer_collector"]
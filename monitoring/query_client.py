@@ -0,0 +1,48 @@
+"""Клиент сокета запросов для UserParameter агента Zabbix.
+
+    python3 -m monitoring.query_client /run/monitoring/query.sock route/api/response_time_ms
+
+Печатает значение и выходит с кодом 0; при ошибке печатает причину в stderr и выходит с кодом 1.
+Модуль намеренно импортирует только `socket` и `sys`, чтобы запуск оставался быстрым.
+"""
+from __future__ import annotations
+
+import socket
+import sys
+
+DEFAULT_TIMEOUT = 2.0
+
+
+def query(path: str, request: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+    """Отправляет запрос и возвращает значение; при ответе `ERR` бросает RuntimeError."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(request.strip().encode("utf-8") + b"\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    response = b"".join(chunks).decode("utf-8")
+    status, _, value = response.partition(" ")
+    if status != "OK":
+        raise RuntimeError(value or response or "empty response")
+    return value
+
+
+def main(argv: list) -> int:
+    if len(argv) != 2:
+        print("usage: python3 -m monitoring.query_client SOCKET QUERY", file=sys.stderr)
+        return 2
+    try:
+        print(query(argv[0], argv[1]))
+    except (OSError, RuntimeError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,193 @@
+"""Unix-сокет для точечных запросов агента Zabbix к последним результатам в памяти.
+
+Протокол: клиент отправляет одну строку запроса, сервер отвечает `OK <значение>` или `ERR <причина>`
+и закрывает соединение. Запросы:
+
+- `ping` — проверка доступности (`pong`);
+- `discovery` — LLD маршрутов: `{"data": [{"{#ROUTE}": ..., "{#ROUTE_ID}": ..., "{#URL}": ..., "{#SOURCE}": ...,
+  "{#TAGS}": ...}]}`;
+- `discovery/tags`, `discovery/sources` — LLD тегов и файлов конфигурации;
+- `route/<имя>` — последний результат целиком (JSON);
+- `route/<имя>/<поле>[/<вложенное поле>...]` — одно значение, например `route/api/window/5m/p95_ms`;
+- `route/<файл>:<имя>[/<поле>...]` — то же для имени, которое есть в нескольких файлах (`{#ROUTE_ID}` в LLD);
+- `rollup/tags/<тег>/<поле>`, `rollup/sources/<файл>/<поле>` — значения сводок (`--rollups`);
+- `self[/<поле>...]` — замеры самонаблюдения (`--self-metrics`), например `self/timings/write/p99_ms`;
+- `profile/cpu`, `profile/memory` — включить или остановить профилирование (`--query-socket-profiling`).
+
+Сегменты пути можно кодировать как в URL (`%2F` для `/` в имени). Строки отдаются как есть, флаги — `1`/`0`,
+отсутствующее значение — пустой строкой, объекты и списки — компактным JSON.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socketserver
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import unquote
+
+from .persistence import ResultWriter
+from .rollups import INLINE_SOURCE
+from .selfstats import SELF_STATS
+from .sharding import route_id
+from .types import HttpRouteConfig
+
+MAX_REQUEST_BYTES = 4096
+DEFAULT_SOCKET_MODE = 0o660
+
+logger = logging.getLogger(__name__)
+
+
+class QueryError(Exception):
+    """Запрос не может быть выполнен; текст уходит клиенту после `ERR`."""
+
+
+def render_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return str(value)
+
+
+class QueryService:
+    """Отвечает на запросы по последним результатам ResultWriter и списку маршрутов."""
+
+    def __init__(self, writer: ResultWriter, routes: Callable[[], Sequence[HttpRouteConfig]]) -> None:
+        self.writer = writer
+        self.routes = routes
+        # Необязательный профилировщик (Profiler) для команд `profile/cpu` и `profile/memory`.
+        self.profiler: Optional[Any] = None
+
+    def answer(self, query: str) -> str:
+        parts = [unquote(part) for part in query.strip().strip("/").split("/")]
+        if not parts or not parts[0]:
+            raise QueryError("empty query")
+        head, rest = parts[0], parts[1:]
+        if head == "ping":
+            return "pong"
+        if head == "discovery":
+            return render_value(self._discovery(rest[0] if rest else "routes"))
+        if head == "route":
+            if not rest:
+                raise QueryError("route name is required")
+            return render_value(self._lookup(self._route_payload(rest[0]), rest[1:]))
+        if head == "rollup":
+            if self.writer.rollups is None:
+                raise QueryError("rollups are disabled, start the service with --rollups")
+            return render_value(self._lookup(self.writer.rollups.snapshot(), rest))
+        if head == "self":
+            if not SELF_STATS.enabled:
+                raise QueryError("self metrics are disabled, start the service with --self-metrics")
+            return render_value(self._lookup(SELF_STATS.snapshot(routes=bool(rest)), rest))
+        if head == "profile":
+            if self.profiler is None:
+                raise QueryError(
+                    "profiling over the socket is disabled, start the service with --profile-dir "
+                    "and --query-socket-profiling"
+                )
+            kind = rest[0] if rest else ""
+            if kind == "cpu":
+                return self.profiler.toggle_cpu()
+            if kind == "memory":
+                return self.profiler.toggle_memory()
+            raise QueryError(f"unknown profile {kind}")
+        raise QueryError(f"unknown query {head}")
+
+    def _route_payload(self, route: str) -> Dict[str, Any]:
+        try:
+            payload = self.writer.latest(route)
+            if payload is None and ":" in route:
+                source, _, name = route.partition(":")
+                payload = self.writer.latest(name, source=source)
+        except LookupError as exc:
+            raise QueryError(f"{exc}, use route/<source>:<name>") from exc
+        if payload is None:
+            raise QueryError(f"no result for route {route}")
+        return payload
+
+    def _discovery(self, kind: str) -> Dict[str, List[Dict[str, str]]]:
+        routes = list(self.routes())
+        if kind == "routes":
+            data = [
+                {
+                    "{#ROUTE}": route.name,
+                    "{#ROUTE_ID}": route_id(route),
+                    "{#URL}": route.url,
+                    "{#SOURCE}": route.source_path or INLINE_SOURCE,
+                    "{#TAGS}": ",".join(str(tag) for tag in route.tags),
+                }
+                for route in routes
+            ]
+        elif kind == "tags":
+            tags = dict.fromkeys(str(tag) for route in routes for tag in route.tags)
+            data = [{"{#TAG}": tag} for tag in tags]
+        elif kind == "sources":
+            sources = dict.fromkeys(route.source_path or INLINE_SOURCE for route in routes)
+            data = [{"{#SOURCE}": source} for source in sources]
+        else:
+            raise QueryError(f"unknown discovery {kind}")
+        return {"data": data}
+
+    @staticmethod
+    def _lookup(value: Any, path: Sequence[str]) -> Any:
+        for index, key in enumerate(path):
+            if isinstance(value, dict) and key in value:
+                value = value[key]
+                continue
+            if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+                value = value[int(key)]
+                continue
+            raise QueryError(f"no field {'/'.join(path[: index + 1])}")
+        return value
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "QueryServer"
+
+    def handle(self) -> None:
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            response = "OK " + self.server.service.answer(line.decode("utf-8", errors="replace"))
+        except QueryError as exc:
+            response = f"ERR {exc}"
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Ошибка обработки запроса %r", line)
+            response = f"ERR internal error: {exc}"
+        self.wfile.write(response.encode("utf-8"))
+
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Сервер сокета запросов; обслуживает соединения в потоках-демонах."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, service: QueryService, mode: int = DEFAULT_SOCKET_MODE) -> None:
+        self.path = Path(path).expanduser()
+        self.service = service
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.is_socket():
+            # Сокет остался от прошлого запуска, который не успел его удалить.
+            self.path.unlink()
+        super().__init__(str(self.path), _Handler)
+        os.chmod(self.path, mode)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, name="query-socket", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+__all__ = ["QueryError", "QueryServer", "QueryService", "render_value"]
@@ -0,0 +1,166 @@
+"""Сводки по тегам и файлам конфигурации, обновляемые по мере поступления результатов."""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .sharding import route_key
+from .stats import DEFAULT_PERCENTILES, RollingWindow, bucket_index, format_duration, histogram_percentiles
+from .types import HttpRouteConfig
+
+RouteKey = Tuple[str, str]
+GroupKey = Tuple[str, str]
+INLINE_SOURCE = "(inline)"
+
+
+class _Group:
+    """Текущее состояние маршрутов группы и, при наличии, скользящие окна по всем её проверкам."""
+
+    def __init__(self, window_lengths: Sequence[float]) -> None:
+        self.ok: Dict[RouteKey, bool] = {}
+        self.latency: Dict[RouteKey, float] = {}
+        self.names: Dict[RouteKey, str] = {}
+        self.buckets: Dict[int, int] = {}
+        self.failed = 0
+        self.worst: Optional[Tuple[float, RouteKey]] = None
+        self.worst_stale = False
+        self.windows = [RollingWindow(length) for length in window_lengths]
+        self.snapshot: Optional[Dict[str, Any]] = None
+
+    def update(self, key: RouteKey, name: str, ok: bool, latency_ms: Optional[float]) -> None:
+        self.names[key] = name
+        previous_ok = self.ok.get(key)
+        if previous_ok is False:
+            self.failed -= 1
+        self.ok[key] = ok
+        if not ok:
+            self.failed += 1
+        self._set_latency(key, latency_ms)
+        self.snapshot = None
+
+    def remove(self, key: RouteKey) -> None:
+        if self.ok.pop(key, True) is False:
+            self.failed -= 1
+        self.names.pop(key, None)
+        self._set_latency(key, None)
+        self.snapshot = None
+
+    def _set_latency(self, key: RouteKey, latency_ms: Optional[float]) -> None:
+        previous = self.latency.pop(key, None)
+        if previous is not None:
+            index = bucket_index(previous)
+            left = self.buckets[index] - 1
+            if left:
+                self.buckets[index] = left
+            else:
+                del self.buckets[index]
+            if self.worst is not None and self.worst[1] == key:
+                # Худший маршрут улучшился или ушёл — максимум пересчитаем при следующем снимке.
+                self.worst_stale = True
+        if latency_ms is None:
+            return
+        self.latency[key] = latency_ms
+        index = bucket_index(latency_ms)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        if not self.worst_stale and (self.worst is None or latency_ms >= self.worst[0]):
+            self.worst = (latency_ms, key)
+
+    def render(self, now: float, labels: Sequence[str], percentiles: Sequence[float]) -> Dict[str, Any]:
+        if self.snapshot is not None and not self.windows:
+            return self.snapshot
+        if self.worst_stale:
+            self.worst = max(((value, key) for key, value in self.latency.items()), default=None)
+            self.worst_stale = False
+        routes = len(self.ok)
+        snapshot: Dict[str, Any] = {
+            "routes": routes,
+            "ok": routes - self.failed,
+            "failed": self.failed,
+            "availability": round((routes - self.failed) / routes, 4) if routes else None,
+            "worst_ms": round(self.worst[0], 2) if self.worst else None,
+            "worst_route": self.names.get(self.worst[1]) if self.worst else None,
+        }
+        upper = self.worst[0] if self.worst else None
+        snapshot.update(histogram_percentiles(self.buckets, len(self.latency), percentiles, upper=upper))
+        if self.windows:
+            snapshot["window"] = {
+                label: window.snapshot(now, percentiles) for label, window in zip(labels, self.windows)
+            }
+        self.snapshot = snapshot
+        return snapshot
+
+
+class RollupAggregator:
+    """Сводки по тегам и файлам конфигурации по последнему результату каждого маршрута.
+
+    Результат меняет только группы своего маршрута за O(1) (плюс O(число тегов маршрута)), снимок
+    пересобирает лишь изменившиеся группы. Перцентили считаются по последним задержкам маршрутов группы
+    (гистограмма с шагом 4 %). Если заданы `window_lengths`, у каждой группы есть ещё скользящие окна
+    по всем проверкам её маршрутов.
+    """
+
+    def __init__(
+        self, window_lengths: Sequence[float] = (), percentiles: Sequence[float] = DEFAULT_PERCENTILES
+    ) -> None:
+        self.window_lengths = sorted(set(window_lengths))
+        self.labels = [format_duration(length) for length in self.window_lengths]
+        self.percentiles = tuple(percentiles)
+        self._groups: Dict[GroupKey, _Group] = {}
+        self._membership: Dict[RouteKey, List[GroupKey]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, route_config: HttpRouteConfig, payload: Dict[str, Any]) -> None:
+        key = route_key(route_config)
+        groups = self._groups_of(route_config)
+        latency = payload.get("response_time_ms")
+        latency_ms = float(latency) if latency is not None else None
+        ok = bool(payload.get("ok"))
+        now = time.monotonic()
+        with self._lock:
+            previous = self._membership.get(key, [])
+            if previous != groups:
+                # Теги или файл маршрута изменились после перезагрузки конфигурации.
+                for group_key in previous:
+                    if group_key not in groups:
+                        self._groups[group_key].remove(key)
+                self._membership[key] = groups
+            for group_key in groups:
+                group = self._groups.get(group_key)
+                if group is None:
+                    group = _Group(self.window_lengths)
+                    self._groups[group_key] = group
+                group.update(key, route_config.name, ok, latency_ms)
+                for window in group.windows:
+                    window.add(now, ok, latency_ms)
+
+    def retain(self, routes: Iterable[HttpRouteConfig]) -> None:
+        """Убирает из сводок маршруты, которых больше нет в наборе узла (перезагрузка, перебалансировка)."""
+        keys = {route_key(route) for route in routes}
+        with self._lock:
+            for key in [key for key in self._membership if key not in keys]:
+                for group_key in self._membership.pop(key):
+                    group = self._groups[group_key]
+                    group.remove(key)
+                    if not group.ok:
+                        del self._groups[group_key]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Секция `rollups`: {"tags": {тег: сводка}, "sources": {файл: сводка}}."""
+        now = time.monotonic()
+        result: Dict[str, Dict[str, Any]] = {"tags": {}, "sources": {}}
+        with self._lock:
+            for (kind, name), group in sorted(self._groups.items()):
+                if not group.ok:
+                    continue
+                result[kind][name] = group.render(now, self.labels, self.percentiles)
+        return result
+
+    @staticmethod
+    def _groups_of(route_config: HttpRouteConfig) -> List[GroupKey]:
+        groups = [("sources", route_config.source_path or INLINE_SOURCE)]
+        groups.extend(("tags", str(tag)) for tag in dict.fromkeys(route_config.tags or []))
+        return groups
+
+
+__all__ = ["INLINE_SOURCE", "RollupAggregator"]
@@ -0,0 +1,132 @@
+"""Самонаблюдение сервиса: счётчики и гистограммы времени внутренних операций.
+
+Замеры собираются в глобальный `SELF_STATS` и включаются флагом `--self-metrics`; выключенный сборщик
+стоит одной проверки атрибута. Включённый — одна блокировка и одно обновление гистограммы на замер, так что его
+можно держать включённым постоянно. Гистограммы логарифмические, как у скользящих окон (шаг 4 %).
+
+Замеры:
+
+- `schedule_lag` — насколько позже плана начался очередной прогон маршрута;
+- `prepare` — подготовка запроса: шаблоны, тела, multipart и ZIP;
+- `request` — сам HTTP-запрос;
+- `zip_build` — сборка ZIP-архива для загрузки;
+- `write` — весь `ResultWriter.write_result`;
+- `writer_lock_wait`, `writer_lock_hold` — ожидание и удержание блокировки записи.
+
+Счётчики: `runs` — прогоны мониторов, `run_errors` — прогоны, завершившиеся необработанным исключением.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from .stats import DEFAULT_PERCENTILES, bucket_index, histogram_percentiles
+
+MONITOR_THREAD_PREFIX = "monitor-"
+
+
+class Histogram:
+    """Число, сумма, максимум и разреженная гистограмма замеров в миллисекундах."""
+
+    __slots__ = ("count", "total_ms", "max_ms", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, value_ms: float) -> None:
+        self.count += 1
+        self.total_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+        index = bucket_index(value_ms)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def snapshot(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3) if self.count else None,
+        }
+        result.update(histogram_percentiles(self.buckets, self.count, percentiles, upper=self.max_ms))
+        return result
+
+
+class SelfStats:
+    """Сборщик замеров: общие гистограммы по видам замеров, по маршрутам и счётчики событий."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Histogram] = {}
+        # Ключ — (файл, имя маршрута, вид замера).
+        self._routes: Dict[Tuple[str, str, str], Histogram] = {}
+        self._counters: Dict[str, int] = {}
+
+    def observe(self, metric: str, value_ms: float, route: Optional[Tuple[str, str]] = None) -> None:
+        """Добавляет замер; `route` — `route_key` маршрута (файл, имя), если замер относится к нему."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._totals.get(metric)
+            if histogram is None:
+                histogram = self._totals[metric] = Histogram()
+            histogram.add(value_ms)
+            if route is not None:
+                key = (route[0], route[1], metric)
+                histogram = self._routes.get(key)
+                if histogram is None:
+                    histogram = self._routes[key] = Histogram()
+                histogram.add(value_ms)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def forget_routes(self, keep: Sequence[Tuple[str, str]]) -> None:
+        """Удаляет замеры маршрутов, которых больше нет в конфигурации; `keep` — их `route_key`."""
+        keys = set(keep)
+        with self._lock:
+            for key in [key for key in self._routes if key[:2] not in keys]:
+                del self._routes[key]
+
+    def snapshot(self, routes: bool = True) -> Dict[str, Any]:
+        threads = threading.enumerate()
+        with self._lock:
+            timings = {metric: histogram.snapshot() for metric, histogram in sorted(self._totals.items())}
+            per_route: Dict[str, Dict[str, Any]] = {}
+            if routes:
+                for (source, name, metric), histogram in sorted(self._routes.items()):
+                    per_route.setdefault(f"{source}:{name}", {})[metric] = histogram.snapshot()
+            counters = dict(sorted(self._counters.items()))
+        snapshot: Dict[str, Any] = {
+            "uptime_s": round(time.time() - self.started, 1),
+            "threads": {
+                "alive": len(threads),
+                "monitors": sum(1 for thread in threads if thread.name.startswith(MONITOR_THREAD_PREFIX)),
+            },
+            "counters": counters,
+            "timings": timings,
+        }
+        if routes:
+            snapshot["routes"] = per_route
+        return snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+            self._routes.clear()
+            self._counters.clear()
+
+
+SELF_STATS = SelfStats()
+
+
+__all__ = ["Histogram", "SELF_STATS", "SelfStats"]
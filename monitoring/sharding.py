@@ -0,0 +1,87 @@
+"""Консистентное хеширование для распределения маршрутов между исполнителями."""
+from __future__ import annotations
+
+import bisect
+import hashlib
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+from urllib.parse import quote
+
+from .types import HttpRouteConfig
+
+DEFAULT_VNODES = 64
+SHARD_KEYS: Dict[str, Callable[[HttpRouteConfig], str]] = {
+    "name": lambda route: route.name,
+    "file": lambda route: route.source_path or "",
+}
+
+
+def route_key(route: HttpRouteConfig) -> Tuple[str, str]:
+    """Ключ маршрута, уникальный в пределах дерева конфигурации."""
+    return route.source_path or "", route.name
+
+
+def route_id(route: HttpRouteConfig) -> str:
+    """`route_key` одной строкой `<файл>:<имя>`, закодированной как сегмент URL (в пути файла есть `/`).
+
+    Это `{#ROUTE_ID}` в LLD: годится и для запросов `route/...` к сокету, и для параметра ключа Zabbix.
+    """
+    return quote(f"{route.source_path or ''}:{route.name}", safe="")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Кольцо консистентного хеширования с виртуальными узлами."""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = DEFAULT_VNODES) -> None:
+        self.nodes = sorted(set(nodes))
+        self.vnodes = max(int(vnodes), 1)
+        points: List[Tuple[int, str]] = []
+        for node in self.nodes:
+            for replica in range(self.vnodes):
+                points.append((_hash(f"{node}#{replica}"), node))
+        points.sort()
+        self._hashes = [point for point, _ in points]
+        self._owners = [owner for _, owner in points]
+
+    def get_nodes(self, key: str, count: int = 1) -> List[str]:
+        """Возвращает `count` различных узлов по часовой стрелке от хеша ключа."""
+        if not self.nodes:
+            return []
+        count = min(max(count, 1), len(self.nodes))
+        selected: List[str] = []
+        index = bisect.bisect(self._hashes, _hash(key))
+        total = len(self._hashes)
+        for offset in range(total):
+            owner = self._owners[(index + offset) % total]
+            if owner not in selected:
+                selected.append(owner)
+                if len(selected) == count:
+                    break
+        return selected
+
+    def get_node(self, key: str) -> str:
+        nodes = self.get_nodes(key)
+        if not nodes:
+            raise ValueError("Кольцо хеширования не содержит узлов")
+        return nodes[0]
+
+
+def shard_routes(routes: Sequence[HttpRouteConfig], shards: int, by: str = "name") -> List[List[HttpRouteConfig]]:
+    """Раскладывает маршруты по `shards` группам по имени или файлу-источнику."""
+    if shards < 1:
+        raise ValueError("Число шардов должно быть положительным")
+    key_fn = SHARD_KEYS.get(by)
+    if key_fn is None:
+        raise ValueError(f"Неподдерживаемый ключ шардирования: {by}")
+    shard_ids = [str(index) for index in range(shards)]
+    ring = HashRing(shard_ids)
+    buckets: List[List[HttpRouteConfig]] = [[] for _ in range(shards)]
+    for route in routes:
+        buckets[int(ring.get_node(key_fn(route)))].append(route)
+    return buckets
+
+
+__all__ = ["HashRing", "SHARD_KEYS", "route_id", "route_key", "shard_routes"]
@@ -0,0 +1,221 @@
+"""Скользящие окна по маршрутам: доля успешных проверок и перцентили задержки."""
+from __future__ import annotations
+
+import math
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .sharding import route_key
+from .types import HttpRouteConfig
+
+WINDOW_SLICES = 12
+DEFAULT_PERCENTILES: Tuple[float, ...] = (50.0, 95.0, 99.0)
+# Логарифмические корзины гистограммы: относительная погрешность перцентиля не больше шага (4 %).
+HISTOGRAM_MIN_MS = 0.1
+HISTOGRAM_GROWTH = 1.04
+_LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+
+_DURATION_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$")
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_duration(value: str) -> float:
+    """Переводит длительность вида `90`, `15m`, `24h`, `7d` в секунды."""
+    match = _DURATION_RE.match(value)
+    if not match:
+        raise ValueError(f"Некорректная длительность: {value!r}")
+    amount, unit = match.groups()
+    return float(amount) * _DURATION_UNITS[unit]
+
+
+def format_duration(seconds: float) -> str:
+    """Короткая подпись окна: 300 -> `5m`, 3600 -> `1h`."""
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{int(seconds // size)}{unit}"
+    return f"{seconds:g}s"
+
+
+def bucket_index(latency_ms: float) -> int:
+    if latency_ms <= HISTOGRAM_MIN_MS:
+        return 0
+    return int(math.log(latency_ms / HISTOGRAM_MIN_MS) / _LOG_GROWTH) + 1
+
+
+def bucket_value(index: int) -> float:
+    """Представитель корзины — её геометрическая середина."""
+    if index <= 0:
+        return HISTOGRAM_MIN_MS
+    return HISTOGRAM_MIN_MS * HISTOGRAM_GROWTH ** (index - 0.5)
+
+
+def histogram_percentiles(
+    buckets: Dict[int, int], count: int, percentiles: Sequence[float], upper: Optional[float] = None
+) -> Dict[str, Optional[float]]:
+    """Перцентили по ближайшему рангу из разреженной гистограммы {корзина: число}.
+
+    `upper` — точный максимум выборки: оценка по середине корзины не должна его превышать.
+    """
+    result: Dict[str, Optional[float]] = {f"p{pct:g}_ms": None for pct in percentiles}
+    if count <= 0:
+        return result
+    ranks = sorted((max(math.ceil(count * pct / 100), 1), f"p{pct:g}_ms") for pct in percentiles)
+    seen = 0
+    position = 0
+    for index in sorted(buckets):
+        seen += buckets[index]
+        while position < len(ranks) and ranks[position][0] <= seen:
+            value = bucket_value(index) if upper is None else min(bucket_value(index), upper)
+            result[ranks[position][1]] = round(value, 2)
+            position += 1
+        if position == len(ranks):
+            break
+    return result
+
+
+class _Slice:
+    """Доля окна: счётчики и гистограмма задержек за `length / WINDOW_SLICES` секунд."""
+
+    __slots__ = ("slot", "count", "ok", "latency_count", "total_ms", "max_ms", "buckets")
+
+    def __init__(self, slot: int) -> None:
+        self.slot = slot
+        self.count = 0
+        self.ok = 0
+        self.latency_count = 0
+        self.total_ms = 0.0
+        self.max_ms: Optional[float] = None
+        self.buckets: Dict[int, int] = {}
+
+
+class RollingWindow:
+    """Окно длиной `length` секунд из кольца долей с общими суммами.
+
+    Проверка добавляется в текущую долю и в общие суммы за O(1); устаревшая доля целиком вычитается из сумм.
+    Поэтому стоимость записи и снимка не зависит ни от длины окна, ни от числа проверок в нём.
+    Окно сдвигается долями, так что фактически охватывает от 11/12 до 12/12 длины.
+    """
+
+    def __init__(self, length: float, slices: int = WINDOW_SLICES) -> None:
+        if length <= 0:
+            raise ValueError(f"Длина окна должна быть положительной: {length}")
+        self.length = length
+        self.slices = max(slices, 1)
+        self.slice_length = length / self.slices
+        self._ring: Deque[_Slice] = deque()
+        self.count = 0
+        self.ok = 0
+        self.latency_count = 0
+        self.total_ms = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, now: float, ok: bool, latency_ms: Optional[float]) -> None:
+        current = self._advance(now)
+        current.count += 1
+        self.count += 1
+        if ok:
+            current.ok += 1
+            self.ok += 1
+        if latency_ms is None:
+            return
+        index = bucket_index(latency_ms)
+        current.latency_count += 1
+        current.total_ms += latency_ms
+        current.max_ms = latency_ms if current.max_ms is None else max(current.max_ms, latency_ms)
+        current.buckets[index] = current.buckets.get(index, 0) + 1
+        self.latency_count += 1
+        self.total_ms += latency_ms
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def snapshot(self, now: float, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+        self._expire(int(now // self.slice_length))
+        max_values = [item.max_ms for item in self._ring if item.max_ms is not None]
+        upper = max(max_values) if max_values else None
+        snapshot: Dict[str, Any] = {
+            "count": self.count,
+            "ok": self.ok,
+            "failed": self.count - self.ok,
+            "success_ratio": round(self.ok / self.count, 4) if self.count else None,
+            "avg_ms": round(self.total_ms / self.latency_count, 2) if self.latency_count else None,
+            "max_ms": round(upper, 2) if upper is not None else None,
+        }
+        snapshot.update(histogram_percentiles(self.buckets, self.latency_count, percentiles, upper=upper))
+        return snapshot
+
+    def _advance(self, now: float) -> _Slice:
+        slot = int(now // self.slice_length)
+        self._expire(slot)
+        if not self._ring or self._ring[-1].slot != slot:
+            self._ring.append(_Slice(slot))
+        return self._ring[-1]
+
+    def _expire(self, slot: int) -> None:
+        while self._ring and self._ring[0].slot <= slot - self.slices:
+            old = self._ring.popleft()
+            self.count -= old.count
+            self.ok -= old.ok
+            self.latency_count -= old.latency_count
+            self.total_ms -= old.total_ms
+            for index, amount in old.buckets.items():
+                left = self.buckets[index] - amount
+                if left:
+                    self.buckets[index] = left
+                else:
+                    del self.buckets[index]
+        if not self._ring:
+            # Сбрасываем накопленную погрешность float после опустошения окна.
+            self.total_ms = 0.0
+
+
+class WindowStats:
+    """Скользящие окна для каждого маршрута; `process` возвращает секцию `window` для результата."""
+
+    def __init__(
+        self, lengths: Sequence[float], percentiles: Sequence[float] = DEFAULT_PERCENTILES
+    ) -> None:
+        if not lengths:
+            raise ValueError("Нужно указать хотя бы одно окно")
+        if any(length <= 0 for length in lengths):
+            raise ValueError("Длина окна должна быть положительной")
+        self.lengths = sorted(set(lengths))
+        self.labels = [format_duration(length) for length in self.lengths]
+        self.percentiles = tuple(percentiles)
+        self._windows: Dict[Tuple[str, str], List[RollingWindow]] = {}
+        self._lock = threading.Lock()
+
+    def process(self, route_config: HttpRouteConfig, payload: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        latency = payload.get("response_time_ms")
+        latency_ms = float(latency) if latency is not None else None
+        ok = bool(payload.get("ok"))
+        key = route_key(route_config)
+        with self._lock:
+            windows = self._windows.get(key)
+            if windows is None:
+                windows = [RollingWindow(length) for length in self.lengths]
+                self._windows[key] = windows
+            section: Dict[str, Dict[str, Any]] = {}
+            for label, window in zip(self.labels, windows):
+                window.add(now, ok, latency_ms)
+                section[label] = window.snapshot(now, self.percentiles)
+        return section
+
+    def retain(self, routes: Iterable[HttpRouteConfig]) -> None:
+        """Забывает окна маршрутов, которых больше нет в наборе узла: вернувшийся маршрут начнёт с пустых окон."""
+        keys = {route_key(route) for route in routes}
+        with self._lock:
+            for key in [key for key in self._windows if key not in keys]:
+                del self._windows[key]
+
+
+__all__ = [
+    "DEFAULT_PERCENTILES",
+    "RollingWindow",
+    "WindowStats",
+    "format_duration",
+    "histogram_percentiles",
+    "parse_duration",
+]
@@ -0,0 +1,350 @@
+"""Таблица статусов в отображаемом в память файле: чтение статуса маршрута без разбора JSON.
+
+Файл таблицы — заголовок и по одной записи фиксированного размера на маршрут (little-endian):
+
+    заголовок, 32 байта: magic `SBSTAT01` (8s), версия (u16), размер записи (u16), ёмкость в записях (u32),
+                         размер заголовка (u32), резерв (12 байт)
+    запись, 32 байта:    seq (u32), crc32 ключа маршрута (u32), задержка в мс (f64, NaN — нет),
+                         время проверки в секундах Unix (f64, 0 — не было), HTTP-статус (u16, 0 — нет ответа),
+                         ok (u8), код ошибки (u8, см. ERROR_CODES), резерв (4 байта)
+
+Запись маршрута лежит по смещению `header_size + slot * record_size`; номер слота берётся из файла индекса
+(JSON `{"slots": {"<файл>:<имя>": слот}, ...}`), который пишется рядом при запуске и при изменении набора
+маршрутов. Ключ включает файл конфигурации: одно имя может встречаться в нескольких файлах. Слот маршрута
+не меняется, пока маршрут есть в конфигурации; слот удалённого маршрута может достаться новому, поэтому
+читатель сверяет crc32 ключа. Запись обновляется на месте под счётчиком seq (seqlock): нечётный seq —
+запись меняется, поэтому читатель повторяет чтение, если seq нечётный или изменился за время чтения.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .persistence import result_timestamp
+from .types import HttpRouteConfig
+
+MAGIC = b"SBSTAT01"
+VERSION = 2
+HEADER = struct.Struct("<8sHHII12x")
+RECORD = struct.Struct("<IIddHBB4x")
+SEQ = struct.Struct("<I")
+MIN_CAPACITY = 64
+READ_RETRIES = 100
+
+# Коды ошибок в записи: по тексту ошибки результата, без разбора на стороне читателя.
+ERROR_NONE = 0
+ERROR_HTTP_STATUS = 1
+ERROR_TIMEOUT = 2
+ERROR_CONNECTION = 3
+ERROR_SSL = 4
+ERROR_CHECK = 5
+ERROR_OTHER = 255
+ERROR_CODES = {
+    ERROR_NONE: "none",
+    ERROR_HTTP_STATUS: "http_status",
+    ERROR_TIMEOUT: "timeout",
+    ERROR_CONNECTION: "connection",
+    ERROR_SSL: "ssl",
+    ERROR_CHECK: "check",
+    ERROR_OTHER: "other",
+}
+
+
+def name_hash(name: str) -> int:
+    # 0 зарезервирован за свободным слотом.
+    return zlib.crc32(name.encode("utf-8")) or 1
+
+
+def error_code(payload: Dict[str, Any]) -> int:
+    error = payload.get("error")
+    if not error:
+        return ERROR_NONE if payload.get("ok") else ERROR_HTTP_STATUS
+    if payload.get("status_code") is not None:
+        # Ответ получен, но не прошла проверка результата (например, wait_for).
+        return ERROR_CHECK
+    text = str(error).lower()
+    if "timed out" in text or "timeout" in text:
+        return ERROR_TIMEOUT
+    if "ssl" in text or "certificate" in text:
+        return ERROR_SSL
+    if "connect" in text or "resolve" in text or "refused" in text:
+        return ERROR_CONNECTION
+    return ERROR_OTHER
+
+
+def slot_key(source: Optional[str], name: str) -> str:
+    """Ключ маршрута в индексе: `<файл>:<имя>`, как у консистентного хеша кластера."""
+    return f"{source or ''}:{name}"
+
+
+def default_index_path(table_path: Path) -> Path:
+    return table_path.with_name(table_path.name + ".index.json")
+
+
+class StatusTable:
+    """Пишущая сторона таблицы статусов; один экземпляр на процесс, обновления из потоков мониторов.
+
+    `assign` раздаёт слоты по списку маршрутов из конфигурации: существующие маршруты сохраняют слоты из
+    прошлого индекса, освободившиеся слоты очищаются и переиспользуются. Маршрут без слота получает его при
+    первом результате. Файл растёт на месте, когда слотов не хватает; ёмкость в заголовке обновляется.
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None) -> None:
+        self.path = Path(path).expanduser()
+        self.index_path = Path(index_path).expanduser() if index_path else default_index_path(self.path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = self._load_index()
+        self._hashes: Dict[str, int] = {name: name_hash(name) for name in self._slots}
+        self._file = open(self.path, "a+b")
+        self.capacity = 0
+        self._map: Optional[mmap.mmap] = None
+        self._open(max(MIN_CAPACITY, len(self._slots) * 2, max(self._slots.values(), default=-1) + 1))
+        self._next_slot = max(self._slots.values(), default=-1) + 1
+        used = set(self._slots.values())
+        self._free: List[int] = [slot for slot in range(self._next_slot) if slot not in used]
+        heapq.heapify(self._free)
+
+    def assign(self, routes: Iterable[HttpRouteConfig]) -> None:
+        wanted = list(dict.fromkeys(slot_key(route.source_path, route.name) for route in routes))
+        with self._lock:
+            keep = set(wanted)
+            for name in [name for name in self._slots if name not in keep]:
+                slot = self._slots.pop(name)
+                self._hashes.pop(name, None)
+                self._clear(slot)
+                heapq.heappush(self._free, slot)
+            for name in wanted:
+                if name not in self._slots:
+                    self._allocate(name)
+            self._write_index()
+
+    def update(self, route: HttpRouteConfig, payload: Dict[str, Any]) -> None:
+        name = slot_key(route.source_path, route.name)
+        latency = payload.get("response_time_ms")
+        status_code = payload.get("status_code")
+        values = (
+            float(latency) if latency is not None else math.nan,
+            result_timestamp(payload),
+            int(status_code) if status_code is not None else 0,
+            1 if payload.get("ok") else 0,
+            error_code(payload),
+        )
+        with self._lock:
+            slot = self._slots.get(name)
+            if slot is None:
+                slot = self._allocate(name)
+                self._write_index()
+            self._write_record(slot, self._hashes[name], values)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.flush()
+                self._map.close()
+                self._map = None
+            self._file.close()
+
+    def _open(self, capacity: int) -> None:
+        size = os.fstat(self._file.fileno()).st_size
+        header = None
+        if size >= HEADER.size:
+            self._file.seek(0)
+            header = HEADER.unpack(self._file.read(HEADER.size))
+        valid = (
+            header is not None
+            and header[0] == MAGIC
+            and header[1] == VERSION
+            and header[2] == RECORD.size
+            and header[4] == HEADER.size
+            and size >= HEADER.size + header[3] * RECORD.size
+        )
+        if not valid:
+            # Чужой или старый формат: начинаем таблицу заново, прошлые слоты ничего не значат.
+            self._slots.clear()
+            self._hashes.clear()
+            self._file.truncate(0)
+        capacity = max(capacity, header[3] if valid and header else 0)
+        self._file.truncate(HEADER.size + capacity * RECORD.size)
+        self._map = mmap.mmap(self._file.fileno(), HEADER.size + capacity * RECORD.size)
+        self.capacity = capacity
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size, capacity, HEADER.size)
+
+    def _grow(self) -> None:
+        assert self._map is not None
+        capacity = self.capacity * 2
+        self._file.truncate(HEADER.size + capacity * RECORD.size)
+        self._map.resize(HEADER.size + capacity * RECORD.size)
+        self.capacity = capacity
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size, capacity, HEADER.size)
+
+    def _allocate(self, name: str) -> int:
+        if self._free:
+            slot = heapq.heappop(self._free)
+        else:
+            slot = self._next_slot
+            self._next_slot += 1
+        while slot >= self.capacity:
+            self._grow()
+        self._slots[name] = slot
+        self._hashes[name] = name_hash(name)
+        # Слот сразу помечаем именем: до первого результата читатель видит пустую запись маршрута.
+        self._clear(slot, self._hashes[name])
+        return slot
+
+    def _clear(self, slot: int, hashed: int = 0) -> None:
+        self._write_record(slot, hashed, (math.nan, 0.0, 0, 0, ERROR_NONE))
+
+    def _write_record(self, slot: int, hashed: int, values: Tuple[float, float, int, int, int]) -> None:
+        assert self._map is not None
+        offset = HEADER.size + slot * RECORD.size
+        seq = SEQ.unpack_from(self._map, offset)[0]
+        # Нечётный seq на время записи: читатель увидит, что запись меняется, и повторит чтение.
+        SEQ.pack_into(self._map, offset, (seq + 1) & 0xFFFFFFFF)
+        RECORD.pack_into(self._map, offset, (seq + 1) & 0xFFFFFFFF, hashed, *values)
+        SEQ.pack_into(self._map, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _load_index(self) -> Dict[str, int]:
+        try:
+            raw = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(raw, dict) or raw.get("version") != VERSION:
+            return {}
+        slots = raw.get("slots")
+        if not isinstance(slots, dict):
+            return {}
+        return {str(name): int(slot) for name, slot in slots.items()}
+
+    def _write_index(self) -> None:
+        index = {
+            "table": self.path.name,
+            "version": VERSION,
+            "header_size": HEADER.size,
+            "record_size": RECORD.size,
+            "error_codes": {str(code): label for code, label in ERROR_CODES.items()},
+            "slots": dict(sorted(self._slots.items(), key=lambda item: item[1])),
+        }
+        tmp_file = self.index_path.with_name(f".{self.index_path.name}.tmp")
+        tmp_file.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_file, self.index_path)
+
+
+class StatusTableReader:
+    """Читающая сторона: индекс разбирается один раз, статус маршрута — это чтение записи по смещению.
+
+    Индекс перечитывается, если маршрута в нём нет или crc32 в записи не совпал (слоты переназначены);
+    отображение файла расширяется, если слот лежит за его концом (таблица выросла).
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None) -> None:
+        self.path = Path(path).expanduser()
+        self.index_path = Path(index_path).expanduser() if index_path else default_index_path(self.path)
+        self._slots: Dict[str, int] = {}
+        self._names: Dict[str, List[str]] = {}
+        self._index_version: Optional[Tuple[int, int, int]] = None
+        self._file = open(self.path, "rb")
+        self._map: Optional[mmap.mmap] = None
+        self._remap()
+        self._reload_index()
+
+    def read(self, name: str, source: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Статус маршрута или None, если маршрута нет в таблице.
+
+        Без `source` имя должно быть однозначным; если маршрут с таким именем есть в нескольких файлах,
+        выбрасывается LookupError.
+        """
+        for _ in range(2):
+            key = self._resolve(name, source)
+            slot = self._slots.get(key) if key is not None else None
+            if key is not None and slot is not None:
+                if HEADER.size + (slot + 1) * RECORD.size > len(self._map or b""):
+                    self._remap()
+                record = self._read_record(slot)
+                if record is not None and record[1] == name_hash(key):
+                    return self._decode(record)
+            if not self._reload_index():
+                return None
+        return None
+
+    def _resolve(self, name: str, source: Optional[str]) -> Optional[str]:
+        if source is not None:
+            return slot_key(source, name)
+        keys = self._names.get(name, [])
+        if len(keys) > 1 and self._reload_index():
+            # Неоднозначность могла остаться от устаревшего индекса.
+            keys = self._names.get(name, [])
+        if len(keys) > 1:
+            sources = ", ".join(key.partition(":")[0] for key in keys)
+            raise LookupError(f"route {name} is defined in several files: {sources}")
+        return keys[0] if keys else None
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _read_record(self, slot: int) -> Optional[Tuple[Any, ...]]:
+        assert self._map is not None
+        offset = HEADER.size + slot * RECORD.size
+        for _ in range(READ_RETRIES):
+            before = SEQ.unpack_from(self._map, offset)[0]
+            if before & 1:
+                # Писатель посреди записи: отдаём процессор, чтобы он успел её закончить.
+                time.sleep(0)
+                continue
+            record = RECORD.unpack_from(self._map, offset)
+            if SEQ.unpack_from(self._map, offset)[0] == before:
+                return record
+        return None
+
+    @staticmethod
+    def _decode(record: Tuple[Any, ...]) -> Dict[str, Any]:
+        _, _, latency, timestamp, status_code, ok, code = record
+        return {
+            "ok": bool(ok),
+            "status_code": status_code or None,
+            "response_time_ms": None if math.isnan(latency) else latency,
+            "timestamp": timestamp or None,
+            "error_code": code,
+            "error": ERROR_CODES.get(code, ERROR_CODES[ERROR_OTHER]),
+        }
+
+    def _remap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, _, header_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size or header_size != HEADER.size:
+            raise ValueError(f"{self.path}: неизвестный формат таблицы статусов")
+
+    def _reload_index(self) -> bool:
+        """Перечитывает индекс, если он изменился; возвращает True, если слоты обновлены."""
+        try:
+            stat = self.index_path.stat()
+        except OSError:
+            return False
+        # Индекс подменяется через os.replace, так что новый индекс — это новый inode даже при той же mtime.
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if version == self._index_version:
+            return False
+        raw = json.loads(self.index_path.read_text(encoding="utf-8"))
+        self._slots = {str(key): int(slot) for key, slot in raw.get("slots", {}).items()}
+        self._names = {}
+        for key in self._slots:
+            self._names.setdefault(key.partition(":")[2], []).append(key)
+        self._index_version = version
+        return True
+
+
+__all__ = ["ERROR_CODES", "StatusTable", "StatusTableReader", "default_index_path", "error_code", "slot_key"]
@@ -0,0 +1,338 @@
+"""HTTP-транспорт мониторов: общий кэш SSL-контекстов и адаптер requests."""
+from __future__ import annotations
+
+import os
+import select
+import socket
+import ssl
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from requests.utils import DEFAULT_CA_BUNDLE_PATH, extract_zipped_paths, get_environ_proxies, select_proxy
+
+ClientCert = Optional[Union[str, Tuple[str, Optional[str]]]]
+ContextKey = Tuple[Any, Optional[Tuple[str, Optional[str]]]]
+
+_CONTEXTS: Dict[ContextKey, ssl.SSLContext] = {}
+_CONTEXTS_LOCK = threading.Lock()
+
+# Все соединения мониторов процесса; при остановке их сокеты закрываются, чтобы прервать запросы.
+_CONNECTIONS: "weakref.WeakSet[Any]" = weakref.WeakSet()
+_CONNECTIONS_LOCK = threading.Lock()
+
+
+def _track(conn: Any) -> None:
+    with _CONNECTIONS_LOCK:
+        _CONNECTIONS.add(conn)
+
+
+class _TrackedHTTPConnection(HTTPConnection):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        _track(self)
+
+
+class _TrackedHTTPSConnection(HTTPSConnection):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        _track(self)
+
+
+class _TrackedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TrackedHTTPConnection
+
+
+class _TrackedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TrackedHTTPSConnection
+
+
+def abort_inflight() -> int:
+    """Обрывает сокеты всех открытых соединений мониторов; возвращает число оборванных.
+
+    Ожидающие ответа запросы сразу завершаются ошибкой соединения, а не по своему таймауту.
+    Соединения в процессе установки (DNS, TCP connect) ещё не имеют сокета и ограничены connect-таймаутом.
+    """
+    with _CONNECTIONS_LOCK:
+        connections = list(_CONNECTIONS)
+    aborted = 0
+    for conn in connections:
+        sock = getattr(conn, "sock", None)
+        if sock is None:
+            continue
+        try:
+            # shutdown базового сокета будит поток, заблокированный в recv, не трогая состояние SSL-обёртки.
+            socket.socket.shutdown(sock, socket.SHUT_RDWR)
+        except OSError:
+            continue
+        aborted += 1
+    return aborted
+
+
+class _ResumingSSLSocket(ssl.SSLSocket):
+    """SSL-сокет, сохраняющий свою TLS-сессию в контексте при закрытии."""
+
+    def close(self) -> None:
+        context = self.context
+        if isinstance(context, ResumingSSLContext):
+            context.remember_session(self.server_hostname, self)
+        super().close()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """SSL-контекст, переиспользующий TLS-сессии по имени хоста."""
+
+    sslsocket_class = _ResumingSSLSocket
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__()
+        self._sessions: Dict[str, ssl.SSLSession] = {}
+
+    def wrap_socket(  # type: ignore[override]
+        self,
+        sock: Any,
+        server_side: bool = False,
+        do_handshake_on_connect: bool = True,
+        suppress_ragged_eofs: bool = True,
+        server_hostname: Optional[str] = None,
+        session: Optional[ssl.SSLSession] = None,
+    ) -> ssl.SSLSocket:
+        if session is None and server_hostname and not server_side:
+            session = self._sessions.get(server_hostname)
+        ssl_sock = super().wrap_socket(
+            sock,
+            server_side=server_side,
+            do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs,
+            server_hostname=server_hostname,
+            session=session,
+        )
+        self.remember_session(server_hostname, ssl_sock)
+        return ssl_sock
+
+    def remember_session(self, server_hostname: Optional[str], ssl_sock: ssl.SSLSocket) -> None:
+        if not server_hostname or ssl_sock.server_side:
+            return
+        try:
+            session = ssl_sock.session
+        except (OSError, ValueError):
+            return
+        # Для TLS 1.3 билет приходит после рукопожатия, поэтому сессию обновляем и при закрытии.
+        if session is not None and (session.has_ticket or session.id):
+            self._sessions[server_hostname] = session
+
+
+def get_ssl_context(verify: Union[bool, str], cert: ClientCert = None) -> ssl.SSLContext:
+    """Возвращает общий SSL-контекст для пары (verify, клиентский сертификат)."""
+    cert_key = _normalize_cert(cert)
+    key: ContextKey = (verify, cert_key)
+    context = _CONTEXTS.get(key)
+    if context is not None:
+        return context
+    with _CONTEXTS_LOCK:
+        context = _CONTEXTS.get(key)
+        if context is None:
+            context = _build_ssl_context(verify, cert_key)
+            _CONTEXTS[key] = context
+    return context
+
+
+def clear_ssl_contexts() -> None:
+    with _CONTEXTS_LOCK:
+        _CONTEXTS.clear()
+
+
+def _normalize_cert(cert: ClientCert) -> Optional[Tuple[str, Optional[str]]]:
+    if not cert:
+        return None
+    if isinstance(cert, str):
+        return cert, None
+    cert_file, key_file = cert
+    return cert_file, key_file
+
+
+def _build_ssl_context(verify: Union[bool, str], cert: Optional[Tuple[str, Optional[str]]]) -> ssl.SSLContext:
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    if verify:
+        # Файл CA читаем один раз при создании контекста, а не на каждом соединении.
+        ca_location = verify if isinstance(verify, str) else extract_zipped_paths(DEFAULT_CA_BUNDLE_PATH)
+        if os.path.isdir(ca_location):
+            context.load_verify_locations(capath=ca_location)
+        else:
+            context.load_verify_locations(cafile=ca_location)
+        context.check_hostname = True
+        context.verify_mode = ssl.CERT_REQUIRED
+    else:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    if cert:
+        cert_file, key_file = cert
+        context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """Адаптер requests, выбирающий пул соединений по общему SSL-контексту."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._local = threading.local()
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TrackedHTTPConnectionPool,
+            "https": _TrackedHTTPSConnectionPool,
+        }
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Any = None,
+        verify: Union[bool, str] = True,
+        cert: ClientCert = None,
+        proxies: Any = None,
+    ) -> requests.Response:
+        self._local.ssl_context = self._context_for(request.url or "", verify, cert)
+        try:
+            return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        finally:
+            self._local.ssl_context = None
+
+    def get_connection(self, url: str, proxies: Any = None) -> Any:
+        # requests < 2.32 берёт соединение здесь.
+        context = getattr(self._local, "ssl_context", None)
+        if context is None or select_proxy(url, proxies):
+            self._local.pooled = False
+            return super().get_connection(url, proxies)
+        return self._pooled_connection(url, context)
+
+    def get_connection_with_tls_context(
+        self, request: requests.PreparedRequest, verify: Union[bool, str], proxies: Any = None, cert: ClientCert = None
+    ) -> Any:
+        # requests >= 2.32 вызывает из send этот метод вместо get_connection.
+        url = request.url or ""
+        context = getattr(self._local, "ssl_context", None)
+        if context is None or select_proxy(url, proxies):
+            self._local.pooled = False
+            return super().get_connection_with_tls_context(  # type: ignore[misc]
+                request, verify, proxies=proxies, cert=cert
+            )
+        return self._pooled_connection(url, context)
+
+    def _pooled_connection(self, url: str, context: ssl.SSLContext) -> Any:
+        self._local.pooled = True
+        parsed = urlparse(url)
+        return self.poolmanager.connection_from_url(parsed.geturl(), pool_kwargs={"ssl_context": context})
+
+    def cert_verify(self, conn: Any, url: str, verify: Union[bool, str], cert: ClientCert) -> None:
+        context = getattr(self._local, "ssl_context", None)
+        if context is None or not getattr(self._local, "pooled", False):
+            super().cert_verify(conn, url, verify, cert)
+            return
+        # CA и клиентский сертификат уже загружены в контекст — urllib3 не должен читать их заново.
+        conn.cert_reqs = "CERT_REQUIRED" if context.verify_mode == ssl.CERT_REQUIRED else "CERT_NONE"
+        conn.ca_certs = None
+        conn.ca_cert_dir = None
+        conn.cert_file = None
+        conn.key_file = None
+
+    def warm_connection(
+        self, url: str, verify: Union[bool, str] = True, cert: ClientCert = None, timeout: Optional[float] = None
+    ) -> bool:
+        """Открывает соединение к хосту заранее и оставляет его в пуле.
+
+        Возвращает True, если в пуле есть живое соединение (новое или уже открытое).
+        """
+        if select_proxy(url, get_environ_proxies(url)):
+            return False
+        self._local.ssl_context = self._context_for(url, verify, cert)
+        try:
+            pool = self.get_connection(url)
+            self.cert_verify(pool, url, verify, cert)
+        finally:
+            self._local.ssl_context = None
+
+        # _get_conn сам закрывает соединения, которые сервер успел оборвать по простою.
+        conn = pool._get_conn()
+        try:
+            if getattr(conn, "sock", None) is None:
+                if timeout is not None:
+                    conn.timeout = timeout
+                started = time.monotonic()
+                conn.connect()
+                _consume_session_tickets(conn, time.monotonic() - started)
+        except BaseException:
+            conn.close()
+            raise
+        finally:
+            pool._put_conn(conn)
+        return True
+
+    @staticmethod
+    def _context_for(url: str, verify: Union[bool, str], cert: ClientCert) -> Optional[ssl.SSLContext]:
+        if not url.lower().startswith("https"):
+            return None
+        return get_ssl_context(verify, cert)
+
+
+def _consume_session_tickets(conn: Any, budget: float) -> None:
+    """Дочитывает служебные TLS-сообщения, пришедшие после рукопожатия.
+
+    Сервер TLS 1.3 присылает билеты сессии уже после connect(); непрочитанными они делают сокет
+    «читаемым», и urllib3 принимает прогретое соединение за оборванное.
+    """
+    sock = getattr(conn, "sock", None)
+    if not isinstance(sock, ssl.SSLSocket):
+        return
+    readable, _, _ = select.select([sock], [], [], max(budget, 0.01))
+    if not readable:
+        return
+    previous_timeout = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        sock.recv(1)
+    except ssl.SSLWantReadError:
+        return
+    finally:
+        sock.settimeout(previous_timeout)
+    # Сервер закрыл соединение или прислал неожиданные данные — в пуле оно не нужно.
+    conn.close()
+
+
+# Фабрика адаптера для новых сессий; запись и воспроизведение кассет (monitoring.cassette) подменяют её.
+_ADAPTER_FACTORY: Callable[[], HTTPAdapter] = PooledHTTPAdapter
+
+
+def set_adapter_factory(factory: Optional[Callable[[], HTTPAdapter]]) -> None:
+    """Задаёт адаптер для сессий, создаваемых после вызова; None возвращает обычный `PooledHTTPAdapter`."""
+    global _ADAPTER_FACTORY
+    _ADAPTER_FACTORY = factory or PooledHTTPAdapter
+
+
+def build_session() -> requests.Session:
+    """Создаёт сессию requests с адаптером, использующим общие SSL-контексты."""
+    session = requests.Session()
+    adapter = _ADAPTER_FACTORY()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+__all__ = [
+    "PooledHTTPAdapter",
+    "ResumingSSLContext",
+    "abort_inflight",
+    "build_session",
+    "clear_ssl_contexts",
+    "get_ssl_context",
+    "set_adapter_factory",
+]
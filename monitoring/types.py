@@ -2,11 +2,67 @@
 from __future__ import annotations
 
 import json
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Mapping, Optional
+from typing import Any, Dict, FrozenSet, Iterator, List, Mapping, Optional, Tuple
 
-from .env import apply_env, build_env_map
+from .env import apply_env, build_env_map, referenced_names
+
+FileStamp = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class PayloadFile:
+    """Разобранный JSON-файл из поля json с отметкой версии файла."""
+
+    stamp: FileStamp
+    payload: Any
+    env_names: FrozenSet[str]
+
+
+_PAYLOAD_CACHE: Dict[Path, PayloadFile] = {}
+_PAYLOAD_CACHE_LOCK = threading.Lock()
+_PAYLOAD_READS = threading.local()
+
+
+def file_stamp(path: Path) -> FileStamp:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_payload_file(file_path: Path) -> Any:
+    """Читает JSON-файл один раз на версию файла, даже если на него ссылаются много маршрутов."""
+    file_path = file_path.resolve()
+    stamp = file_stamp(file_path)
+    cached = _PAYLOAD_CACHE.get(file_path)
+    if cached is None or cached.stamp != stamp:
+        content = file_path.read_text(encoding="utf-8")
+        try:
+            parsed = json.loads(content or "null")
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Invalid JSON content in {file_path}: {exc}") from exc
+        cached = PayloadFile(stamp=stamp, payload=parsed, env_names=frozenset(referenced_names(content)))
+        with _PAYLOAD_CACHE_LOCK:
+            _PAYLOAD_CACHE[file_path] = cached
+    reads = getattr(_PAYLOAD_READS, "reads", None)
+    if reads is not None:
+        reads[str(file_path)] = cached
+    # Разобранный JSON общий для всех маршрутов: вызывающий код не должен его изменять.
+    return cached.payload
+
+
+@contextmanager
+def track_payload_reads() -> Iterator[Dict[str, PayloadFile]]:
+    """Собирает JSON-файлы, прочитанные в текущем потоке внутри блока."""
+    previous = getattr(_PAYLOAD_READS, "reads", None)
+    reads: Dict[str, PayloadFile] = {}
+    _PAYLOAD_READS.reads = reads
+    try:
+        yield reads
+    finally:
+        _PAYLOAD_READS.reads = previous
 
 
 @dataclass
@@ -64,6 +120,8 @@ class HttpRouteConfig:
     allow_redirects: bool = True
     verify_ssl: bool = True
     ca_bundle: Optional[str] = None
+    client_cert: Optional[str] = None
+    client_key: Optional[str] = None
     description: Optional[str] = None
     enabled: bool = True
     body_max_chars: int = 2048
@@ -137,6 +195,8 @@ class HttpRouteConfig:
             allow_redirects=raw_local.get("allow_redirects", True),
             verify_ssl=raw_local.get("verify_ssl", True),
             ca_bundle=raw_local.get("ca_bundle") or raw_local.get("ca_cert") or raw_local.get("verify_path"),
+            client_cert=raw_local.get("client_cert"),
+            client_key=raw_local.get("client_key"),
             description=raw_local.get("description"),
             enabled=raw_local.get("enabled", True),
             body_max_chars=body_limit,
@@ -181,12 +241,8 @@ class HttpRouteConfig:
         for candidate in candidates:
             file_path = candidate.expanduser()
             if file_path.exists():
-                try:
-                    content = file_path.read_text(encoding="utf-8")
-                    parsed = json.loads(content or "null")
-                    return apply_env(parsed, env_map) if env_map else parsed
-                except json.JSONDecodeError as exc:
-                    raise ValueError(f"Invalid JSON content in {file_path}: {exc}") from exc
+                parsed = read_payload_file(file_path)
+                return apply_env(parsed, env_map) if env_map else parsed
 
         return payload
 
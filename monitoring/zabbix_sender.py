@@ -0,0 +1,405 @@
+"""Отправка результатов на сервер или прокси Zabbix по протоколу траппера (как `zabbix_sender`).
+
+Пакет протокола: `ZBXD\\x01`, длина данных (u64, little-endian) и JSON
+`{"request": "sender data", "data": [{"host", "key", "value", "clock", "ns"}, ...]}`; сервер отвечает пакетом
+того же вида с `{"response": "success", "info": "processed: N; failed: M; ..."}`.
+
+Каждое поле результата уходит отдельным значением с ключом `<префикс>[<маршрут>,<поле>]`, а список маршрутов —
+значением LLD с ключом `<префикс>.discovery`. На стороне Zabbix это элементы типа «Zabbix траппер».
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .persistence import result_timestamp
+from .rollups import INLINE_SOURCE
+from .sharding import route_id
+from .types import HttpRouteConfig
+
+DEFAULT_PORT = 10051
+DEFAULT_KEY_PREFIX = "sber.route"
+DEFAULT_FIELDS: Tuple[str, ...] = ("ok", "status_code", "response_time_ms", "error")
+# Поля с числовым значением; остальные отправляются как текст.
+NUMERIC_FIELDS = frozenset({"ok", "status_code", "response_time_ms", "body_bytes", "body_truncated"})
+DEFAULT_BATCH_SIZE = 250
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_QUEUE_SIZE = 100000
+DEFAULT_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+# Без каталога спула неотправленные значения держим в памяти, но не больше этого числа.
+DEFAULT_MEMORY_SPOOL_ITEMS = 100000
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = 60.0
+HEADER = b"ZBXD\x01"
+_LENGTH = struct.Struct("<Q")
+# Ответ сервера на пачку — несколько сотен байт; больше не читаем.
+MAX_RESPONSE_BYTES = 1 << 20
+
+Item = Dict[str, Any]
+
+logger = logging.getLogger(__name__)
+
+
+class TrapperError(Exception):
+    """Сервер недоступен или ответил не по протоколу; пачку нужно отправить позже."""
+
+
+def encode_packet(payload: Dict[str, Any]) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return HEADER + _LENGTH.pack(len(body)) + body
+
+
+def read_packet(sock: socket.socket) -> Dict[str, Any]:
+    header = _recv_exact(sock, len(HEADER) + _LENGTH.size)
+    if header[: len(HEADER)] != HEADER:
+        raise TrapperError(f"unexpected response header {header[:5]!r}")
+    length = _LENGTH.unpack_from(header, len(HEADER))[0]
+    if length > MAX_RESPONSE_BYTES:
+        raise TrapperError(f"response too large: {length} bytes")
+    try:
+        return json.loads(_recv_exact(sock, length).decode("utf-8"))
+    except ValueError as exc:
+        raise TrapperError(f"invalid response: {exc}") from exc
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise TrapperError("connection closed by server")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def item_key(prefix: str, *params: str) -> str:
+    """Ключ элемента Zabbix; параметры с `,`, `]`, `"` или пробелами берутся в кавычки."""
+    quoted = []
+    for param in params:
+        if any(char in param for char in ',]["') or param.strip() != param:
+            param = '"' + param.replace('"', '\\"') + '"'
+        quoted.append(param)
+    return f"{prefix}[{','.join(quoted)}]"
+
+
+def item_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return str(value)
+
+
+class _Spool:
+    """Неотправленные пачки: файлы в каталоге (переживают перезапуск) или очередь в памяти.
+
+    Объём ограничен: при переполнении удаляются самые старые пачки, потерянные значения считаются в `dropped`.
+    """
+
+    def __init__(self, directory: Optional[str], max_bytes: int, max_items: int) -> None:
+        self.directory = Path(directory).expanduser() if directory else None
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.dropped = 0
+        self._memory: Deque[List[Item]] = deque()
+        self._memory_items = 0
+        self._sequence = 0
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __bool__(self) -> bool:
+        if self.directory is None:
+            return bool(self._memory)
+        return any(self._files())
+
+    def push(self, batch: List[Item]) -> None:
+        if self.directory is None:
+            self._memory.append(batch)
+            self._memory_items += len(batch)
+            while self._memory_items > self.max_items and len(self._memory) > 1:
+                old = self._memory.popleft()
+                self._memory_items -= len(old)
+                self.dropped += len(old)
+            return
+        self._sequence += 1
+        name = f"{time.time_ns():020d}-{os.getpid()}-{self._sequence:06d}.json"
+        tmp_file = self.directory / f".{name}.tmp"
+        tmp_file.write_text(json.dumps(batch, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_file, self.directory / name)
+        self._trim()
+
+    def peek(self) -> Optional[Tuple[Any, List[Item]]]:
+        """Самая старая пачка и её метка для `remove`."""
+        if self.directory is None:
+            return (None, self._memory[0]) if self._memory else None
+        for path in self._files():
+            try:
+                return path, json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as exc:
+                logger.warning("Повреждённый файл спула %s удалён: %s", path, exc)
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+        return None
+
+    def remove(self, token: Any) -> None:
+        if self.directory is None:
+            old = self._memory.popleft()
+            self._memory_items -= len(old)
+            return
+        try:
+            token.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _files(self) -> List[Path]:
+        assert self.directory is not None
+        return sorted(path for path in self.directory.glob("*.json") if not path.name.startswith("."))
+
+    def _trim(self) -> None:
+        files = self._files()
+        sizes = [(path, path.stat().st_size) for path in files]
+        total = sum(size for _, size in sizes)
+        for path, size in sizes[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                self.dropped += len(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                pass
+            path.unlink()
+            total -= size
+
+
+class ZabbixSender:
+    """Копит значения результатов и отправляет их пачками на сервер Zabbix из фонового потока.
+
+    Пачка уходит, когда набралось `batch_size` значений или прошло `flush_interval` секунд с первого из них.
+    Если сервер недоступен, пачка откладывается в спул, а следующие попытки идут с экспоненциальной паузой
+    (от 1 до 60 секунд со случайным разбросом); пока пауза не истекла, новые пачки сразу уходят в спул.
+    После успешной отправки спул досылается от старых пачек к новым.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        port: int = DEFAULT_PORT,
+        host: Optional[str] = None,
+        key_prefix: str = DEFAULT_KEY_PREFIX,
+        fields: Sequence[str] = DEFAULT_FIELDS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        timeout: float = DEFAULT_TIMEOUT,
+        spool_dir: Optional[str] = None,
+        spool_max_bytes: int = DEFAULT_SPOOL_MAX_BYTES,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        self.server = server
+        self.port = port
+        self.host = host or socket.gethostname()
+        self.key_prefix = key_prefix
+        self.fields = tuple(fields)
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._spool = _Spool(spool_dir, spool_max_bytes, DEFAULT_MEMORY_SPOOL_ITEMS)
+        self._items: "queue.Queue[Item]" = queue.Queue(maxsize=queue_size)
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="zabbix-sender", daemon=True)
+        self._thread.start()
+
+    @property
+    def spool_dropped(self) -> int:
+        return self._spool.dropped
+
+    def append(self, route_config: HttpRouteConfig, payload: Dict[str, Any]) -> None:
+        timestamp = result_timestamp(payload)
+        clock = int(timestamp)
+        ns = int((timestamp - clock) * 1e9)
+        # Ключ по файлу и имени: маршруты с одним именем из разных файлов — разные элементы.
+        route = route_id(route_config)
+        for field in self.fields:
+            value = payload.get(field)
+            if value is None:
+                if field in NUMERIC_FIELDS:
+                    continue  # пустое значение числовой элемент не примет
+                # Текстовый элемент очищаем: иначе после восстановления в `error` осталась бы прошлая ошибка.
+                value = ""
+            self._put(
+                {
+                    "host": self.host,
+                    "key": item_key(self.key_prefix, route, field),
+                    "value": item_value(value),
+                    "clock": clock,
+                    "ns": ns,
+                }
+            )
+
+    def discover(self, routes: Iterable[HttpRouteConfig]) -> None:
+        """Отправляет LLD маршрутов (`<префикс>.discovery`) с тем же набором макросов, что и сокет запросов."""
+        data = [
+            {
+                "{#ROUTE}": route.name,
+                "{#ROUTE_ID}": route_id(route),
+                "{#URL}": route.url,
+                "{#SOURCE}": route.source_path or INLINE_SOURCE,
+                "{#TAGS}": ",".join(str(tag) for tag in route.tags),
+            }
+            for route in routes
+        ]
+        self._put(
+            {
+                "host": self.host,
+                "key": f"{self.key_prefix}.discovery",
+                "value": json.dumps({"data": data}, ensure_ascii=False, separators=(",", ":")),
+                "clock": int(time.time()),
+                "ns": 0,
+            }
+        )
+
+    def close(self, timeout: float = DEFAULT_TIMEOUT) -> None:
+        """Отправляет накопленное (последняя попытка без паузы); неотправленное остаётся в спуле."""
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.warning("Отправка в Zabbix не завершилась за %.1f с", timeout)
+        if self.dropped or self.spool_dropped:
+            logger.warning(
+                "Значения Zabbix отброшены: переполнение очереди %s, переполнение спула %s",
+                self.dropped,
+                self.spool_dropped,
+            )
+
+    def _put(self, item: Item) -> None:
+        try:
+            self._items.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._deliver(batch)
+            elif self._spool and time.monotonic() >= self._retry_at:
+                self._drain()
+        # При остановке пробуем отправить сразу, не дожидаясь конца паузы.
+        self._retry_at = 0.0
+        if self._spool:
+            self._drain()
+        while True:
+            batch = self._collect(wait=False)
+            if not batch:
+                break
+            self._deliver(batch)
+
+    def _collect(self, wait: bool = True) -> List[Item]:
+        batch: List[Item] = []
+        deadline: Optional[float] = None
+        while len(batch) < self.batch_size:
+            if wait and not self._stop.is_set():
+                timeout = self.flush_interval if deadline is None else deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._items.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            else:
+                try:
+                    item = self._items.get_nowait()
+                except queue.Empty:
+                    break
+            batch.append(item)
+        return batch
+
+    def _deliver(self, batch: List[Item]) -> None:
+        if time.monotonic() < self._retry_at:
+            self._spool.push(batch)
+            return
+        if self._spool and not self._drain():
+            self._spool.push(batch)
+            return
+        if not self._try_send(batch):
+            self._spool.push(batch)
+
+    def _drain(self) -> bool:
+        """Досылает спул; возвращает False, если сервер снова недоступен."""
+        while True:
+            oldest = self._spool.peek()
+            if oldest is None:
+                return True
+            token, batch = oldest
+            if not self._try_send(batch):
+                return False
+            self._spool.remove(token)
+
+    def _try_send(self, batch: List[Item]) -> bool:
+        try:
+            response = self.send(batch)
+        except (OSError, TrapperError) as exc:
+            self._backoff = min(max(self._backoff * 2, BACKOFF_INITIAL), BACKOFF_MAX)
+            self._retry_at = time.monotonic() + self._backoff * random.uniform(0.8, 1.2)
+            logger.warning(
+                "Zabbix %s:%s недоступен (%s), повтор через %.0f с", self.server, self.port, exc, self._backoff
+            )
+            return False
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        if response.get("response") != "success":
+            # Сервер отверг пакет целиком (например, неверный запрос) — повторная отправка не поможет.
+            self.failed += len(batch)
+            logger.error("Zabbix отклонил пакет из %s значений: %s", len(batch), response)
+            return True
+        failed = min(_failed_count(response.get("info")), len(batch))
+        self.sent += len(batch) - failed
+        if failed:
+            # Сервер принял пакет, но часть значений отверг (нет элемента или не тот тип) — повтор не поможет.
+            self.failed += failed
+            logger.debug("Zabbix отклонил значения: %s", response.get("info"))
+        return True
+
+    def send(self, items: List[Item]) -> Dict[str, Any]:
+        """Одно соединение — одна пачка; возвращает ответ сервера."""
+        now = time.time()
+        packet = encode_packet(
+            {"request": "sender data", "data": items, "clock": int(now), "ns": int((now % 1) * 1e9)}
+        )
+        with socket.create_connection((self.server, self.port), timeout=self.timeout) as sock:
+            sock.sendall(packet)
+            return read_packet(sock)
+
+
+def _failed_count(info: Any) -> int:
+    # info: "processed: 3; failed: 1; total: 4; seconds spent: 0.000055"
+    for part in str(info or "").split(";"):
+        name, _, value = part.partition(":")
+        if name.strip() == "failed":
+            try:
+                return int(value.strip())
+            except ValueError:
+                return 0
+    return 0
+
+
+__all__ = ["DEFAULT_PORT", "TrapperError", "ZabbixSender", "encode_packet", "item_key", "read_packet"]
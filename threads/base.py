@@ -3,28 +3,76 @@ from __future__ import annotations
 
 import logging
 import threading
-from typing import Optional
+import time
+from typing import Optional, Tuple
+
+from monitoring.selfstats import SELF_STATS
+
+DEFAULT_WARMUP_LEAD = 2.0
 
 
 class BaseMonitorThread(threading.Thread):
     """Простой поток, который запускает `run_once` по расписанию."""
 
-    def __init__(self, name: str, interval: float, stop_event: threading.Event, one_shot: bool = False) -> None:
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        stop_event: threading.Event,
+        one_shot: bool = False,
+        warmup: bool = False,
+        warmup_lead: float = DEFAULT_WARMUP_LEAD,
+        source: Optional[str] = None,
+    ) -> None:
         super().__init__(name=f"monitor-{name}", daemon=True)
         self.interval = max(interval, 1.0)
         self.stop_event = stop_event
         self.one_shot = one_shot
+        self.warmup = warmup
+        self.warmup_lead = max(warmup_lead, 0.0)
         self.logger = logging.getLogger(name)
+        # (файл, имя), как `route_key`: маршруты с одним именем из разных файлов считаются отдельно.
+        self.route_key: Tuple[str, str] = (source or "", name)
+        # Плановое время следующего прогона (monotonic): по нему считается задержка старта.
+        self._due: Optional[float] = None
 
     def run_once(self) -> None:
         raise NotImplementedError
 
+    def warm_up(self) -> None:
+        """Готовит соединения перед проверкой; по умолчанию ничего не делает."""
+
     def run(self) -> None:  # pragma: no cover - threading loop is simple
+        if self.warmup:
+            self._safe_warm_up()
         while not self.stop_event.is_set():
+            if self._due is not None and SELF_STATS.enabled:
+                SELF_STATS.observe("schedule_lag", max(time.monotonic() - self._due, 0.0) * 1000, self.route_key)
+            SELF_STATS.increment("runs")
             try:
                 self.run_once()
             except Exception:  # noqa: BLE001
+                SELF_STATS.increment("run_errors")
                 self.logger.exception("Необработанная ошибка в потоке мониторинга")
             if self.one_shot:
                 break
+            self._wait_next_run()
+
+    def _wait_next_run(self) -> None:
+        self._due = time.monotonic() + self.interval
+        lead = self.warmup_lead if self.warmup else 0.0
+        if not lead or self.interval <= lead * 2:
             self.stop_event.wait(self.interval)
+            return
+        # При длинном интервале сервер успевает закрыть keep-alive, поэтому прогреваем заранее.
+        if self.stop_event.wait(self.interval - lead):
+            return
+        started = time.monotonic()
+        self._safe_warm_up()
+        self.stop_event.wait(max(lead - (time.monotonic() - started), 0.0))
+
+    def _safe_warm_up(self) -> None:
+        try:
+            self.warm_up()
+        except Exception:  # noqa: BLE001
+            self.logger.debug("Не удалось прогреть соединения", exc_info=True)
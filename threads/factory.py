@@ -6,15 +6,21 @@ from typing import List, Sequence
 
 from monitoring.persistence import ResultWriter
 from monitoring.types import HttpRouteConfig
+from threads.base import DEFAULT_WARMUP_LEAD
 from threads.http_route import HttpRouteMonitor
 
 MonitorList = List[HttpRouteMonitor]
 
 
 def _http_builder(
-    cfg: HttpRouteConfig, writer: ResultWriter, stop_event: Event, one_shot: bool
+    cfg: HttpRouteConfig,
+    writer: ResultWriter,
+    stop_event: Event,
+    one_shot: bool,
+    warmup: bool,
+    warmup_lead: float,
 ) -> HttpRouteMonitor:
-    return HttpRouteMonitor(cfg, writer, stop_event, one_shot=one_shot)
+    return HttpRouteMonitor(cfg, writer, stop_event, one_shot=one_shot, warmup=warmup, warmup_lead=warmup_lead)
 
 
 BUILDERS = {
@@ -23,14 +29,19 @@ BUILDERS = {
 
 
 def build_monitors(
-    routes: Sequence[HttpRouteConfig], writer: ResultWriter, stop_event: Event, one_shot: bool = False
+    routes: Sequence[HttpRouteConfig],
+    writer: ResultWriter,
+    stop_event: Event,
+    one_shot: bool = False,
+    warmup: bool = False,
+    warmup_lead: float = DEFAULT_WARMUP_LEAD,
 ) -> MonitorList:
     monitors: MonitorList = []
     for cfg in routes:
         builder = BUILDERS.get(cfg.monitor_type)
         if not builder:
             raise ValueError(f"Неподдерживаемый тип монитора: {cfg.monitor_type}")
-        monitors.append(builder(cfg, writer, stop_event, one_shot))
+        monitors.append(builder(cfg, writer, stop_event, one_shot, warmup, warmup_lead))
     return monitors
 
 
@@ -6,17 +6,22 @@ from contextlib import ExitStack
 import time
 from datetime import datetime, timezone
 from pathlib import Path
-import tempfile
 from threading import Event
-from typing import Any, Dict, Mapping, Optional
-import zipfile
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Mapping, Optional
+from urllib.parse import urlsplit
 
 import requests
 from requests.auth import HTTPBasicAuth
 
 from monitoring.persistence import ResultWriter
+from monitoring.selfstats import SELF_STATS
+from monitoring.transport import PooledHTTPAdapter, build_session
 from monitoring.types import HttpRouteConfig
-from threads.base import BaseMonitorThread
+from threads.base import DEFAULT_WARMUP_LEAD, BaseMonitorThread
+
+if TYPE_CHECKING:
+    # zipfile и tempfile нужны только для загрузки файлов, поэтому импортируются по месту.
+    import zipfile
 
 TextResponse = Optional[str]
 _MISSING = object()
@@ -25,12 +30,27 @@ _TEMPLATE_RE = re.compile(r"\{\{\s*([^}]+?)\s*\}\}")
 
 class HttpRouteMonitor(BaseMonitorThread):
     def __init__(
-        self, config: HttpRouteConfig, writer: ResultWriter, stop_event: Event, one_shot: bool = False
+        self,
+        config: HttpRouteConfig,
+        writer: ResultWriter,
+        stop_event: Event,
+        one_shot: bool = False,
+        warmup: bool = False,
+        warmup_lead: float = DEFAULT_WARMUP_LEAD,
     ) -> None:
-        super().__init__(name=config.name, interval=config.interval, stop_event=stop_event, one_shot=one_shot)
+        super().__init__(
+            name=config.name,
+            interval=config.interval,
+            stop_event=stop_event,
+            one_shot=one_shot,
+            warmup=warmup,
+            warmup_lead=warmup_lead,
+            source=config.source_path,
+        )
         self.config = config
         self.writer = writer
-        self.session = requests.Session()
+        self.session = build_session()
+        self.last_result: Optional[Dict[str, Any]] = None
 
     def run(self) -> None:
         try:
@@ -40,8 +60,49 @@ class HttpRouteMonitor(BaseMonitorThread):
 
     def run_once(self) -> None:
         payload = self._execute_request_chain(self.config, None)
+        if self.stop_event.is_set():
+            # Проверку прервала остановка сервиса — такой результат не отражает состояние маршрута.
+            return
+        self.last_result = payload
         self.writer.write_result(self.config, payload)
 
+    def warm_up(self) -> None:
+        # Открываем по одному соединению на каждый хост цепочки; шаблонные URL пропускаем.
+        seen: set[tuple[str, Any, Any]] = set()
+        for config in self._iter_chain(self.config):
+            origin = self._static_origin(config.url)
+            if origin is None:
+                continue
+            verify = self._verify_option(config)
+            cert = self._client_cert(config)
+            key = (origin, verify, cert)
+            if key in seen:
+                continue
+            seen.add(key)
+            adapter = self.session.get_adapter(origin)
+            if not isinstance(adapter, PooledHTTPAdapter):
+                continue
+            try:
+                adapter.warm_connection(origin, verify=verify, cert=cert, timeout=config.timeout)
+            except (requests.RequestException, OSError, ValueError) as exc:
+                self.logger.debug("Прогрев соединения с %s не удался: %s", origin, exc)
+
+    @staticmethod
+    def _iter_chain(config: HttpRouteConfig) -> Iterator[HttpRouteConfig]:
+        yield config
+        for child in config.children:
+            if child.enabled:
+                yield from HttpRouteMonitor._iter_chain(child)
+
+    @staticmethod
+    def _static_origin(url: str) -> Optional[str]:
+        if "{{" in url or url.strip().startswith("$"):
+            return None
+        parsed = urlsplit(url)
+        if parsed.scheme not in {"http", "https"} or not parsed.netloc:
+            return None
+        return f"{parsed.scheme}://{parsed.netloc}/"
+
     def _execute_request_chain(self, config: HttpRouteConfig, context: Optional[Any]) -> Dict[str, Any]:
         # Собираем всю цепочку и оставляем в результате только один «ключевой» запрос.
         results, total_time = self._collect_chain_results(config, context)
@@ -50,6 +111,7 @@ class HttpRouteMonitor(BaseMonitorThread):
             return {}
         payload = dict(selected)
         payload["response_time_ms"] = round(total_time, 2)
+        payload["chain_steps"] = len(results)
         return payload
 
     def _collect_chain_results(
@@ -66,6 +128,8 @@ class HttpRouteMonitor(BaseMonitorThread):
                 self.logger.debug("Дочерние запросы для %s пропущены: отсутствует ответ.", config.name)
             else:
                 for child in config.children:
+                    if self.stop_event.is_set():
+                        break
                     if not child.enabled:
                         continue
                     child_results, child_time = self._collect_chain_results(
@@ -107,7 +171,7 @@ class HttpRouteMonitor(BaseMonitorThread):
             last_json = response_json
             total_time += float(result.get("response_time_ms") or 0)
 
-            if not wait_for:
+            if not wait_for or self.stop_event.is_set():
                 break
 
             if has_response and response_json is not None:
@@ -143,6 +207,7 @@ class HttpRouteMonitor(BaseMonitorThread):
         response: Optional[requests.Response] = None
         response_json: Optional[Any] = None
         url: Any = config.url
+        prepared: Optional[float] = None
 
         try:
             with ExitStack() as stack:
@@ -180,6 +245,7 @@ class HttpRouteMonitor(BaseMonitorThread):
                     # Не даём пользователю фиксировать Content-Type, чтобы requests проставил boundary для multipart
                     headers = self._drop_content_type(headers)
 
+                prepared = time.perf_counter()
                 response = self.session.request(
                     method=config.method,
                     url=url,
@@ -192,11 +258,18 @@ class HttpRouteMonitor(BaseMonitorThread):
                     timeout=config.timeout,
                     allow_redirects=config.allow_redirects,
                     verify=self._verify_option(config),
+                    cert=self._client_cert(config),
                 )
         except (requests.RequestException, OSError, ValueError) as exc:
             error_payload = str(exc)
         finally:
-            duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            finished = time.perf_counter()
+            duration_ms = round((finished - start) * 1000, 2)
+            if SELF_STATS.enabled:
+                ready = prepared if prepared is not None else finished
+                SELF_STATS.observe("prepare", (ready - start) * 1000, route=self.route_key)
+                if prepared is not None:
+                    SELF_STATS.observe("request", (finished - prepared) * 1000, route=self.route_key)
 
         result: Dict[str, Any] = {
             "name": config.name,
@@ -217,6 +290,7 @@ class HttpRouteMonitor(BaseMonitorThread):
                     "ok": response.ok,
                     "body_excerpt": body,
                     "body_truncated": truncated,
+                    "body_bytes": len(response.content),
                     "error": None,
                 }
             )
@@ -228,6 +302,7 @@ class HttpRouteMonitor(BaseMonitorThread):
                     "ok": False,
                     "body_excerpt": None,
                     "body_truncated": False,
+                    "body_bytes": None,
                     "error": error_payload,
                 }
             )
@@ -256,10 +331,14 @@ class HttpRouteMonitor(BaseMonitorThread):
             should_zip = True
 
         if should_zip:
+            import tempfile
+
             tmp_dir = stack.enter_context(tempfile.TemporaryDirectory())
             base_name = path.name if path.is_dir() else path.stem
             archive_path = Path(tmp_dir) / f"{base_name}.zip"
+            zip_started = time.perf_counter()
             self._build_zip(path, archive_path, target_encoding=config.encoding_file)
+            SELF_STATS.observe("zip_build", (time.perf_counter() - zip_started) * 1000, route=self.route_key)
             file_path = archive_path
             filename = archive_path.name
             content_type = "application/zip"
@@ -369,6 +448,8 @@ class HttpRouteMonitor(BaseMonitorThread):
 
     @staticmethod
     def _build_zip(source: Path, target: Path, target_encoding: Optional[str]) -> None:
+        import zipfile
+
         with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
             if source.is_file():
                 arcname = source.name
@@ -815,3 +896,12 @@ class HttpRouteMonitor(BaseMonitorThread):
             )
             return config.verify_ssl
         return str(ca_path)
+
+    @staticmethod
+    def _client_cert(config: HttpRouteConfig) -> Optional[Any]:
+        if not config.client_cert:
+            return None
+        cert_path = str(Path(config.client_cert).expanduser())
+        if config.client_key:
+            return cert_path, str(Path(config.client_key).expanduser())
+        return cert_path
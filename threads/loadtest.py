@@ -0,0 +1,302 @@
+"""Нагрузочный прогон маршрутов из конфигурации: заданная частота запросов или заданный параллелизм.
+
+С `rate` работает открытая модель: планировщик назначает каждому запуску время по расписанию (равномерно или
+пуассоновским потоком) независимо от того, успевают ли ответы, а задержка считается от назначенного времени,
+а не от фактического старта. Поэтому медленные ответы и нехватка потоков видны в перцентилях, а не прячутся
+в паузах между запросами (coordinated omission). Без `rate` работает закрытая модель: `concurrency` потоков
+запускают маршруты друг за другом без пауз.
+
+Запуск — это вся цепочка маршрута с дочерними запросами, `wait_for` и подстановками, как у обычной проверки.
+Задержка и ошибки считаются по маршрутам и отдельно по каждому шагу цепочки.
+"""
+from __future__ import annotations
+
+import itertools
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from monitoring.selfstats import Histogram
+from monitoring.sharding import route_key
+from monitoring.stats import DEFAULT_PERCENTILES
+
+if TYPE_CHECKING:
+    from monitoring.types import HttpRouteConfig
+
+ARRIVALS = ("uniform", "poisson")
+DEFAULT_OPEN_WORKERS = 100
+DEFAULT_CLOSED_CONCURRENCY = 10
+
+
+@dataclass
+class _Series:
+    """Замеры одного маршрута или шага: задержка, время выполнения и исходы."""
+
+    latency: Histogram = field(default_factory=Histogram)
+    service: Histogram = field(default_factory=Histogram)
+    ok: int = 0
+    failed: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, latency_ms: float, service_ms: float, result: Dict[str, Any]) -> None:
+        self.latency.add(latency_ms)
+        self.service.add(service_ms)
+        if result.get("ok"):
+            self.ok += 1
+        else:
+            self.failed += 1
+        status = str(result.get("status_code") or "error")
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+@dataclass
+class LoadTestReport:
+    """Итог нагрузочного прогона."""
+
+    mode: str
+    workers: int
+    target_rate: Optional[float] = None
+    duration: float = 0.0
+    completed: int = 0
+    failed: int = 0
+    requests: int = 0
+    not_started: int = 0
+    max_backlog: int = 0
+    interrupted: bool = False
+    routes: List[Dict[str, Any]] = field(default_factory=list)
+    steps: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.duration if self.duration > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "target_rate": self.target_rate,
+            "duration_s": round(self.duration, 2),
+            "completed": self.completed,
+            "failed": self.failed,
+            "throughput_per_s": round(self.throughput, 2),
+            "http_requests_per_s": round(self.requests / self.duration, 2) if self.duration > 0 else 0.0,
+            "not_started": self.not_started,
+            "max_backlog": self.max_backlog,
+            "interrupted": self.interrupted,
+            "routes": self.routes,
+            "steps": self.steps,
+        }
+
+    def format(self) -> str:
+        data = self.to_dict()
+        target = f" of {self.target_rate:g}/s target" if self.target_rate else ""
+        lines = [
+            f"Load test ({self.mode} model, {self.workers} workers): {self.completed} runs in "
+            f"{self.duration:.1f}s, {data['throughput_per_s']}/s{target}, "
+            f"{data['http_requests_per_s']} HTTP requests/s, failed={self.failed}"
+            + (" (interrupted)" if self.interrupted else "")
+        ]
+        if self.mode == "open":
+            lines.append(f"Backlog: max {self.max_backlog} waiting runs, not started {self.not_started}")
+        lines.extend(["", "Routes (latency from scheduled start):", _format_table(self.routes)])
+        lines.extend(["", "Chain steps:", _format_table(self.steps)])
+        return "\n".join(lines)
+
+
+class _Recorder:
+    def __init__(self, measure_from: float, percentiles: Sequence[float]) -> None:
+        self.measure_from = measure_from
+        self.percentiles = tuple(percentiles)
+        self._lock = threading.Lock()
+        # Ключи — `route_key` маршрута и он же с именем шага: одноимённые маршруты из разных файлов не смешиваются.
+        self._routes: Dict[Tuple[str, str], _Series] = {}
+        self._steps: Dict[Tuple[str, str, str], _Series] = {}
+        self.requests = 0
+
+    def record(
+        self, route: HttpRouteConfig, scheduled: float, started: float, finished: float, results: List[Dict[str, Any]]
+    ) -> None:
+        if scheduled < self.measure_from or not results:
+            return  # разогрев
+        selected = next((result for result in results if not result.get("ok", False)), results[-1])
+        source, name = route_key(route)
+        with self._lock:
+            series = self._routes.get((source, name))
+            if series is None:
+                series = self._routes[(source, name)] = _Series()
+            series.add((finished - scheduled) * 1000, (finished - started) * 1000, selected)
+            for result in results:
+                key = (source, name, str(result.get("name")))
+                step = self._steps.get(key)
+                if step is None:
+                    step = self._steps[key] = _Series()
+                elapsed = float(result.get("response_time_ms") or 0.0)
+                step.add(elapsed, elapsed, result)
+                self.requests += 1
+
+    def fill(self, report: LoadTestReport) -> None:
+        with self._lock:
+            sources: Dict[str, Set[str]] = {}
+            for source, name in self._routes:
+                sources.setdefault(name, set()).add(source)
+
+            def label(source: str, name: str) -> str:
+                # Файл показывается, только если одно имя встречается в нескольких файлах.
+                return f"{source}:{name}" if len(sources.get(name, ())) > 1 else name
+
+            for (source, name), series in self._routes.items():
+                report.completed += series.ok + series.failed
+                report.failed += series.failed
+                row = self._row(series, report.duration, include_service=True)
+                report.routes.append({"route": label(source, name), **row})
+            for (source, name, step), series in self._steps.items():
+                report.steps.append({"route": label(source, name), "step": step, **self._row(series, report.duration)})
+            report.requests = self.requests
+
+    def _row(self, series: _Series, duration: float, include_service: bool = False) -> Dict[str, Any]:
+        latency = series.latency.snapshot(self.percentiles)
+        row: Dict[str, Any] = {
+            "count": series.ok + series.failed,
+            "failed": series.failed,
+            "per_s": round((series.ok + series.failed) / duration, 2) if duration > 0 else None,
+        }
+        row.update({key: value for key, value in latency.items() if key not in ("count", "total_ms")})
+        if include_service:
+            row["service_p99_ms"] = series.service.snapshot((99.0,)).get("p99_ms")
+        row["statuses"] = ",".join(f"{code}:{count}" for code, count in sorted(series.statuses.items()))
+        return row
+
+
+def run_load_test(
+    routes: Sequence[HttpRouteConfig],
+    duration: float,
+    rate: Optional[float] = None,
+    concurrency: Optional[int] = None,
+    arrivals: str = "uniform",
+    warmup: float = 0.0,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    stop_event: Optional[threading.Event] = None,
+    shutdown_grace: float = 10.0,
+    seed: Optional[int] = None,
+) -> LoadTestReport:
+    """Запускает маршруты `duration` секунд (плюс `warmup`, который в отчёт не входит) и собирает отчёт.
+
+    Маршруты запускаются по кругу. После окончания времени уже назначенные запуски ещё `shutdown_grace` секунд
+    дорабатывают; то, что не успело начаться, попадает в `not_started`, недоработавшее обрывается.
+    """
+    from monitoring.transport import abort_inflight
+    from threads.http_route import HttpRouteMonitor
+
+    if not routes:
+        raise ValueError("No routes to load")
+    if rate is not None and rate <= 0:
+        raise ValueError("rate must be positive")
+    if arrivals not in ARRIVALS:
+        raise ValueError(f"arrivals must be one of {', '.join(ARRIVALS)}")
+    open_model = rate is not None
+    workers = max(concurrency or (DEFAULT_OPEN_WORKERS if open_model else DEFAULT_CLOSED_CONCURRENCY), 1)
+    stop_event = stop_event or threading.Event()
+    started_at = time.monotonic()
+    measure_from = started_at + max(warmup, 0.0)
+    ends_at = measure_from + duration
+    recorder = _Recorder(measure_from, percentiles)
+    report = LoadTestReport(mode="open" if open_model else "closed", workers=workers, target_rate=rate)
+    # Монитор нужен ради логики цепочки и своей сессии (пула соединений) на поток; результаты
+    # нагрузочного прогона не записываются, поэтому writer не нужен.
+    monitors = [HttpRouteMonitor(routes[0], None, stop_event) for _ in range(workers)]  # type: ignore[arg-type]
+    cursor = itertools.count()
+    pending: "queue.Queue[Optional[Tuple[float, HttpRouteConfig]]]" = queue.Queue()
+
+    def run_chain(monitor: HttpRouteMonitor, route: HttpRouteConfig, scheduled: float) -> None:
+        started = time.monotonic()
+        try:
+            results, _ = monitor._collect_chain_results(route, None)
+        except Exception:  # noqa: BLE001
+            monitor.logger.exception("Необработанная ошибка в нагрузочном прогоне %s", route.name)
+            results = [{"name": route.name, "ok": False, "error": "unhandled exception"}]
+        if not stop_event.is_set():
+            # Прерванные остановкой цепочки не отражают поведение сервиса и в отчёт не идут.
+            recorder.record(route, scheduled, started, time.monotonic(), results)
+
+    def open_worker(monitor: HttpRouteMonitor) -> None:
+        while not stop_event.is_set():
+            item = pending.get()
+            if item is None:
+                return
+            scheduled, route = item
+            run_chain(monitor, route, scheduled)
+
+    def closed_worker(monitor: HttpRouteMonitor) -> None:
+        while not stop_event.is_set() and time.monotonic() < ends_at:
+            route = routes[next(cursor) % len(routes)]
+            run_chain(monitor, route, time.monotonic())
+
+    def schedule() -> None:
+        rng = random.Random(seed)
+        assert rate is not None
+        scheduled = started_at
+        while scheduled < ends_at:
+            delay = scheduled - time.monotonic()
+            if delay > 0 and stop_event.wait(delay):
+                return
+            # Отстав, планировщик догоняет расписание пачкой: назначенное время у запусков сохраняется.
+            pending.put((scheduled, routes[next(cursor) % len(routes)]))
+            report.max_backlog = max(report.max_backlog, pending.qsize())
+            scheduled += rng.expovariate(rate) if arrivals == "poisson" else 1.0 / rate
+
+    target = open_worker if open_model else closed_worker
+    threads = [
+        threading.Thread(target=target, args=(monitor,), name=f"loadtest-{index}", daemon=True)
+        for index, monitor in enumerate(monitors)
+    ]
+    for thread in threads:
+        thread.start()
+    if open_model:
+        scheduler = threading.Thread(target=schedule, name="loadtest-scheduler", daemon=True)
+        scheduler.start()
+        while scheduler.is_alive() and not stop_event.wait(0.2):
+            pass
+        for _ in threads:
+            pending.put(None)
+    else:
+        while time.monotonic() < ends_at and not stop_event.wait(min(0.2, max(ends_at - time.monotonic(), 0))):
+            pass
+    report.interrupted = stop_event.is_set()
+    report.duration = max(min(time.monotonic(), ends_at) - measure_from, 0.0)
+
+    join_deadline = time.monotonic() + (0.0 if report.interrupted else shutdown_grace)
+    for thread in threads:
+        thread.join(timeout=max(join_deadline - time.monotonic(), 0.0))
+    if any(thread.is_alive() for thread in threads):
+        stop_event.set()
+        abort_inflight()
+        for thread in threads:
+            thread.join(timeout=1.0)
+    while True:
+        try:
+            item = pending.get_nowait()
+        except queue.Empty:
+            break
+        if item is not None and item[0] >= measure_from:
+            report.not_started += 1
+    for monitor in monitors:
+        monitor.session.close()
+    recorder.fill(report)
+    return report
+
+
+def _format_table(rows: List[Dict[str, Any]]) -> str:
+    if not rows:
+        return "No completed runs"
+    columns = list(rows[0])
+    cells = [["-" if row.get(column) is None else str(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(line[index]) for line in cells)) for index, column in enumerate(columns)]
+    lines = ["  ".join(column.ljust(width) for column, width in zip(columns, widths))]
+    lines.extend("  ".join(cell.ljust(width) for cell, width in zip(line, widths)) for line in cells)
+    return "\n".join(lines)
+
+
+__all__ = ["ARRIVALS", "LoadTestReport", "run_load_test"]
@@ -0,0 +1,145 @@
+"""Разовый прогон маршрутов с ограничением параллелизма и общим дедлайном."""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from monitoring.persistence import ResultWriter
+    from monitoring.types import HttpRouteConfig
+
+DEFAULT_CONCURRENCY = 16
+# Как часто ожидание завершения проверяет внешнюю остановку.
+_POLL_INTERVAL = 0.2
+
+
+@dataclass
+class OneShotSummary:
+    """Итог разового прогона."""
+
+    total: int
+    ok: int = 0
+    failed: int = 0
+    unfinished: int = 0
+    wall_time: float = 0.0
+    deadline_exceeded: bool = False
+    interrupted: bool = False
+    slowest: List[Tuple[str, float]] = field(default_factory=list)
+
+    def format(self) -> str:
+        lines = [
+            f"One-shot: {self.total} routes, ok={self.ok} failed={self.failed} unfinished={self.unfinished}, "
+            f"wall time {self.wall_time:.2f}s" + self._suffix()
+        ]
+        if self.slowest:
+            slowest = ", ".join(f"{name} {elapsed:.0f} ms" for name, elapsed in self.slowest)
+            lines.append(f"Slowest: {slowest}")
+        return "\n".join(lines)
+
+    def _suffix(self) -> str:
+        if self.interrupted:
+            return " (interrupted)"
+        if self.deadline_exceeded:
+            return " (deadline exceeded)"
+        return ""
+
+
+def run_one_shot(
+    routes: Sequence[HttpRouteConfig],
+    writer: ResultWriter,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    deadline: Optional[float] = None,
+    slowest: int = 5,
+    stop_event: Optional[threading.Event] = None,
+    shutdown_grace: float = 5.0,
+    **monitor_options: Any,
+) -> OneShotSummary:
+    """Выполняет каждый маршрут один раз не более чем в `concurrency` потоков.
+
+    Возвращает управление, как только записан последний результат, истёк `deadline` (секунды)
+    или снаружи установлен `stop_event`. Незавершённые проверки прерываются, их запросы обрываются,
+    а результаты не записываются; на это отводится не более `shutdown_grace` секунд.
+    """
+    # HTTP-стек (requests, urllib3) импортируем только здесь: main.py не платит за него при --help и проверке конфига.
+    from monitoring.transport import abort_inflight
+    from threads.factory import build_monitors
+
+    started = time.perf_counter()
+    stop_event = stop_event or threading.Event()
+    monitor_options["one_shot"] = True
+    monitors = build_monitors(routes, writer, stop_event, **monitor_options)
+    pending: "queue.Queue[Any]" = queue.Queue()
+    for monitor in monitors:
+        pending.put(monitor)
+
+    lock = threading.Lock()
+    finished: List[Any] = []
+    all_done = threading.Event()
+    if not monitors:
+        all_done.set()
+
+    def worker() -> None:
+        while not stop_event.is_set():
+            try:
+                monitor = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if monitor.warmup:
+                    monitor.warm_up()
+                monitor.run_once()
+            except Exception:  # noqa: BLE001
+                monitor.logger.exception("Необработанная ошибка в разовой проверке")
+            finally:
+                monitor.session.close()
+            with lock:
+                finished.append(monitor)
+                if len(finished) == len(monitors):
+                    all_done.set()
+
+    # Потоки-демоны: зависший запрос не задерживает выход процесса после дедлайна.
+    threads = [
+        threading.Thread(target=worker, name=f"oneshot-{index}", daemon=True)
+        for index in range(max(min(concurrency, len(monitors)), 1))
+    ]
+    for thread in threads:
+        thread.start()
+    expires_at = None if deadline is None else time.monotonic() + deadline
+    while not all_done.is_set() and not stop_event.is_set():
+        remaining = _POLL_INTERVAL if expires_at is None else min(expires_at - time.monotonic(), _POLL_INTERVAL)
+        if remaining <= 0:
+            break
+        all_done.wait(timeout=remaining)
+    completed = all_done.is_set()
+    interrupted = not completed and stop_event.is_set()
+    if not completed:
+        stop_event.set()
+        abort_inflight()
+        join_deadline = time.monotonic() + shutdown_grace
+        for thread in threads:
+            thread.join(timeout=max(join_deadline - time.monotonic(), 0.0))
+
+    with lock:
+        # Прерванные остановкой проверки тоже попадают в finished, но результата не записали.
+        done = [monitor for monitor in finished if completed or monitor.last_result is not None]
+    summary = OneShotSummary(
+        total=len(monitors), deadline_exceeded=not completed and not interrupted, interrupted=interrupted
+    )
+    timings: List[Tuple[str, float]] = []
+    for monitor in done:
+        result = monitor.last_result or {}
+        if result.get("ok"):
+            summary.ok += 1
+        else:
+            summary.failed += 1
+        timings.append((monitor.config.name, float(result.get("response_time_ms") or 0.0)))
+    summary.unfinished = summary.total - len(done)
+    summary.slowest = sorted(timings, key=lambda item: item[1], reverse=True)[:slowest]
+    summary.wall_time = time.perf_counter() - started
+    return summary
+
+
+__all__ = ["DEFAULT_CONCURRENCY", "OneShotSummary", "run_one_shot"]
@@ -0,0 +1,102 @@
+"""Управление набором запущенных мониторов: запуск, остановка и замена по маршрутам."""
+from __future__ import annotations
+
+import logging
+import time
+from threading import Event
+from typing import Any, Dict, List, Sequence, Tuple
+
+from monitoring.persistence import ResultWriter
+from monitoring.sharding import route_key
+from monitoring.transport import abort_inflight
+from monitoring.types import HttpRouteConfig
+from threads.factory import MonitorList, build_monitors
+
+RouteKey = Tuple[str, str]
+
+
+class MonitorSupervisor:
+    """Держит по одному монитору на маршрут; у каждого монитора свой stop_event."""
+
+    def __init__(self, writer: ResultWriter, **monitor_options: Any) -> None:
+        self.writer = writer
+        self.monitor_options = monitor_options
+        self._monitors: Dict[RouteKey, Any] = {}
+        self._events: Dict[RouteKey, Event] = {}
+        self.logger = logging.getLogger("supervisor")
+
+    @property
+    def monitors(self) -> MonitorList:
+        return list(self._monitors.values())
+
+    def is_alive(self) -> bool:
+        return any(monitor.is_alive() for monitor in self._monitors.values())
+
+    def sync(self, routes: Sequence[HttpRouteConfig]) -> Tuple[int, int, int]:
+        """Приводит набор мониторов к `routes`: запускает новые, останавливает лишние, заменяет изменённые.
+
+        Возвращает число запущенных, остановленных и заменённых мониторов.
+        """
+        desired = {route_key(route): route for route in routes}
+        removed = [key for key in self._monitors if key not in desired]
+        changed = [
+            key for key, route in desired.items() if key in self._monitors and self._monitors[key].config != route
+        ]
+        added = [key for key in desired if key not in self._monitors]
+
+        # Сначала строим новые мониторы, чтобы ошибка конфигурации не оставила набор наполовину остановленным.
+        built = self._build([desired[key] for key in changed + added])
+        self._stop_keys(removed + changed)
+        for key, (event, monitor) in built.items():
+            self._monitors[key] = monitor
+            self._events[key] = event
+            monitor.start()
+            self.logger.info(
+                "Started monitor %s %s %s interval=%ss",
+                monitor.config.name,
+                monitor.config.method,
+                monitor.config.url,
+                monitor.config.interval,
+            )
+        return len(added), len(removed), len(changed)
+
+    def supervise(self) -> None:
+        """Потоки сами перехватывают ошибки `run_once`, поэтому перезапуск не требуется."""
+
+    def stop_all(self, timeout: float = 5.0) -> None:
+        """Останавливает все мониторы не дольше `timeout` секунд, обрывая выполняющиеся запросы."""
+        self._stop_keys(list(self._monitors), timeout=timeout, abort=True)
+
+    def _build(self, routes: List[HttpRouteConfig]) -> Dict[RouteKey, Tuple[Event, Any]]:
+        built: Dict[RouteKey, Tuple[Event, Any]] = {}
+        for route in routes:
+            event = Event()
+            monitor = build_monitors([route], self.writer, event, **self.monitor_options)[0]
+            built[route_key(route)] = (event, monitor)
+        return built
+
+    def _stop_keys(self, keys: List[RouteKey], timeout: float = 5.0, abort: bool = False) -> None:
+        if not keys:
+            return
+        for key in keys:
+            self._events[key].set()
+        if abort:
+            aborted = abort_inflight()
+            if aborted:
+                self.logger.debug("Aborted %s open connections", aborted)
+        deadline = time.monotonic() + timeout
+        stuck: List[str] = []
+        for key in keys:
+            monitor = self._monitors.pop(key)
+            self._events.pop(key)
+            monitor.join(timeout=max(deadline - time.monotonic(), 0.0))
+            if monitor.is_alive():
+                stuck.append(monitor.config.name)
+            else:
+                self.logger.debug("Stopped monitor %s", monitor.config.name)
+        if stuck:
+            # Потоки-демоны не держат процесс, поэтому просто отказываемся их ждать.
+            self.logger.warning("Monitors did not stop within %.1fs: %s", timeout, ", ".join(stuck))
+
+
+__all__ = ["MonitorSupervisor"]
@@ -0,0 +1,234 @@
+"""Запуск мониторов в нескольких процессах с общим писателем результатов."""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import init
+from monitoring.persistence import ResultWriter
+from monitoring.sharding import route_key, shard_routes
+from monitoring.types import HttpRouteConfig
+
+RESTART_DELAY_MIN = 1.0
+RESTART_DELAY_MAX = 30.0
+# Сколько воркер ждёт свои мониторы после остановки; родитель всё равно завершит его по своему сроку.
+WORKER_STOP_TIMEOUT = 5.0
+
+_CONTEXT = multiprocessing.get_context("spawn")
+
+
+class QueueResultWriter:
+    """Писатель воркера: передаёт результаты в очередь родительского процесса."""
+
+    def __init__(self, results_queue: Any) -> None:
+        self._queue = results_queue
+
+    def write_result(self, route_config: HttpRouteConfig, payload: Dict[str, Any]) -> None:
+        self._queue.put((route_key(route_config), payload))
+
+
+def _worker_main(
+    index: int,
+    routes: List[HttpRouteConfig],
+    results_queue: Any,
+    log_queue: Any,
+    stop_event: Any,
+    log_level: str,
+    monitor_options: Mapping[str, Any],
+) -> None:
+    # Ctrl+C обрабатывает родитель; SIGTERM (systemd шлёт его всей группе) останавливает воркер сам.
+    terminated = threading.Event()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: terminated.set())
+    from monitoring.transport import abort_inflight
+    from threads.factory import build_monitors
+
+    # Записи уходят родителю: файлы логов (и их ротацию) ведёт один процесс.
+    init.init_logging(log_level, log_queue=log_queue)
+    logger = logging.getLogger(f"worker-{index}")
+    local_stop = threading.Event()
+    monitors = build_monitors(routes, QueueResultWriter(results_queue), local_stop, **monitor_options)
+    for monitor in monitors:
+        monitor.start()
+    logger.info("Воркер %s запустил мониторов: %s", index, len(monitors))
+
+    one_shot = bool(monitor_options.get("one_shot"))
+    while not stop_event.wait(0.5):
+        if terminated.is_set() or (one_shot and not any(m.is_alive() for m in monitors)):
+            break
+    local_stop.set()
+    abort_inflight()
+    deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+    for monitor in monitors:
+        monitor.join(timeout=max(deadline - time.monotonic(), 0.0))
+
+
+class WorkerPool:
+    """Родительская сторона: шарды в процессах, единый ResultWriter и перезапуск упавших воркеров."""
+
+    def __init__(
+        self,
+        writer: ResultWriter,
+        workers: int,
+        shard_by: str = "name",
+        log_level: str = "INFO",
+        **monitor_options: Any,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("Число воркеров должно быть положительным")
+        self.writer = writer
+        self.workers = workers
+        self.shard_by = shard_by
+        self.log_level = log_level
+        self.monitor_options = monitor_options
+        self.one_shot = bool(monitor_options.get("one_shot"))
+        self.shards: List[List[HttpRouteConfig]] = [[] for _ in range(workers)]
+        self._routes: Dict[Tuple[str, str], HttpRouteConfig] = {}
+        self._queue = _CONTEXT.Queue()
+        self._log_queue = _CONTEXT.Queue(maxsize=init.DEFAULT_LOG_QUEUE_SIZE)
+        self._stopping = False
+        self._processes: Dict[int, Any] = {}
+        self._stop_events: Dict[int, Any] = {}
+        self._restart_delay: Dict[int, float] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._started_at: Dict[int, float] = {}
+        self._drain_stop = threading.Event()
+        self._drain_thread = threading.Thread(target=self._drain, name="worker-results", daemon=True)
+        self._logs_thread = threading.Thread(target=self._forward_logs, name="worker-logs", daemon=True)
+        self.logger = logging.getLogger("workers")
+
+    def sync(self, routes: Sequence[HttpRouteConfig]) -> Tuple[int, int, int]:
+        """Раскладывает маршруты по шардам и перезапускает только воркеры, чей шард изменился.
+
+        Возвращает число запущенных, остановленных и перезапущенных воркеров.
+        """
+        shards = shard_routes(routes, self.workers, by=self.shard_by)
+        started = stopped = restarted = 0
+        changed = [index for index, shard in enumerate(shards) if shard != self.shards[index]]
+        for index in changed:
+            was_running = index in self._processes
+            if was_running:
+                self._stop_worker(index)
+            self.shards[index] = shards[index]
+            if shards[index]:
+                self._spawn(index)
+                if was_running:
+                    restarted += 1
+                else:
+                    started += 1
+            elif was_running:
+                stopped += 1
+        self._routes = {route_key(route): route for route in routes}
+        if not self._drain_thread.is_alive():
+            self._drain_thread.start()
+            self._logs_thread.start()
+        return started, stopped, restarted
+
+    def is_alive(self) -> bool:
+        return any(process.is_alive() for process in self._processes.values())
+
+    def supervise(self) -> None:
+        """Перезапускает упавшие воркеры с нарастающей задержкой."""
+        if self._stopping:
+            return
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                # Воркер проработал достаточно долго — сбрасываем накопленную задержку перезапуска.
+                if now - self._started_at.get(index, now) > RESTART_DELAY_MAX:
+                    self._restart_delay.pop(index, None)
+                continue
+            if self.one_shot:
+                continue
+            restart_at = self._restart_at.get(index)
+            if restart_at is None:
+                delay = self._restart_delay.get(index, RESTART_DELAY_MIN)
+                self.logger.warning(
+                    "Воркер %s завершился с кодом %s, перезапуск через %.0f с", index, process.exitcode, delay
+                )
+                self._restart_at[index] = now + delay
+                self._restart_delay[index] = min(delay * 2, RESTART_DELAY_MAX)
+                continue
+            if now >= restart_at:
+                self._restart_at.pop(index, None)
+                self._spawn(index)
+
+    def stop_all(self, timeout: float = 5.0) -> None:
+        """Останавливает воркеры и дописывает полученные от них результаты за общий срок `timeout`."""
+        self._stopping = True
+        deadline = time.monotonic() + timeout
+        for event in self._stop_events.values():
+            event.set()
+        for index in list(self._processes):
+            self._stop_worker(index, timeout=max(deadline - time.monotonic(), 0.0))
+        self._drain_stop.set()
+        for thread in (self._drain_thread, self._logs_thread):
+            if thread.is_alive():
+                thread.join(timeout=max(deadline - time.monotonic(), 1.0))
+
+    def _stop_worker(self, index: int, timeout: float = 5.0) -> None:
+        process = self._processes.pop(index)
+        self._stop_events.pop(index).set()
+        self._restart_at.pop(index, None)
+        process.join(timeout=timeout)
+        if process.is_alive():
+            self.logger.warning("Воркер %s не остановился вовремя и будет завершён принудительно", index)
+            process.terminate()
+            process.join(timeout=1)
+
+    def _spawn(self, index: int) -> None:
+        stop_event = _CONTEXT.Event()
+        process = _CONTEXT.Process(
+            target=_worker_main,
+            name=f"monitor-worker-{index}",
+            args=(
+                index,
+                self.shards[index],
+                self._queue,
+                self._log_queue,
+                stop_event,
+                self.log_level,
+                self.monitor_options,
+            ),
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+        self._stop_events[index] = stop_event
+        self._started_at[index] = time.monotonic()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                key, payload = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._drain_stop.is_set():
+                    return
+                continue
+            route = self._routes.get(key)
+            if route is None:
+                self.logger.debug("Пропущен результат неизвестного маршрута %s", key)
+                continue
+            try:
+                self.writer.write_result(route, payload)
+            except Exception:  # noqa: BLE001
+                self.logger.exception("Не удалось записать результат %s", route.name)
+
+    def _forward_logs(self) -> None:
+        # Записи воркеров проходят через обработчики родителя, как если бы были созданы в нём.
+        while True:
+            try:
+                record = self._log_queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._drain_stop.is_set():
+                    return
+                continue
+            logging.getLogger(record.name).handle(record)
+
+
+__all__ = ["QueueResultWriter", "WorkerPool"]